@@ -0,0 +1,252 @@
+"""
+Time-partitioned activity log with retention and pre-aggregated rollups.
+
+Postgres (Supabase): `activity_log` is a table partitioned by month on
+created_at (see sql/activity_log_partitions.sql). The app reads and writes
+the parent table and Postgres prunes partitions using the created_at range.
+
+Mock and SQLite: each month is its own table, "activity_log_2025_01". The
+plain `activity_log` table acts as the default partition for rows written
+before partitioning (or generated by datagen). run_maintenance() migrates
+those rows into their month tables.
+
+Rollups in `activity_rollups` count actions per hour and per day, by actor,
+entity type and action. activity_stats reads them instead of raw rows. They
+are recomputed by run_maintenance() (hourly) and survive raw-row retention.
+With tenancy on, maintenance runs per tenant and each tenant has its own
+rollups and watermark.
+"""
+import os
+import re
+import uuid
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+import tenancy
+from supabase_client import (backend_name, fetch_rows, fetch_page, count_rows, insert_row, upsert_rows,
+                             delete_rows, list_tables, drop_table, call_rpc)
+
+TABLE = "activity_log"
+ROLLUP_TABLE = "activity_rollups"
+ROLLUP_STATE_TABLE = "activity_rollup_state"
+
+# Raw activity older than this is dropped (0 keeps it forever). Rollups are kept.
+ACTIVITY_RETENTION_DAYS = int(os.environ.get("ACTIVITY_RETENTION_DAYS", "365"))
+ACTIVITY_MIGRATE_BATCH = int(os.environ.get("ACTIVITY_MIGRATE_BATCH", "5000"))
+
+_PARTITION = re.compile(r"^activity_log_(\d{4})_(\d{2})$")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _partitioned_locally() -> bool:
+    return backend_name() != "supabase"
+
+
+def partition_for(created_at: str) -> str:
+    return f"{TABLE}_{created_at[:4]}_{created_at[5:7]}"
+
+
+def partitions(since: Optional[str] = None, until: Optional[str] = None) -> list[str]:
+    """
+    Month tables that can hold rows with since <= created_at < until, newest first.
+    Does not include the default partition.
+    """
+    if not _partitioned_locally():
+        return []
+    names = []
+    for name in list_tables(f"{TABLE}_"):
+        match = _PARTITION.match(name)
+        if not match:
+            continue
+        month = f"{match.group(1)}-{match.group(2)}"
+        if (since and month < since[:7]) or (until and month > until[:7]):
+            continue
+        names.append(name)
+    return sorted(names, reverse=True)
+
+
+# --- Raw rows ---
+
+def insert(row: dict) -> dict:
+    if not _partitioned_locally():
+        return insert_row(TABLE, row)
+    row.setdefault("created_at", _now().isoformat())
+    # Month tables have independent id sequences, so ids must be globally unique
+    row.setdefault("id", uuid.uuid4().hex)
+    return insert_row(partition_for(row["created_at"]), row)
+
+
+def fetch(filters: Optional[dict] = None, since: Optional[str] = None, until: Optional[str] = None,
+          limit: Optional[int] = None) -> list[dict]:
+    """
+    Activity matching the filters, newest first. Only partitions overlapping
+    [since, until) are read, newest first, stopping once `limit` rows are found.
+    """
+    filters = dict(filters or {})
+    if since:
+        filters["created_at__gte"] = since
+    if until:
+        filters["created_at__lt"] = until
+    # The default partition can hold rows of any month, so it is always read
+    rows = fetch_rows(TABLE, filters, order_by="-created_at", limit=limit)
+    found = 0
+    for table in partitions(since, until):
+        part = fetch_rows(table, filters, order_by="-created_at", limit=limit)
+        rows.extend(part)
+        found += len(part)
+        if limit is not None and found >= limit:
+            break
+    rows.sort(key=lambda row: row.get("created_at") or "", reverse=True)
+    return rows[:limit] if limit is not None else rows
+
+
+def delete(filters: dict, reason: str = "deleted") -> int:
+    return sum(delete_rows(table, filters, reason) for table in [TABLE] + partitions())
+
+
+def migrate_default(batch_size: int = ACTIVITY_MIGRATE_BATCH, max_batches: int = 20) -> int:
+    """
+    Move rows from the default partition into their month tables. Each batch is
+    upserted before it is deleted, so an interrupted batch is simply redone.
+    """
+    if not _partitioned_locally():
+        return 0
+    moved = 0
+    for _ in range(max_batches):
+        rows = fetch_page(TABLE, order_by="created_at", limit=batch_size)
+        if not rows:
+            break
+        by_partition = {}
+        for row in rows:
+            by_partition.setdefault(partition_for(row["created_at"]), []).append(dict(row))
+        for table, part in by_partition.items():
+            upsert_rows(table, part)
+        moved += delete_rows(TABLE, {"id__in": [row["id"] for row in rows]}, None)
+    return moved
+
+
+def apply_retention(days: int = ACTIVITY_RETENTION_DAYS) -> int:
+    """
+    Drop raw activity older than `days`: whole partitions where possible, then
+    the remaining rows of the boundary month. Returns rows deleted (partitions
+    dropped in Postgres are not counted). Expired rows leave no tombstones in
+    either backend: delta sync clients keep the history they already have.
+    """
+    if days <= 0:
+        return 0
+    cutoff = (_now() - timedelta(days=days)).isoformat()
+    if not _partitioned_locally():
+        try:
+            call_rpc("drop_activity_partitions_before", {"cutoff": cutoff[:10]})
+        except Exception as e:
+            # The row delete below still removes everything expired, only slower
+            print(f"⚠️ drop_activity_partitions_before failed: {e}")
+        return delete_rows(TABLE, {"created_at__lt": cutoff}, None)
+    deleted = 0
+    for table in partitions(until=cutoff):
+        if table < partition_for(cutoff):
+            deleted += count_rows(table)
+            drop_table(table)
+    return deleted + sum(delete_rows(table, {"created_at__lt": cutoff}, None)
+                         for table in [TABLE] + partitions(since=cutoff, until=cutoff))
+
+
+# --- Rollups ---
+
+def _rollup_rows(grain: str, counts: Counter) -> list[dict]:
+    return [{"id": tenancy.qualify(f"{grain}|{bucket}|{actor}|{entity_type}|{action}"), "grain": grain, "bucket": bucket,
+             "actor_email": actor, "entity_type": entity_type, "action": action, "count": n}
+            for (bucket, actor, entity_type, action), n in counts.items()]
+
+
+def rollup_day(day: str) -> int:
+    """
+    Recompute the hourly and daily rollups of one UTC day ("YYYY-MM-DD").
+    """
+    until = (datetime.fromisoformat(day) + timedelta(days=1)).date().isoformat()
+    hourly = Counter()
+    daily = Counter()
+    for row in fetch(since=day, until=until):
+        key = (row.get("actor_email"), row.get("entity_type"), row.get("action"))
+        hourly[(row["created_at"][:13], *key)] += 1
+        daily[(day, *key)] += 1
+    return len(upsert_rows(ROLLUP_TABLE, _rollup_rows("hour", hourly) + _rollup_rows("day", daily)))
+
+
+def _oldest_activity_day() -> Optional[str]:
+    candidates = [rows[0]["created_at"] for table in [TABLE] + partitions()[-1:]
+                  if (rows := fetch_rows(table, {"created_at__gte": ""}, order_by="created_at", limit=1))]
+    return min(candidates)[:10] if candidates else None
+
+
+def refresh_rollups() -> int:
+    """
+    Recompute rollups from the last watermark (or the oldest activity) through
+    today, one day at a time. Today is recomputed on every run.
+    """
+    state = fetch_rows(ROLLUP_STATE_TABLE, {"id": tenancy.qualify(TABLE)})
+    start = state[0]["watermark"] if state else _oldest_activity_day()
+    if not start:
+        return 0
+    today = _now().date()
+    day = datetime.fromisoformat(start).date()
+    written = 0
+    while day <= today:
+        written += rollup_day(day.isoformat())
+        day += timedelta(days=1)
+    upsert_rows(ROLLUP_STATE_TABLE, [{"id": tenancy.qualify(TABLE), "watermark": today.isoformat(), "updated_at": _now().isoformat()}])
+    return written
+
+
+def stats(grain: str = "day", since: Optional[str] = None, until: Optional[str] = None,
+          actor_email: Optional[str] = None, entity_type: Optional[str] = None) -> dict:
+    width = 13 if grain == "hour" else 10
+    filters = {"grain": grain}
+    if since:
+        filters["bucket__gte"] = since[:width]
+    if until:
+        filters["bucket__lt"] = until[:width]
+    if actor_email:
+        filters["actor_email"] = actor_email
+    if entity_type:
+        filters["entity_type"] = entity_type
+    series, by_actor, by_entity_type, by_action = Counter(), Counter(), Counter(), Counter()
+    for row in fetch_rows(ROLLUP_TABLE, filters):
+        series[row["bucket"]] += row["count"]
+        by_actor[row["actor_email"]] += row["count"]
+        by_entity_type[row["entity_type"]] += row["count"]
+        by_action[row["action"]] += row["count"]
+    return {
+        "grain": grain,
+        "total": sum(series.values()),
+        "series": [{"bucket": bucket, "count": series[bucket]} for bucket in sorted(series)],
+        "by_actor": dict(by_actor.most_common()),
+        "by_entity_type": dict(by_entity_type.most_common()),
+        "by_action": dict(by_action.most_common()),
+    }
+
+
+# --- Maintenance ---
+
+def run_maintenance() -> dict:
+    """
+    Hourly: create upcoming Postgres partitions, migrate default-partition rows,
+    refresh rollups, then apply retention. A failure to create partitions is
+    reported but does not stop the rest: new rows then land in the default
+    partition until it succeeds.
+    """
+    result = {}
+    if not _partitioned_locally():
+        try:
+            call_rpc("create_activity_partitions", {"months_ahead": 2})
+        except Exception as e:
+            print(f"⚠️ create_activity_partitions failed: {e}")
+            result["partition_error"] = str(e)
+    result["migrated"] = migrate_default()
+    result["rollup_rows"] = refresh_rollups()
+    result["expired"] = apply_retention()
+    return result
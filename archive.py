@@ -0,0 +1,213 @@
+"""
+Campaign archival: moves campaigns whose end_date has passed, with their
+tasks, assets and activity, out of the hot tables in bounded chunks.
+
+    ARCHIVE_MODE=table  ->  <table>_archive tables in the same backend (default)
+    ARCHIVE_MODE=file   ->  gzip-compressed NDJSON chunk files under ARCHIVE_DIR
+
+On Supabase, apply sql/archive.sql first: both modes keep their checkpoint in
+`archive_checkpoints`, and table mode also needs the archive tables. Mock and
+SQLite create tables on first write. Archived rows carry archived_at and
+archive_chunk_id.
+
+Each chunk is recorded in `archive_checkpoints` before anything is copied:
+
+    1. checkpoint: pending chunk = campaign ids
+    2. copy campaigns + children to the archive (idempotent)
+    3. delete them from the hot tables (children first)
+    4. checkpoint: clear pending, add to totals
+
+A crash anywhere in 2-3 leaves the pending chunk in the checkpoint; the next
+run finishes it before selecting new campaigns, so nothing is lost or
+archived twice.
+
+With tenancy on, the job archives each tenant's campaigns separately, with a
+checkpoint per tenant.
+"""
+import os
+import json
+import gzip
+import glob
+from datetime import datetime, timezone, timedelta
+from typing import Iterator, Optional
+
+import activity_store
+import tenancy
+from supabase_client import (fetch_rows, fetch_page, insert_row, insert_rows, update_row, delete_rows,
+                             compile_filters, row_matches)
+
+ARCHIVE_MODE = os.environ.get("ARCHIVE_MODE", "table")
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_CHUNK_SIZE = int(os.environ.get("ARCHIVE_CHUNK_SIZE", "200"))
+
+CHECKPOINT_TABLE = "archive_checkpoints"
+CHECKPOINT_ID = "campaigns"
+ARCHIVED_TABLES = ["campaigns", "tasks", "assets", "activity_log"]
+
+
+def archive_table(table: str) -> str:
+    return f"{table}_archive"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- Checkpoint ---
+
+def load_checkpoint() -> dict:
+    rows = fetch_rows(CHECKPOINT_TABLE, {"id": tenancy.qualify(CHECKPOINT_ID)})
+    if rows:
+        return rows[0]
+    return insert_row(CHECKPOINT_TABLE, {"id": tenancy.qualify(CHECKPOINT_ID), "pending": None, "totals": {},
+                                         "updated_at": None})
+
+
+def _save_checkpoint(data: dict) -> dict:
+    return update_row(CHECKPOINT_TABLE, tenancy.qualify(CHECKPOINT_ID), {**data, "updated_at": _now().isoformat()})
+
+
+# --- Collect ---
+
+def collect_chunk(campaign_ids: list[str]) -> dict[str, list[dict]]:
+    """
+    Rows belonging to these campaigns, per hot table.
+    """
+    rows = {"campaigns": fetch_rows("campaigns", {"id__in": campaign_ids})}
+    tasks = {}
+    for column in ("campaign_id", "related_campaign_id"):
+        for task in fetch_rows("tasks", {f"{column}__in": campaign_ids}):
+            tasks[task["id"]] = task
+    rows["tasks"] = list(tasks.values())
+    rows["assets"] = fetch_rows("assets", {"related_campaign_id__in": campaign_ids})
+    entity_ids = {"campaign": campaign_ids, "task": [t["id"] for t in rows["tasks"]],
+                  "asset": [a["id"] for a in rows["assets"]]}
+    rows["activity_log"] = [row for entity_type, ids in entity_ids.items() if ids
+                            for row in activity_store.fetch({"entity_type": entity_type, "entity_id__in": ids})]
+    return rows
+
+
+# --- Archive stores ---
+
+def _archive_dir() -> str:
+    # With tenancy on, each tenant's chunk files live in their own directory
+    return os.path.join(ARCHIVE_DIR, tenancy.current()) if tenancy.MULTI_TENANT else ARCHIVE_DIR
+
+
+def _chunk_path(chunk_id: str) -> str:
+    return os.path.join(_archive_dir(), f"chunk-{chunk_id}.ndjson.gz")
+
+
+def write_chunk(chunk_id: str, rows: dict[str, list[dict]]) -> int:
+    """
+    Copy a chunk to the archive. Safe to repeat: table mode skips ids already
+    archived; file mode keeps an existing chunk file (it is written atomically,
+    so if it exists it is complete).
+    """
+    if ARCHIVE_MODE == "file":
+        path = _chunk_path(chunk_id)
+        if os.path.exists(path):
+            return 0
+        os.makedirs(_archive_dir(), exist_ok=True)
+        tmp = path + ".tmp"
+        count = 0
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for table, table_rows in rows.items():
+                for row in table_rows:
+                    f.write(json.dumps({"table": table, "row": row}, default=str) + "\n")
+                    count += 1
+        os.replace(tmp, path)
+        return count
+
+    count = 0
+    archived_at = _now().isoformat()
+    for table, table_rows in rows.items():
+        if not table_rows:
+            continue
+        existing = {r["id"] for r in fetch_rows(archive_table(table), {"id__in": [r["id"] for r in table_rows]})}
+        missing = [{**r, "archived_at": archived_at, "archive_chunk_id": chunk_id}
+                   for r in table_rows if r["id"] not in existing]
+        count += len(insert_rows(archive_table(table), missing))
+    return count
+
+
+def delete_chunk(rows: dict[str, list[dict]]) -> dict[str, int]:
+    deleted = {}
+    for table in reversed(ARCHIVED_TABLES):  # children before campaigns
+        ids = [r["id"] for r in rows.get(table, [])]
+        if not ids:
+            deleted[table] = 0
+        elif table == "activity_log":
+            deleted[table] = activity_store.delete({"id__in": ids}, "archived")  # across monthly partitions
+        else:
+            deleted[table] = delete_rows(table, {"id__in": ids}, "archived")
+    return deleted
+
+
+def iter_archived(table: str, filters: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Archived rows of a hot table matching the filters.
+    """
+    if ARCHIVE_MODE == "file":
+        compiled = compile_filters(filters)
+        for path in sorted(glob.glob(os.path.join(_archive_dir(), "chunk-*.ndjson.gz"))):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["table"] == table and row_matches(record["row"], compiled):
+                        yield record["row"]
+        return
+    yield from fetch_rows(archive_table(table), filters)
+
+
+def fetch_archived(table: str, filters: Optional[dict] = None) -> list[dict]:
+    return list(iter_archived(table, filters))
+
+
+# --- Engine ---
+
+def _process_chunk(checkpoint: dict, chunk_id: str, campaign_ids: list[str]) -> dict:
+    checkpoint = _save_checkpoint({"pending": {"chunk_id": chunk_id, "campaign_ids": campaign_ids}})
+    rows = collect_chunk(campaign_ids)
+    write_chunk(chunk_id, rows)
+    deleted = delete_chunk(rows)
+    totals = dict(checkpoint.get("totals") or {})
+    for table, n in deleted.items():
+        totals[table] = totals.get(table, 0) + n
+    _save_checkpoint({"pending": None, "totals": totals, "last_chunk_id": chunk_id})
+    return deleted
+
+
+def run_archival(older_than_days: int = ARCHIVE_AFTER_DAYS, chunk_size: int = ARCHIVE_CHUNK_SIZE,
+                 max_chunks: Optional[int] = None) -> dict:
+    """
+    Archive campaigns whose end_date is more than `older_than_days` ago, chunk
+    by chunk, resuming an unfinished chunk first. Returns rows moved per table.
+    """
+    cutoff = (_now() - timedelta(days=older_than_days)).date().isoformat()
+    moved = {table: 0 for table in ARCHIVED_TABLES}
+    chunks = 0
+
+    checkpoint = load_checkpoint()
+    pending = checkpoint.get("pending")
+    if pending:
+        print(f"Resuming archive chunk {pending['chunk_id']}")
+        for table, n in _process_chunk(checkpoint, pending["chunk_id"], pending["campaign_ids"]).items():
+            moved[table] += n
+        chunks += 1
+
+    while max_chunks is None or chunks < max_chunks:
+        campaigns = fetch_page("campaigns", {"end_date__lt": cutoff}, order_by="id", limit=chunk_size)
+        if not campaigns:
+            break
+        chunk_id = f"{_now().strftime('%Y%m%dT%H%M%S%f')}-{campaigns[0]['id']}"
+        deleted = _process_chunk(load_checkpoint(), chunk_id, [c["id"] for c in campaigns])
+        for table, n in deleted.items():
+            moved[table] += n
+        chunks += 1
+        if not deleted["campaigns"]:
+            print("⚠️ Archive chunk deleted no campaigns; stopping to avoid reprocessing it")
+            break
+
+    return {"chunks": chunks, **moved}
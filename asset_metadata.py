@@ -0,0 +1,254 @@
+"""
+File metadata and thumbnails for asset processing workers.
+
+Runs inside worker processes (see asset_processing.py), so it imports only
+the standard library and, for thumbnails, Pillow. Without Pillow the
+metadata is still extracted and thumbnails are skipped.
+
+Formats are recognised by their leading bytes, not the file name:
+
+    png gif jpg webp bmp   width, height; thumbnails
+    svg                    width, height from the root element
+    mp4 mov                width, height, duration_seconds
+    wav                    duration_seconds
+    pdf                    pages
+"""
+import os
+import re
+import struct
+import hashlib
+import tempfile
+from typing import BinaryIO, Optional
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+MIME_TYPES = {"png": "image/png", "gif": "image/gif", "jpg": "image/jpeg", "webp": "image/webp", "bmp": "image/bmp",
+              "svg": "image/svg+xml", "mp4": "video/mp4", "mov": "video/quicktime", "wav": "audio/wav",
+              "pdf": "application/pdf"}
+RASTER_TYPES = ("png", "gif", "jpg", "webp", "bmp")
+_BLOCK = 1 << 20
+
+
+def sniff(head: bytes) -> Optional[str]:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head[4:8] == b"ftyp":
+        return "mov" if head[8:10] == b"qt" else "mp4"
+    if b"<svg" in head[:1024].lower():
+        return "svg"
+    return None
+
+
+# --- Readers: each takes the open file and returns a dict of what it found ---
+
+def _png(f: BinaryIO) -> dict:
+    f.seek(16)
+    width, height = struct.unpack(">II", f.read(8))
+    return {"width": width, "height": height}
+
+
+def _gif(f: BinaryIO) -> dict:
+    f.seek(6)
+    width, height = struct.unpack("<HH", f.read(4))
+    return {"width": width, "height": height}
+
+
+def _bmp(f: BinaryIO) -> dict:
+    f.seek(18)
+    width, height = struct.unpack("<ii", f.read(8))
+    return {"width": width, "height": abs(height)}
+
+
+def _jpg(f: BinaryIO) -> dict:
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return {}
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        (length,) = struct.unpack(">H", f.read(2))
+        # Start-of-frame markers, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return {"width": width, "height": height}
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _webp(f: BinaryIO) -> dict:
+    f.seek(12)
+    chunk = f.read(4)
+    data = f.read(26)
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[14:18])
+        return {"width": width & 0x3FFF, "height": height & 0x3FFF}
+    if chunk == b"VP8L":
+        bits = int.from_bytes(data[5:9], "little")
+        return {"width": (bits & 0x3FFF) + 1, "height": ((bits >> 14) & 0x3FFF) + 1}
+    if chunk == b"VP8X":
+        return {"width": int.from_bytes(data[8:11], "little") + 1, "height": int.from_bytes(data[11:14], "little") + 1}
+    return {}
+
+
+def _svg(f: BinaryIO) -> dict:
+    f.seek(0)
+    root = re.search(rb"<svg\b[^>]*>", f.read(8192), re.IGNORECASE)
+    if not root:
+        return {}
+    found = {}
+    for name in ("width", "height"):
+        value = re.search(rb'\b' + name.encode() + rb'\s*=\s*["\']\s*([0-9.]+)', root.group(0))
+        if value:
+            found[name] = round(float(value.group(1)))
+    if len(found) < 2:
+        box = re.search(rb'viewBox\s*=\s*["\']\s*[-0-9.]+[\s,]+[-0-9.]+[\s,]+([0-9.]+)[\s,]+([0-9.]+)', root.group(0))
+        if box:
+            found = {"width": round(float(box.group(1))), "height": round(float(box.group(2)))}
+    return found
+
+
+def _boxes(f: BinaryIO, start: int, end: int):
+    # ISO base media boxes: (type, payload offset, payload end)
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", f.read(8))
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def _mp4(f: BinaryIO) -> dict:
+    found = {}
+    end = f.seek(0, os.SEEK_END)
+    for kind, start, stop in _boxes(f, 0, end):
+        if kind != b"moov":
+            continue
+        for child, child_start, child_stop in _boxes(f, start, stop):
+            if child == b"mvhd":
+                f.seek(child_start)
+                version = f.read(4)[0]
+                if version == 1:
+                    timescale, duration = struct.unpack(">16xIQ", f.read(28))
+                else:
+                    timescale, duration = struct.unpack(">8xII", f.read(16))
+                if timescale:
+                    found["duration_seconds"] = round(duration / timescale, 3)
+            elif child == b"trak" and "width" not in found:
+                for box, box_start, box_stop in _boxes(f, child_start, child_stop):
+                    if box == b"tkhd":
+                        # Width and height are the last 8 bytes, 16.16 fixed point
+                        f.seek(box_stop - 8)
+                        width, height = struct.unpack(">II", f.read(8))
+                        if width and height:
+                            found.update(width=width >> 16, height=height >> 16)
+        break
+    return found
+
+
+def _wav(f: BinaryIO) -> dict:
+    byte_rate = None
+    end = f.seek(0, os.SEEK_END)
+    offset = 12
+    while offset + 8 <= end:
+        f.seek(offset)
+        kind, size = struct.unpack("<4sI", f.read(8))
+        if kind == b"fmt ":
+            byte_rate = struct.unpack("<8xI", f.read(12))[0]
+        elif kind == b"data" and byte_rate:
+            return {"duration_seconds": round(size / byte_rate, 3)}
+        offset += 8 + size + (size & 1)
+    return {}
+
+
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def _pdf(f: BinaryIO) -> dict:
+    f.seek(0)
+    pages, carry, counted = 0, b"", 0
+    while block := f.read(_BLOCK):
+        data = carry + block
+        # A match ending in the last 64 bytes may continue in the next block: count it there.
+        # Blocks overlap by 64 more bytes so such a match is seen whole; `counted` skips repeats.
+        cut = max(0, len(data) - 64)
+        pages += sum(1 for m in _PDF_PAGE.finditer(data) if counted < m.end() <= cut)
+        start = max(0, cut - 64)
+        carry, counted = data[start:], cut - start
+    return {"pages": pages + sum(1 for m in _PDF_PAGE.finditer(carry) if m.end() > counted)}
+
+
+READERS = {"png": _png, "gif": _gif, "jpg": _jpg, "webp": _webp, "bmp": _bmp, "svg": _svg, "mp4": _mp4,
+           "mov": _mp4, "wav": _wav, "pdf": _pdf}
+
+
+def _thumbnail(path: str, size: int, directory: str) -> Optional[dict]:
+    """
+    Write a JPEG thumbnail to a temporary file in directory and return its path,
+    SHA-256 and dimensions.
+    """
+    with Image.open(path) as image:
+        image.draft("RGB", (size, size))  # JPEG: decode at reduced scale
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        fd, temp = tempfile.mkstemp(suffix=".jpg", dir=directory)
+        with os.fdopen(fd, "wb") as out:
+            image.save(out, "JPEG", quality=85)
+        width, height = image.size
+    hasher = hashlib.sha256()
+    with open(temp, "rb") as f:
+        hasher.update(f.read())
+    return {"path": temp, "sha256": hasher.hexdigest(), "width": width, "height": height}
+
+
+def extract(path: str, file_name: Optional[str] = None, thumbnail_size: int = 256,
+            thumbnail_dir: Optional[str] = None) -> dict:
+    """
+    Metadata of the file at path, plus {"thumbnail": {...}} for raster images
+    when thumbnail_dir is given and Pillow is installed. An image Pillow cannot
+    decode keeps its header metadata and gets "thumbnail_error".
+    """
+    with open(path, "rb") as f:
+        kind = sniff(f.read(64))
+        if kind is None and file_name:
+            kind = os.path.splitext(file_name)[1].lstrip(".").lower() or None
+        metadata = {"file_type": kind, "mime": MIME_TYPES.get(kind, "application/octet-stream"),
+                    "size_bytes": os.fstat(f.fileno()).st_size}
+        reader = READERS.get(kind)
+        if reader is not None:
+            try:
+                metadata.update(reader(f))
+            except (struct.error, IndexError, ValueError):
+                metadata["warning"] = f"Could not read {kind} header"
+    if thumbnail_dir and kind in RASTER_TYPES:
+        if Image is None:
+            metadata["thumbnail_skipped"] = "Pillow is not installed"
+        else:
+            try:
+                metadata["thumbnail"] = _thumbnail(path, thumbnail_size, thumbnail_dir)
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                metadata["thumbnail_error"] = f"Could not decode image ({type(e).__name__})"
+    return metadata
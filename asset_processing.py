@@ -0,0 +1,237 @@
+"""
+Background asset processing: metadata and thumbnails for uploaded files.
+
+Assets created from an upload start as processing_status "queued", and
+submit() puts them on a bounded in-process queue. It never waits, so tool
+latency does not depend on processing. A dispatcher thread feeds the queue to
+a ProcessPoolExecutor of ASSET_WORKERS processes (default: one per core).
+Each worker runs asset_metadata.extract on the locally stored blob. The
+results are written back to the asset row:
+
+    processing_status  queued | deferred | done | failed | skipped
+    metadata           {"file_type", "mime", "width", "height", "duration_seconds", "pages", ...}
+    thumbnail_url      JPEG of at most ASSET_THUMBNAIL_SIZE px, stored as a blob itself
+
+Results are cached by content hash in the `blob_metadata` table, so a file
+uploaded again is processed once. Later assets with the same hash copy the
+cached result.
+
+Backpressure: at most ASSET_QUEUE_MAX assets wait in the queue, and at most
+two per worker are handed to the pool at once. When the queue is full,
+submit() marks the asset "deferred" instead of blocking. Deferred assets are
+queued again as the queue drains. The process_assets job also requeues them,
+and retries assets left "queued" by a process that exited.
+"""
+import os
+import queue
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+import asset_metadata
+import blob_store
+import tenancy
+import uploads
+from supabase_client import fetch_rows, update_row, upsert_rows
+
+ASSET_PROCESSING = os.environ.get("ASSET_PROCESSING", "true").lower() == "true"
+ASSET_WORKERS = int(os.environ.get("ASSET_WORKERS", "0")) or os.cpu_count() or 1
+ASSET_QUEUE_MAX = int(os.environ.get("ASSET_QUEUE_MAX", "100"))
+ASSET_THUMBNAIL_SIZE = int(os.environ.get("ASSET_THUMBNAIL_SIZE", "256"))
+# Assets still "queued" after this long are assumed lost and queued again.
+ASSET_REQUEUE_AFTER_MINUTES = float(os.environ.get("ASSET_REQUEUE_AFTER_MINUTES", "15"))
+
+CACHE_TABLE = "blob_metadata"
+
+_queue = queue.Queue(ASSET_QUEUE_MAX)
+_slots = threading.BoundedSemaphore(ASSET_WORKERS * 2)
+_lock = threading.Lock()
+_active = set()  # asset ids queued or running in this process
+_pool: Optional[ProcessPoolExecutor] = None
+_results: Optional[ThreadPoolExecutor] = None
+_dispatcher: Optional[threading.Thread] = None
+_deferred_tenants = set()  # tenants with assets deferred and not yet requeued
+_stats = {"submitted": 0, "deferred": 0, "processed": 0, "cache_hits": 0, "failed": 0, "skipped": 0,
+          "pool_restarts": 0}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def submit(asset: dict) -> str:
+    """
+    Queue an asset for processing without blocking. Returns "queued", or
+    "deferred" if the queue is full.
+    """
+    if not asset.get("sha256"):
+        return "skipped"
+    asset_id = asset["id"]
+    with _lock:
+        if asset_id in _active:
+            return "queued"
+        try:
+            _queue.put_nowait((asset_id, asset["sha256"], asset.get("file_name"), tenancy.current()))
+        except queue.Full:
+            deferred = True
+        else:
+            deferred = False
+            _active.add(asset_id)
+    if deferred:
+        _stats["deferred"] += 1
+        _deferred_tenants.add(tenancy.current())
+        update_row("assets", asset_id, {"processing_status": "deferred"})
+        return "deferred"
+    _stats["submitted"] += 1
+    _start_dispatcher()
+    return "queued"
+
+
+# --- Dispatch ---
+
+def _start_dispatcher():
+    global _dispatcher, _results
+    if _dispatcher is not None:
+        return
+    with _lock:
+        if _dispatcher is None:
+            _results = ThreadPoolExecutor(max_workers=2, thread_name_prefix="asset-results")
+            _dispatcher = threading.Thread(target=_dispatch, name="asset-dispatcher", daemon=True)
+            _dispatcher.start()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawn, not fork: forking would copy this process mid-way through other threads' work
+        _pool = ProcessPoolExecutor(max_workers=ASSET_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _dispatch():
+    while True:
+        *job, tenant = _queue.get()
+        _slots.acquire()
+        try:
+            # Results are written back on behalf of the asset's tenant
+            with tenancy.use(tenant):
+                _start(*job)
+        except Exception as e:
+            print(f"⚠️ Asset processing of {job[0]} failed to start: {e}")
+            _release(job[0])
+
+
+def _start(asset_id, sha256: str, file_name: Optional[str]):
+    global _pool
+    context = contextvars.copy_context()
+    cached = fetch_rows(CACHE_TABLE, {"id": sha256})
+    if cached:
+        _stats["cache_hits"] += 1
+        _results.submit(context.run, _save, asset_id, "done", cached[0].get("metadata"), cached[0].get("thumbnail_url"))
+        return
+    store = blob_store.get_store()
+    if not isinstance(store, blob_store.LocalBlobStore) or not store.exists(sha256):
+        _stats["skipped"] += 1
+        _results.submit(context.run, _save, asset_id, "skipped", {"reason": "file is not in the local blob store"},
+                        None)
+        return
+    os.makedirs(uploads.UPLOAD_DIR, exist_ok=True)
+    args = (asset_metadata.extract, store.path(sha256), file_name, ASSET_THUMBNAIL_SIZE, uploads.UPLOAD_DIR)
+    try:
+        future = _get_pool().submit(*args)
+    except BrokenProcessPool:
+        _stats["pool_restarts"] += 1
+        _pool = None
+        future = _get_pool().submit(*args)
+    future.add_done_callback(lambda f: _results.submit(context.run, _finish, asset_id, sha256, f))
+
+
+def _finish(asset_id, sha256: str, future):
+    # Any failure, in the worker or while storing its results, marks the asset
+    # "failed"; _save always releases its slot
+    status, metadata, thumbnail_url = "failed", None, None
+    try:
+        metadata = future.result()
+        thumbnail = metadata.pop("thumbnail", None)
+        if thumbnail:
+            store = blob_store.get_store()
+            store.put_file(thumbnail["sha256"], thumbnail.pop("path"), "image/jpeg")
+            thumbnail_url = store.url(thumbnail["sha256"])
+            metadata["thumbnail"] = thumbnail
+        upsert_rows(CACHE_TABLE, [{"id": sha256, "metadata": metadata, "thumbnail_url": thumbnail_url,
+                                   "created_at": _now()}])
+        status = "done"
+    except Exception as e:
+        metadata, thumbnail_url = {"error": f"{type(e).__name__}: {e}"}, None
+    finally:
+        _stats["processed" if status == "done" else "failed"] += 1
+        _save(asset_id, status, metadata, thumbnail_url)
+
+
+def _save(asset_id, status: str, metadata: Optional[dict], thumbnail_url: Optional[str]):
+    try:
+        update_row("assets", asset_id, {"processing_status": status, "metadata": metadata,
+                                        "thumbnail_url": thumbnail_url, "processed_at": _now()})
+    except Exception as e:
+        print(f"⚠️ Could not save processing results of asset {asset_id}: {e}")
+    finally:
+        _release(asset_id)
+
+
+def _release(asset_id):
+    with _lock:
+        _active.discard(asset_id)
+    _slots.release()
+    if _deferred_tenants and _queue.qsize() < ASSET_QUEUE_MAX // 2:
+        _refill()
+
+
+_refilling = threading.Lock()
+
+
+def _refill():
+    # Move deferred assets into the freed queue space; one refill at a time
+    if not _refilling.acquire(blocking=False):
+        return
+    try:
+        for tenant in list(_deferred_tenants):
+            room = ASSET_QUEUE_MAX - _queue.qsize()
+            if room <= 0:
+                break
+            _deferred_tenants.discard(tenant)
+            limit = room + len(_active)  # deferred rows already resubmitted keep that status until done
+            with tenancy.use(tenant):
+                rows = fetch_rows("assets", {"processing_status": "deferred"}, order_by="created_at", limit=limit)
+                if len(rows) == limit:
+                    _deferred_tenants.add(tenant)
+                for asset in [asset for asset in rows if asset["id"] not in _active][:room]:
+                    if submit(asset) == "deferred":
+                        break
+    finally:
+        _refilling.release()
+
+
+def requeue() -> int:
+    """
+    Queue deferred assets, and assets left "queued" longer than
+    ASSET_REQUEUE_AFTER_MINUTES (their process exited). Run by the process_assets job.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(minutes=ASSET_REQUEUE_AFTER_MINUTES)).isoformat()
+    stale = fetch_rows("assets", {"processing_status": "deferred"}) + \
+        fetch_rows("assets", {"processing_status": "queued", "created_at__lt": cutoff})
+    queued = 0
+    for asset in stale:
+        if asset["id"] in _active:
+            continue
+        if submit(asset) != "queued":
+            break
+        queued += 1
+    return queued
+
+
+def stats() -> dict:
+    return dict(_stats, enabled=ASSET_PROCESSING, workers=ASSET_WORKERS, queued=_queue.qsize(), active=len(_active))
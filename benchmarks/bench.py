@@ -0,0 +1,228 @@
+"""
+Benchmark harness for the tools and the supabase_client data layer.
+
+Runs every scenario against a datagen dataset of the requested size and
+reports ops/sec, latency percentiles and peak memory. Results are saved as
+JSON so two commits can be compared:
+
+    python -m benchmarks.bench --sizes 1000,100000 --scenarios "tool.*"
+    python -m benchmarks.bench --backends mock,sqlite --sizes 100000
+    python -m benchmarks.bench --compare benchmarks/results/<old>.json
+
+Provider credentials are blanked before anything is imported (an empty
+value also stops load_dotenv from filling them in from .env), so
+notifications and AI tools run their local fallbacks and no network
+traffic is generated.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import tempfile
+import fnmatch
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+
+for _var in ("SUPABASE_URL", "SUPABASE_KEY", "OPENAI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN",
+             "EMAIL_SMTP_HOST", "SMTP_HOST", "TRACE_SAMPLE_RATE", "PROFILE_SAMPLE_RATE", "PROFILE_TOOLS"):
+    os.environ[_var] = ""
+os.environ["MOCK_MODE"] = "true"
+
+import datagen
+from supabase_client import fetch_rows, insert_row, update_row, count_rows
+import scheduler
+from tools import (activity, ai_engine, assets, auth, automations, campaigns, dashboard,
+                   notifications, reports, system, tasks)
+
+BACKENDS = ("mock", "sqlite")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+ADMIN = "admin@example.com"
+MANAGER = "manager@example.com"
+TEAM = "team@example.com"
+
+
+def load_dataset(backend: str, size: int):
+    if backend == "mock":
+        os.environ["MOCK_MODE"] = "true"
+        datagen.seed_mock(size)
+    elif backend == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "hub.db")
+        datagen.seed_sqlite(path, size)
+        os.environ["MOCK_MODE"] = "false"
+        os.environ["SQLITE_PATH"] = path
+        datagen.reset_caches()
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+
+# name -> (group, callable). Mutating scenarios grow the dataset slightly over
+# a run, which is the same on every commit and so still comparable.
+SCENARIOS = {
+    # Data layer primitives
+    "data.fetch_rows.all_tasks": ("data", lambda: fetch_rows("tasks")),
+    "data.fetch_rows.filtered": ("data", lambda: fetch_rows("tasks", {"status": "todo"})),
+    "data.fetch_rows.by_id": ("data", lambda: fetch_rows("campaigns", {"id": "1"})),
+    "data.count_rows": ("data", lambda: count_rows("campaigns", {"status": "active"})),
+    "data.insert_row": ("data", lambda: insert_row("activity_log", {"actor_email": ADMIN, "action": "bench"})),
+    "data.update_row": ("data", lambda: update_row("tasks", "1", {"status": "in_progress"})),
+
+    # Tools
+    "tool.get_user_by_email": ("tools", lambda: auth.get_user_by_email(TEAM)),
+    "tool.get_user_role": ("tools", lambda: auth.get_user_role(MANAGER)),
+    "tool.list_team_members": ("tools", lambda: auth.list_team_members()),
+    "tool.list_campaigns": ("tools", lambda: campaigns.list_campaigns("active")),
+    "tool.create_campaign": ("tools", lambda: campaigns.create_campaign("Bench", ["email"], "2024-01-01", "2024-02-01", MANAGER)),
+    "tool.update_campaign_status": ("tools", lambda: campaigns.update_campaign_status("1", "active", ADMIN)),
+    "tool.list_tasks.admin": ("tools", lambda: tasks.list_tasks(user_email=ADMIN)),
+    "tool.list_tasks.team": ("tools", lambda: tasks.list_tasks(user_email=TEAM)),
+    "tool.create_task": ("tools", lambda: tasks.create_task("Bench task", TEAM, "2024-01-01", MANAGER)),
+    "tool.update_task_status": ("tools", lambda: tasks.update_task_status("1", "todo", MANAGER)),
+    "tool.list_assets": ("tools", lambda: assets.list_assets("pending")),
+    "tool.upload_asset": ("tools", lambda: assets.upload_asset(TEAM, "https://cdn.example.com/bench.png", "Bench")),
+    "tool.review_asset": ("tools", lambda: assets.review_asset("1", MANAGER, "approved")),
+    "tool.log_activity": ("tools", lambda: activity.log_activity(ADMIN, "bench", "task", "1")),
+    "tool.list_activity": ("tools", lambda: activity.list_activity(limit=50)),
+    "tool.list_activity.filtered": ("tools", lambda: activity.list_activity(limit=50, entity_type="task")),
+    "tool.marketing_snapshot": ("tools", lambda: dashboard.marketing_snapshot()),
+    "tool.channel_performance": ("tools", lambda: dashboard.channel_performance()),
+    "tool.send_whatsapp_message": ("tools", lambda: notifications.send_whatsapp_message("+10000000000", "bench")),
+    "tool.send_email": ("tools", lambda: notifications.send_email(TEAM, "bench", "<p>bench</p>")),
+    "tool.send_campaign_update": ("tools", lambda: notifications.send_campaign_update("1", "+10000000000")),
+    "tool.notify_campaign_status_change": ("tools", lambda: notifications.notify_campaign_status_change("1", "active")),
+    "tool.notify_overdue_tasks": ("tools", lambda: notifications.notify_overdue_tasks(MANAGER)),
+    "tool.generate_dashboard_summary": ("tools", lambda: reports.generate_dashboard_summary("weekly")),
+    "tool.send_periodic_marketing_report": ("tools", lambda: reports.send_periodic_marketing_report(ADMIN, "weekly")),
+    "tool.list_automations": ("tools", lambda: automations.list_automations()),
+    "tool.toggle_automation": ("tools", lambda: automations.toggle_automation("1", True)),
+    "tool.run_automation_trigger": ("tools", lambda: automations.run_automation_trigger("task_overdue_daily")),
+    "tool.check_backend_config": ("tools", lambda: system.check_backend_config()),
+    "tool.ai_campaign_review": ("tools", lambda: ai_engine.ai_campaign_review({"name": "Bench"})),
+    "tool.ai_generate_ideas": ("tools", lambda: ai_engine.ai_generate_ideas("bench")),
+    "tool.ai_generate_copy": ("tools", lambda: ai_engine.ai_generate_copy("bold", {"benefit": "speed"})),
+    "tool.ai_marketing_calendar": ("tools", lambda: ai_engine.ai_marketing_calendar("2024-01-01", 4)),
+
+    # Scheduled jobs
+    "job.daily_task_digest": ("jobs", lambda: scheduler.job_daily_task_digest()),
+    "job.weekly_campaign_report": ("jobs", lambda: scheduler.job_weekly_campaign_report()),
+}
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(fn, min_time: float, min_iterations: int, max_iterations: int) -> dict:
+    """
+    Time repeated calls of fn, then measure peak memory of one extra call
+    separately so tracemalloc overhead does not skew the latencies.
+    """
+    fn()  # warm-up
+    gc.collect()
+    latencies = []
+    deadline = time.perf_counter() + min_time
+    while len(latencies) < max_iterations and (len(latencies) < min_iterations or time.perf_counter() < deadline):
+        started = time.perf_counter_ns()
+        fn()
+        latencies.append((time.perf_counter_ns() - started) / 1e6)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    total_s = sum(latencies) / 1000
+    return {
+        "iterations": len(latencies),
+        "ops_per_sec": round(len(latencies) / total_s, 2) if total_s else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 4),
+        "p50_ms": round(_percentile(latencies, 50), 4),
+        "p90_ms": round(_percentile(latencies, 90), 4),
+        "p99_ms": round(_percentile(latencies, 99), 4),
+        "max_ms": round(latencies[-1], 4),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(old_path: str, new: dict):
+    """
+    Print per-scenario p50 and ops/sec changes against a previous result file.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    old_results = {(r["backend"], r["size"], r["scenario"]): r for r in old["results"]}
+    print(f"\nComparison against {old.get('commit')} ({old_path})")
+    print(f"{'scenario':45} {'size':>9} {'p50 old':>10} {'p50 new':>10} {'change':>8}")
+    for r in new["results"]:
+        before = old_results.get((r["backend"], r["size"], r["scenario"]))
+        if not before or not before["p50_ms"]:
+            continue
+        change = (r["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        print(f"{r['scenario']:45} {r['size']:>9} {before['p50_ms']:>10.3f} {r['p50_ms']:>10.3f} {change:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tools and the data layer.")
+    parser.add_argument("--backends", default="mock", help=f"Comma-separated backends: {', '.join(BACKENDS)}")
+    parser.add_argument("--sizes", default="1000", help="Comma-separated dataset sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--scenarios", default="*", help="Glob over scenario names, e.g. 'tool.*' or 'data.*'")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Minimum seconds per scenario")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=10000)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Previous result file to compare against")
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    selected = [name for name in SCENARIOS if fnmatch.fnmatch(name, args.scenarios)]
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [],
+    }
+
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            print(f"\n== backend={backend} size={size} ==")
+            started = time.perf_counter()
+            load_dataset(backend, size)
+            print(f"dataset loaded in {time.perf_counter() - started:.2f}s")
+            print(f"{'scenario':45} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak KB':>10}")
+            for name in selected:
+                group, fn = SCENARIOS[name]
+                result = run_scenario(fn, args.min_time, args.min_iterations, args.max_iterations)
+                result.update({"backend": backend, "size": size, "scenario": name, "group": group})
+                report["results"].append(result)
+                print(f"{name:45} {result['ops_per_sec'] or 0:>10.1f} {result['p50_ms']:>10.3f} "
+                      f"{result['p99_ms']:>10.3f} {result['peak_memory_kb']:>10.1f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
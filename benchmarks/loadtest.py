@@ -0,0 +1,264 @@
+"""
+End-to-end load generator for the HTTP MCP endpoint.
+
+Opens many concurrent MCP client sessions against a running server and
+replays a weighted mix of tool calls at a target rate. It reports
+throughput, latency percentiles and error rates per step. With --ramp it
+steps the offered rate up and reports the saturation point: the first step
+where throughput falls behind the offered rate, p99 exceeds the SLO, or
+errors exceed 1%.
+
+    # against a server that is already running
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000/mcp --rate 50 --duration 30
+
+    # start a local server seeded with a 100k-row SQLite dataset and find saturation
+    python -m benchmarks.loadtest --spawn sqlite --size 100000 --ramp 25,50,100,200,400
+
+Latency is measured from each request's scheduled start, not its actual
+send time, so a server that falls behind shows up as queueing delay rather
+than being hidden (no coordinated omission).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+from fastmcp import Client
+
+TEAM = "team@example.com"
+MANAGER = "manager@example.com"
+ADMIN = "admin@example.com"
+
+# category -> list of (tool, argument factory)
+CALLS = {
+    "reads": [
+        ("list_campaigns", lambda rng: {"status": "active"}),
+        ("list_tasks", lambda rng: {"user_email": rng.choice([TEAM, MANAGER])}),
+        ("list_assets", lambda rng: {"status": "pending"}),
+        ("list_activity", lambda rng: {"limit": 50}),
+        ("list_team_members", lambda rng: {}),
+        ("get_user_role", lambda rng: {"email": rng.choice([TEAM, MANAGER, ADMIN])}),
+    ],
+    "mutations": [
+        ("create_task", lambda rng: {"title": "Load test task", "assignee_email": TEAM,
+                                     "due_date": "2025-01-15", "creator_email": MANAGER}),
+        ("update_task_status", lambda rng: {"task_id": str(rng.randint(1, 100)),
+                                            "new_status": rng.choice(["todo", "in_progress"]), "user_email": MANAGER}),
+        ("log_activity", lambda rng: {"actor_email": TEAM, "action": "load_test", "entity_type": "task", "entity_id": "1"}),
+        ("upload_asset", lambda rng: {"requester_email": TEAM, "asset_url": "https://cdn.example.com/load.png",
+                                      "description": "Load test asset"}),
+    ],
+    "dashboards": [
+        ("marketing_snapshot", lambda rng: {}),
+        ("channel_performance", lambda rng: {}),
+        ("generate_dashboard_summary", lambda rng: {"period": "daily"}),
+    ],
+    "ai": [
+        ("ai_generate_ideas", lambda rng: {"topic": "spring launch", "count": 5}),
+        ("ai_generate_copy", lambda rng: {"style": "bold", "details": {"benefit": "speed"}}),
+        ("ai_campaign_review", lambda rng: {"campaign": {"name": "Load Test", "channel": ["email"]}}),
+    ],
+}
+DEFAULT_MIX = "reads=60,mutations=15,dashboards=20,ai=5"
+
+
+def parse_mix(spec: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in CALLS:
+            raise ValueError(f"Unknown category '{name}'. Choose from: {', '.join(CALLS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # category -> ms
+        self.errors = defaultdict(int)
+        self.error_samples = []
+
+    def summary(self, elapsed: float, offered_rate: float) -> dict:
+        all_latencies = sorted(l for values in self.latencies.values() for l in values)
+        completed = len(all_latencies)
+        errors = sum(self.errors.values())
+        total = completed + errors
+        per_category = {}
+        for category, values in self.latencies.items():
+            values.sort()
+            per_category[category] = {"ok": len(values), "errors": self.errors.get(category, 0),
+                                      "p50_ms": round(_percentile(values, 50), 2),
+                                      "p99_ms": round(_percentile(values, 99), 2)}
+        return {
+            "offered_rate": offered_rate,
+            "throughput": round(completed / elapsed, 2) if elapsed else 0,
+            "requests": total,
+            "error_rate": round(errors / total, 4) if total else 0,
+            "p50_ms": round(_percentile(all_latencies, 50), 2),
+            "p90_ms": round(_percentile(all_latencies, 90), 2),
+            "p99_ms": round(_percentile(all_latencies, 99), 2),
+            "max_ms": round(all_latencies[-1], 2) if all_latencies else 0,
+            "categories": per_category,
+            "error_samples": self.error_samples[:5],
+        }
+
+
+async def _session(url: str, queue: asyncio.Queue, recorder: Recorder):
+    async with Client(url, timeout=60) as client:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            scheduled, category, tool, args = item
+            try:
+                result = await client.call_tool(tool, args, raise_on_error=False)
+                if result.is_error:
+                    raise RuntimeError(str(result.content)[:200])
+                recorder.latencies[category].append((time.perf_counter() - scheduled) * 1000)
+            except Exception as e:
+                recorder.errors[category] += 1
+                recorder.error_samples.append(f"{tool}: {e}")
+
+
+async def run_step(url: str, sessions: int, rate: float, duration: float, mix: list, seed: int) -> dict:
+    """
+    Offer `rate` calls/sec (open loop) for `duration` seconds across `sessions`
+    concurrent MCP sessions. rate <= 0 means closed loop: as fast as possible.
+    """
+    rng = random.Random(seed)
+    recorder = Recorder()
+    queue = asyncio.Queue(maxsize=sessions * 4 if rate <= 0 else 0)
+    workers = [asyncio.create_task(_session(url, queue, recorder)) for _ in range(sessions)]
+    await asyncio.sleep(0.5)  # let sessions initialise before the clock starts
+
+    categories = [c for c, _ in mix]
+    weights = [w for _, w in mix]
+    started = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - started < duration:
+        category = rng.choices(categories, weights)[0]
+        tool, make_args = rng.choice(CALLS[category])
+        if rate > 0:
+            scheduled = started + sent / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            scheduled = time.perf_counter()
+        await queue.put((scheduled, category, tool, make_args(rng)))
+        sent += 1
+
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    return recorder.summary(elapsed, rate)
+
+
+def spawn_server(backend: str, size: int, port: int) -> subprocess.Popen:
+    """
+    Start server.py locally in mock or SQLite mode, with provider credentials
+    blanked so notification and AI tools use their local stubs.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PORT=str(port), ENABLE_SCHEDULER="false", SUPABASE_URL="", SUPABASE_KEY="",
+               OPENAI_API_KEY="", TWILIO_ACCOUNT_SID="", EMAIL_SMTP_HOST="", SMTP_HOST="")
+    if backend == "sqlite":
+        sys.path.insert(0, root)
+        import datagen
+        path = os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "hub.db")
+        print(f"Seeding {size} rows into {path} ...")
+        datagen.seed_sqlite(path, size)
+        env.update(MOCK_MODE="false", SQLITE_PATH=path)
+    else:
+        env.update(MOCK_MODE="true", MOCK_SEED_SIZE=str(size))
+    process = subprocess.Popen([sys.executable, "server.py"], cwd=root, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process
+
+
+async def wait_until_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with Client(url, timeout=5) as client:
+                await client.list_tools()
+                return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+def _print_step(result: dict):
+    print(f"offered {result['offered_rate'] or 'max':>7}/s  throughput {result['throughput']:>8.1f}/s  "
+          f"p50 {result['p50_ms']:>8.1f}ms  p99 {result['p99_ms']:>8.1f}ms  errors {result['error_rate']:.2%}")
+
+
+async def main_async(args) -> dict:
+    mix = parse_mix(args.mix)
+    process = None
+    url = args.url
+    if args.spawn:
+        url = f"http://127.0.0.1:{args.port}/mcp"
+        process = spawn_server(args.spawn, args.size, args.port)
+    try:
+        await wait_until_ready(url)
+        rates = [float(r) for r in args.ramp.split(",")] if args.ramp else [args.rate]
+        steps = []
+        saturation = None
+        for i, rate in enumerate(rates):
+            result = await run_step(url, args.sessions, rate, args.duration, mix, args.seed + i)
+            steps.append(result)
+            _print_step(result)
+            saturated = (result["error_rate"] > 0.01 or result["p99_ms"] > args.slo_ms
+                         or (rate > 0 and result["throughput"] < 0.9 * rate))
+            if saturated and args.ramp:
+                saturation = {"offered_rate": rate, "last_good_rate": rates[i - 1] if i else None,
+                              "max_throughput": max(s["throughput"] for s in steps)}
+                print(f"Saturated at {rate}/s; max sustained throughput {saturation['max_throughput']}/s")
+                break
+        return {"url": url, "sessions": args.sessions, "mix": dict(mix), "steps": steps, "saturation": saturation}
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the HTTP MCP endpoint.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/mcp")
+    parser.add_argument("--spawn", choices=["mock", "sqlite"], help="Start a local server instead of using --url")
+    parser.add_argument("--size", type=int, default=10000, help="Dataset size for --spawn")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent MCP client sessions")
+    parser.add_argument("--rate", type=float, default=0, help="Target calls/sec (0 = as fast as possible)")
+    parser.add_argument("--ramp", help="Comma-separated rates to step through, e.g. 25,50,100,200")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per step")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Category weights (default {DEFAULT_MIX})")
+    parser.add_argument("--slo-ms", type=float, default=1000, help="p99 above this counts as saturated")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cold-start report: where import time goes, and how long until the first
+list_tools response.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --top 30 --runs 5
+
+Each run uses a fresh interpreter with `-X importtime`. Self time is summed
+per top-level package, so third-party costs (fastmcp, mcp, pydantic, ...)
+and our own modules are shown separately.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_FIRST_LIST_TOOLS = """
+import time, asyncio, json
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+from fastmcp import Client
+async def main():
+    async with Client(server.mcp) as client:
+        tools = await client.list_tools()
+    print(json.dumps({"import_s": imported - started, "first_list_tools_s": time.perf_counter() - started,
+                      "tools": len(tools)}))
+asyncio.run(main())
+"""
+
+
+def import_breakdown() -> tuple[dict, dict]:
+    """
+    Run `import server` under -X importtime; return self time per top-level
+    package and per module, in microseconds.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                            cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, MOCK_MODE="true"))
+    by_package = defaultdict(int)
+    by_module = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        by_package[module.split(".")[0]] += int(self_us)
+        by_module[module] = int(self_us)
+    return dict(by_package), by_module
+
+
+def first_list_tools() -> dict:
+    result = subprocess.run([sys.executable, "-W", "ignore", "-c", _FIRST_LIST_TOOLS], cwd=ROOT,
+                            capture_output=True, text=True, env=dict(os.environ, MOCK_MODE="true"))
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report cold-start import time.")
+    parser.add_argument("--top", type=int, default=15, help="Packages to show")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters for time to first list_tools")
+    args = parser.parse_args(argv)
+
+    by_package, by_module = import_breakdown()
+    total = sum(by_package.values())
+    print(f"Import time of `import server`: {total / 1e6:.3f}s\n")
+    print(f"{'package':30} {'self ms':>10} {'share':>7}")
+    for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{package:30} {us / 1000:>10.1f} {us / total:>7.1%}")
+
+    ours = {m: us for m, us in by_module.items() if m.split(".")[0] in ("server", "tools", "supabase_client",
+            "tool_manifest", "profiling", "tracing", "sqlite_store", "scheduler")}
+    print(f"\nProject modules: {sum(ours.values()) / 1000:.1f}ms")
+    for module, us in sorted(ours.items(), key=lambda kv: -kv[1]):
+        print(f"  {module:28} {us / 1000:>8.1f}ms")
+
+    runs = [first_list_tools() for _ in range(args.runs)]
+    best = min(runs, key=lambda r: r["first_list_tools_s"])
+    print(f"\nTime to first list_tools ({len(runs)} runs, best): {best['first_list_tools_s']:.3f}s "
+          f"(import {best['import_s']:.3f}s, {best['tools']} tools)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Content-addressed blob storage for uploaded asset files.
+
+A blob's key is the SHA-256 of its bytes, so identical files are stored
+once and every asset that uploads them references the same key.
+
+    BLOB_STORE=local     ->  files under BLOB_DIR/<first 2 hex chars>/<sha256> (default)
+    BLOB_STORE=supabase  ->  Supabase Storage bucket BLOB_BUCKET, path sha256/<first 2>/<sha256>
+
+Local blobs are served by the server at /blobs/<sha256>. Supabase blob URLs are
+the bucket's public URLs, so make the bucket public or sign URLs yourself.
+Stores take finished files from disk and stream them, so memory use stays
+flat regardless of file size.
+"""
+import os
+import re
+from typing import BinaryIO, Optional
+
+import supabase_client as db
+
+BLOB_STORE = os.environ.get("BLOB_STORE", "local")
+BLOB_DIR = os.environ.get("BLOB_DIR", "blobs")
+BLOB_BUCKET = os.environ.get("BLOB_BUCKET", "assets")
+# Prefix for local blob URLs, e.g. https://hub.example.com; relative by default.
+BLOB_BASE_URL = os.environ.get("BLOB_BASE_URL", "").rstrip("/")
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def valid_key(key: str) -> bool:
+    return bool(key) and bool(_SHA256.match(key))
+
+
+class LocalBlobStore:
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put_file(self, key: str, source: str, content_type: Optional[str] = None):
+        """
+        Move a finished file into the store. If another upload stored the same
+        key first, that copy is kept; the content is identical.
+        """
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.remove(source)
+            return
+        os.replace(source, target)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{BLOB_BASE_URL}/blobs/{key}"
+
+
+class SupabaseBlobStore:
+    def __init__(self, bucket: str = BLOB_BUCKET):
+        self.bucket = bucket
+
+    def _storage(self):
+        client = db.get_client()
+        if not client:
+            raise RuntimeError("BLOB_STORE=supabase needs SUPABASE_URL and SUPABASE_KEY")
+        return client.storage.from_(self.bucket)
+
+    def path(self, key: str) -> str:
+        return f"sha256/{key[:2]}/{key}"
+
+    def exists(self, key: str) -> bool:
+        return self._storage().exists(self.path(key))
+
+    def put_file(self, key: str, source: str, content_type: Optional[str] = None):
+        options = {"upsert": "true"}
+        if content_type:
+            options["content-type"] = content_type
+        with open(source, "rb") as f:
+            self._storage().upload(self.path(key), f, options)
+        os.remove(source)
+
+    def open(self, key: str) -> BinaryIO:
+        raise NotImplementedError("Supabase blobs are read through their URL")
+
+    def size(self, key: str) -> int:
+        return int(self._storage().info(self.path(key)).get("size", 0))
+
+    def delete(self, key: str):
+        self._storage().remove([self.path(key)])
+
+    def url(self, key: str) -> str:
+        return self._storage().get_public_url(self.path(key))
+
+
+STORES = {"local": LocalBlobStore, "supabase": SupabaseBlobStore}
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if BLOB_STORE not in STORES:
+            raise ValueError(f"Unknown BLOB_STORE '{BLOB_STORE}'. Choose from: {', '.join(STORES)}")
+        _store = STORES[BLOB_STORE]()
+    return _store
+
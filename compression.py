@@ -0,0 +1,125 @@
+"""
+HTTP response compression, negotiated through the client's Accept-Encoding.
+
+Bodies are compressed with brotli when the client accepts "br" and the brotli
+package is installed, otherwise with gzip. Only JSON and text bodies of at
+least COMPRESS_MIN_BYTES and at most COMPRESS_MAX_BYTES are compressed. Event streams, HEAD responses,
+responses that are already encoded, and blobs (images, video) pass through
+untouched. A compressible body is buffered whole before compressing, which
+suits tool results: the server has each one in memory anyway.
+"""
+import os
+import gzip
+import asyncio
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "1"))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "4"))
+# Bodies beyond this are sent as they are rather than buffered (e.g. large text blobs).
+COMPRESS_MAX_BYTES = int(os.environ.get("COMPRESS_MAX_BYTES", str(64 << 20)))
+# Larger bodies are compressed off the event loop.
+_THREAD_BYTES = 256 << 10
+
+
+def accepted_encodings(header: str) -> set:
+    """
+    Codings named in an Accept-Encoding header, without those refused by q=0.
+    """
+    codings = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name.strip():
+            codings.add(name.strip().lower())
+    return codings
+
+
+def choose_encoding(header: str):
+    codings = accepted_encodings(header)
+    if brotli is not None and "br" in codings:
+        return "br"
+    if "gzip" in codings or "*" in codings:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _compressible(content_type: str) -> bool:
+    content_type = content_type.split(";")[0].strip().lower()
+    return (content_type == "application/json" or content_type.startswith("text/")) \
+        and content_type != "text/event-stream"
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses as described above.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            return await self.app(scope, receive, send)
+        header = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"accept-encoding"), "")
+        encoding = choose_encoding(header)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        chunks = []
+        size = [0]
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                if b"content-encoding" in headers or not _compressible(headers.get(b"content-type", b"").decode("latin-1")) \
+                        or int(headers.get(b"content-length", b"0")) > COMPRESS_MAX_BYTES:
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            chunks.append(message.get("body", b""))
+            size[0] += len(chunks[-1])
+            if message.get("more_body", False):
+                if size[0] > COMPRESS_MAX_BYTES:
+                    passthrough = True
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                return
+            body = b"".join(chunks)
+            headers = [(name, value) for name, value in start.get("headers", []) if name.lower() != b"content-length"]
+            if len(body) >= self.minimum_size:
+                if len(body) > _THREAD_BYTES:
+                    body = await asyncio.to_thread(compress, body, encoding)
+                else:
+                    body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+            headers += [(b"content-length", str(len(body)).encode()), (b"vary", b"Accept-Encoding")]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
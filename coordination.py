@@ -0,0 +1,216 @@
+import os
+import fcntl
+import socket
+import tempfile
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Optional
+
+from supabase_client import backend_name, fetch_rows, insert_row, update_rows
+
+# Leader election and job bookkeeping shared by every process and replica.
+# Exactly one process holding the lease runs singleton work such as the
+# APScheduler jobs; the others keep retrying so a new leader takes over if the
+# current one exits. With Supabase or SQLite the lease is a row in
+# `scheduler_leases`, which covers every replica; in mock mode an flock()ed
+# file stands in and covers the workers of one host.
+SCHEDULER_LOCK_FILE = os.environ.get(
+    "SCHEDULER_LOCK_FILE", os.path.join(tempfile.gettempdir(), "marketing-hub-scheduler.lock")
+)
+LEADER_RETRY_SECONDS = float(os.environ.get("LEADER_RETRY_SECONDS", "15"))
+LEASE_TTL_SECONDS = float(os.environ.get("LEASE_TTL_SECONDS", "60"))
+LEADER_LEASE = os.environ.get("LEADER_LEASE", "auto")  # "auto", "backend" or "file"
+
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class FileLease:
+    """
+    Exclusive lease backed by flock() on a local file. Covers every worker on one
+    host; the kernel releases it when the holding process dies.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def renew(self) -> bool:
+        return self._fd is not None
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class BackendLease:
+    """
+    Lease stored as a row in the `scheduler_leases` table. Acquiring is a
+    compare-and-set on an expired row; the holder renews it well before it
+    expires, and a crashed holder's lease lapses after the TTL.
+    """
+
+    TABLE = "scheduler_leases"
+
+    def __init__(self, name: str, ttl_seconds: float = LEASE_TTL_SECONDS, holder: str = HOLDER_ID):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.holder = holder
+
+    def _claim(self) -> dict:
+        now = _now()
+        return {"holder": self.holder, "expires_at": (now + self.ttl).isoformat(), "renewed_at": now.isoformat()}
+
+    def try_acquire(self) -> bool:
+        now = _now().isoformat()
+        if update_rows(self.TABLE, {"id": self.name, "expires_at__lt": now}, self._claim()):
+            return True
+        if self.renew():
+            return True
+        try:
+            return bool(insert_row(self.TABLE, {"id": self.name, **self._claim()}))
+        except Exception:
+            return False  # Someone else holds it (duplicate key)
+
+    def renew(self) -> bool:
+        return bool(update_rows(self.TABLE, {"id": self.name, "holder": self.holder}, self._claim()))
+
+    def release(self):
+        update_rows(self.TABLE, {"id": self.name, "holder": self.holder}, {"expires_at": _now().isoformat()})
+
+
+def make_lease(name: str, lock_file: Optional[str] = None):
+    kind = LEADER_LEASE
+    if kind == "auto":
+        kind = "file" if backend_name() == "mock" else "backend"
+    if kind == "backend":
+        return BackendLease(name)
+    return FileLease(lock_file or SCHEDULER_LOCK_FILE)
+
+
+class LeaderElection:
+    """
+    Background loop that calls on_elected() when this process wins the lease,
+    renews it while leading, and calls on_demoted() if a renewal fails (e.g.
+    the process stalled past the TTL and another replica took over).
+    """
+
+    def __init__(self, name: str, lease, on_elected: Callable[[], None],
+                 on_demoted: Optional[Callable[[], None]] = None, retry_seconds: float = LEADER_RETRY_SECONDS):
+        self.name = name
+        self.lease = lease
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"leader-{name}", daemon=True)
+
+    def start(self) -> "LeaderElection":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        renew_every = min(self.retry_seconds, LEASE_TTL_SECONDS / 3)
+        while not self._stop.is_set():
+            try:
+                if not self.is_leader and self.lease.try_acquire():
+                    self.is_leader = True
+                    print(f"{HOLDER_ID} elected leader for {self.name}")
+                    self.on_elected()
+                elif self.is_leader and not self.lease.renew():
+                    self.is_leader = False
+                    print(f"{HOLDER_ID} lost leadership for {self.name}")
+                    if self.on_demoted:
+                        self.on_demoted()
+            except Exception as e:
+                print(f"Leader election error ({self.name}): {e}")
+            self._stop.wait(renew_every if self.is_leader else self.retry_seconds)
+
+    def stop(self):
+        self._stop.set()
+        if self.is_leader:
+            self.lease.release()
+            self.is_leader = False
+
+
+def elect_leader(name: str, on_elected: Callable[[], None], on_demoted: Optional[Callable[[], None]] = None,
+                 lock_file: Optional[str] = None) -> LeaderElection:
+    """
+    Start competing for leadership of `name`; on_elected runs in the winner only.
+    """
+    return LeaderElection(name, make_lease(name, lock_file), on_elected, on_demoted).start()
+
+
+# --- Job run records ---
+# One row per (job, schedule slot) in `job_runs`, keyed "<job>@<slot>". Claiming
+# the row before running makes execution idempotent: a slot that another
+# replica (or an earlier catch-up) already ran or is running is skipped.
+
+RUNS_TABLE = "job_runs"
+STALE_RUN_SECONDS = float(os.environ.get("JOB_STALE_RUN_SECONDS", "3600"))
+
+
+def run_id(job: str, slot: datetime) -> str:
+    return f"{job}@{slot.astimezone(timezone.utc).isoformat()}"
+
+
+def claim_run(job: str, slot: datetime) -> Optional[dict]:
+    """
+    Claim the run for this slot. Returns the run record, or None if the slot has
+    already succeeded or is being run elsewhere. Failed runs, and runs stuck
+    "running" for longer than JOB_STALE_RUN_SECONDS, can be claimed again.
+    """
+    now = _now()
+    record = {"job": job, "slot": slot.astimezone(timezone.utc).isoformat(), "status": "running",
+              "holder": HOLDER_ID, "started_at": now.isoformat(), "finished_at": None, "rows": {}, "error": None}
+    rid = run_id(job, slot)
+    try:
+        return insert_row(RUNS_TABLE, {"id": rid, "attempts": 1, **record})
+    except Exception:
+        pass
+    existing = fetch_rows(RUNS_TABLE, {"id": rid})
+    attempts = (existing[0].get("attempts") or 1) + 1 if existing else 1
+    stale_before = (now - timedelta(seconds=STALE_RUN_SECONDS)).isoformat()
+    for condition in ({"id": rid, "status": "failed"}, {"id": rid, "status": "running", "started_at__lt": stale_before}):
+        claimed = update_rows(RUNS_TABLE, condition, {**record, "attempts": attempts})
+        if claimed:
+            return claimed[0]
+    return None
+
+
+def finish_run(run: dict, status: str, rows: Optional[dict] = None, error: Optional[str] = None) -> dict:
+    updated = update_rows(RUNS_TABLE, {"id": run["id"], "holder": HOLDER_ID},
+                          {"status": status, "finished_at": _now().isoformat(), "rows": rows or {}, "error": error})
+    return updated[0] if updated else run
+
+
+def has_run(job: str, slot: datetime) -> bool:
+    """
+    True if a run record exists for this slot, whatever its status.
+    """
+    return bool(fetch_rows(RUNS_TABLE, {"id": run_id(job, slot)}))
+
+
+def recent_runs(job: Optional[str] = None, limit: int = 20) -> list[dict]:
+    runs = fetch_rows(RUNS_TABLE, {"job": job} if job else None)
+    return sorted(runs, key=lambda r: r.get("started_at") or "", reverse=True)[:limit]
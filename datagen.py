@@ -0,0 +1,356 @@
+"""
+Deterministic synthetic dataset generator.
+
+Produces users, campaigns, tasks, assets and activity logs with realistic
+distributions (skewed workloads, date-dependent statuses, weighted channels)
+from a seed, plus the demo automation rules. Rows are generated lazily, one at a time, so output can scale to
+millions of rows with flat memory, and the same seed always yields the same
+rows. Sinks:
+
+    python datagen.py --size 1000000 --sqlite hub.db
+    python datagen.py --size 1000000 --ndjson data/
+    python datagen.py --size 1000000 --csv data/
+
+or, from code, seed_mock(size) to fill the in-memory MOCK_DB.
+"""
+import os
+import sys
+import csv
+import json
+import random
+import argparse
+import itertools
+import functools
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+# Statuses are derived relative to this date so datasets do not change with
+# the day they are generated on.
+REFERENCE_DATE = datetime(2025, 1, 1)
+HISTORY_DAYS = 730
+
+DEMO_USERS = [
+    {"email": "admin@example.com", "role": "admin", "name": "Admin User", "phone_number": "+15550000001"},
+    {"email": "manager@example.com", "role": "manager", "name": "Manager User", "phone_number": "+15550000002"},
+    {"email": "team@example.com", "role": "team", "name": "Team User", "phone_number": "+15550000003"},
+]
+
+# The same rules as the demo MOCK_DB, so automation tools have rules to work on
+DEMO_AUTOMATIONS = [
+    {"id": "1", "name": "Daily Overdue Task Alert", "is_enabled": True, "trigger_type": "task_overdue_daily",
+     "condition_json": {"min_overdue": 1}, "actions_json": [{"type": "whatsapp", "to": "manager"}],
+     "created_at": "2024-06-01T09:00:00"},
+    {"id": "2", "name": "Weekly Email Report", "is_enabled": False, "trigger_type": "campaign_summary_weekly",
+     "condition_json": {}, "actions_json": [{"type": "email_report", "to": "admin@example.com"}],
+     "created_at": "2024-06-01T09:00:00"},
+]
+
+CHANNELS = ["email", "social", "ads", "blog", "sms", "events"]
+CHANNEL_WEIGHTS = [30, 30, 20, 10, 6, 4]
+CAMPAIGN_THEMES = ["Summer Sale", "Black Friday", "Spring Launch", "Back to School", "Holiday Promo",
+                   "Product Launch", "Brand Awareness", "Webinar Series", "Loyalty Drive", "Flash Sale"]
+TASK_VERBS = ["Design", "Write", "Review", "Approve", "Schedule", "Publish", "Analyse", "Translate"]
+TASK_OBJECTS = ["ad creatives", "landing page", "email copy", "social posts", "budget", "banner",
+                "press release", "video script", "audience segments", "A/B test"]
+ASSET_KINDS = [("Banner Image", "png"), ("Hero Image", "jpg"), ("Promo Video", "mp4"),
+               ("Brochure", "pdf"), ("Social Card", "png"), ("Logo Variant", "svg")]
+ACTIONS = [("update_status", "task", 35), ("create_task", "task", 20), ("upload_asset", "asset", 15),
+           ("review_asset", "asset", 10), ("update_status", "campaign", 10), ("create_campaign", "campaign", 5),
+           ("login", "user", 5)]
+
+COLUMNS = {
+    "users": ["email", "role", "name", "phone_number"],
+    "campaigns": ["id", "name", "status", "channel", "start_date", "end_date", "owner_email", "budget", "updated_at"],
+    "tasks": ["id", "title", "description", "status", "priority", "assignee", "due_date", "campaign_id", "created_at"],
+    "assets": ["id", "description", "file_url", "file_type", "size_bytes", "status", "requester_email",
+               "related_campaign_id", "created_at"],
+    "activity_log": ["id", "actor_email", "action", "entity_type", "entity_id", "metadata", "created_at"],
+    "automations": ["id", "name", "is_enabled", "trigger_type", "condition_json", "actions_json", "created_at"],
+}
+TABLES = list(COLUMNS)
+
+
+def plan(size: int) -> dict:
+    """
+    Row counts per table for a dataset of `size` tasks / activity rows.
+    """
+    return {
+        "users": max(len(DEMO_USERS), size // 200),
+        "campaigns": max(2, size // 20),
+        "tasks": size,
+        "assets": max(1, size // 10),
+        "activity_log": size,
+        "automations": len(DEMO_AUTOMATIONS),
+    }
+
+
+def _rng(seed: int, *parts) -> random.Random:
+    return random.Random(":".join(str(p) for p in (seed,) + parts))
+
+
+def _user_email(index: int) -> str:
+    return DEMO_USERS[index]["email"] if index < len(DEMO_USERS) else f"user{index}@example.com"
+
+
+def _user_role(index: int) -> str:
+    if index < len(DEMO_USERS):
+        return DEMO_USERS[index]["role"]
+    slot = index % 20
+    return "admin" if slot == 0 else "manager" if slot in (1, 2, 3) else "team"
+
+
+def _skewed_index(rng: random.Random, n: int) -> int:
+    # A few users/campaigns carry most of the work, like real teams.
+    return min(n - 1, int(n * rng.random() ** 2.5))
+
+
+def _manager_index(rng: random.Random, n_users: int) -> int:
+    index = _skewed_index(rng, n_users)
+    while _user_role(index) == "team":
+        index = (index + 1) % n_users
+    return index
+
+
+@functools.lru_cache(maxsize=65536)
+def _campaign_window(seed: int, campaign_id: int) -> tuple[datetime, datetime]:
+    rng = _rng(seed, "campaign", campaign_id)
+    start = REFERENCE_DATE - timedelta(days=HISTORY_DAYS) + timedelta(days=rng.randint(0, HISTORY_DAYS + 120))
+    duration = max(3, int(rng.lognormvariate(3.2, 0.6)))  # median ~25 days
+    return start, start + timedelta(days=duration)
+
+
+def iter_users(count: int, seed: int = 42) -> Iterator[dict]:
+    for i in range(count):
+        if i < len(DEMO_USERS):
+            yield dict(DEMO_USERS[i])
+            continue
+        yield {
+            "email": _user_email(i),
+            "role": _user_role(i),
+            "name": f"User {i}",
+            "phone_number": f"+1555{i:07d}",
+        }
+
+
+def iter_automations(count: int) -> Iterator[dict]:
+    for automation in DEMO_AUTOMATIONS[:count]:
+        yield json.loads(json.dumps(automation))
+
+
+def iter_campaigns(count: int, n_users: int, seed: int = 42) -> Iterator[dict]:
+    rng = _rng(seed, "campaigns")
+    for i in range(1, count + 1):
+        start, end = _campaign_window(seed, i)
+        if end < REFERENCE_DATE:
+            status = "completed" if rng.random() < 0.9 else "archived"
+        elif start > REFERENCE_DATE:
+            status = rng.choice(["planned", "draft"])
+        else:
+            status = "active" if rng.random() < 0.85 else "paused"
+        channels = set()
+        for _ in range(rng.choice([1, 1, 2, 2, 3])):
+            channels.add(rng.choices(CHANNELS, CHANNEL_WEIGHTS)[0])
+        yield {
+            "id": str(i),
+            "name": f"{rng.choice(CAMPAIGN_THEMES)} {start.year} #{i}",
+            "status": status,
+            "channel": sorted(channels),
+            "start_date": start.strftime("%Y-%m-%d"),
+            "end_date": end.strftime("%Y-%m-%d"),
+            "owner_email": _user_email(_manager_index(rng, n_users)),
+            "budget": round(rng.lognormvariate(8.5, 1.0), 2),
+            "updated_at": min(end, REFERENCE_DATE).isoformat() + "Z",
+        }
+
+
+def iter_tasks(count: int, n_users: int, n_campaigns: int, seed: int = 42) -> Iterator[dict]:
+    rng = _rng(seed, "tasks")
+    for i in range(1, count + 1):
+        campaign_id = _skewed_index(rng, n_campaigns) + 1
+        start, end = _campaign_window(seed, campaign_id)
+        span_days = max(1, (end - start).days)
+        due = start + timedelta(days=rng.randint(-7, span_days))
+        if due < REFERENCE_DATE:
+            status = "completed" if rng.random() < 0.8 else rng.choice(["todo", "in_progress"])
+        else:
+            status = rng.choices(["todo", "in_progress", "completed"], [55, 35, 10])[0]
+        yield {
+            "id": str(i),
+            "title": f"{rng.choice(TASK_VERBS)} {rng.choice(TASK_OBJECTS)}",
+            "description": f"Work item {i} for campaign {campaign_id}",
+            "status": status,
+            "priority": rng.choices(["low", "medium", "high"], [30, 50, 20])[0],
+            "assignee": _user_email(_skewed_index(rng, n_users)),
+            "due_date": due.strftime("%Y-%m-%d"),
+            "campaign_id": str(campaign_id),
+            "created_at": (due - timedelta(days=rng.randint(1, 30))).isoformat() + "Z",
+        }
+
+
+def iter_assets(count: int, n_users: int, n_campaigns: int, seed: int = 42) -> Iterator[dict]:
+    rng = _rng(seed, "assets")
+    for i in range(1, count + 1):
+        campaign_id = _skewed_index(rng, n_campaigns) + 1
+        start, _ = _campaign_window(seed, campaign_id)
+        kind, ext = rng.choice(ASSET_KINDS)
+        created = start - timedelta(days=rng.randint(0, 14), minutes=rng.randint(0, 1439))
+        yield {
+            "id": str(i),
+            "description": f"{kind} {i}",
+            "file_url": f"https://cdn.example.com/assets/{i}.{ext}",
+            "file_type": ext,
+            "size_bytes": int(rng.lognormvariate(12.5, 1.2)),
+            "status": "pending" if created > REFERENCE_DATE - timedelta(days=14)
+            else rng.choices(["approved", "rejected", "pending"], [75, 15, 10])[0],
+            "requester_email": _user_email(_skewed_index(rng, n_users)),
+            "related_campaign_id": str(campaign_id),
+            "created_at": created.isoformat() + "Z",
+        }
+
+
+def iter_activity(count: int, n_users: int, n_entities: int, seed: int = 42) -> Iterator[dict]:
+    rng = _rng(seed, "activity_log")
+    step = HISTORY_DAYS * 86400 / max(1, count)
+    at = REFERENCE_DATE - timedelta(days=HISTORY_DAYS)
+    actions = [(a, e) for a, e, _ in ACTIONS]
+    weights = [w for _, _, w in ACTIONS]
+    for i in range(1, count + 1):
+        at += timedelta(seconds=rng.expovariate(1 / step))  # Poisson arrivals
+        action, entity_type = rng.choices(actions, weights)[0]
+        actor = _user_email(_skewed_index(rng, n_users))
+        yield {
+            "id": str(i),
+            "actor_email": actor,
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": actor if entity_type == "user" else str(rng.randint(1, n_entities)),
+            "metadata": {},
+            "created_at": at.isoformat() + "Z",
+        }
+
+
+def iter_table(table: str, size: int, seed: int = 42) -> Iterator[dict]:
+    """
+    Stream the rows of one table for a dataset of the given size.
+    """
+    counts = plan(size)
+    if table == "users":
+        return iter_users(counts["users"], seed)
+    if table == "campaigns":
+        return iter_campaigns(counts["campaigns"], counts["users"], seed)
+    if table == "tasks":
+        return iter_tasks(counts["tasks"], counts["users"], counts["campaigns"], seed)
+    if table == "assets":
+        return iter_assets(counts["assets"], counts["users"], counts["campaigns"], seed)
+    if table == "activity_log":
+        return iter_activity(counts["activity_log"], counts["users"], counts["tasks"], seed)
+    if table == "automations":
+        return iter_automations(counts["automations"])
+    raise ValueError(f"Unknown table: {table}")
+
+
+def reset_caches():
+    """
+    Drop the in-process caches built from the previous dataset: replicas,
+    search and date indexes. A cache whose module is not loaded (or still
+    loading, as when supabase_client seeds MOCK_SEED_SIZE) holds nothing yet.
+    """
+    for name in ("replica", "search_index", "date_index"):
+        reset = getattr(sys.modules.get(name), "reset", None)
+        if reset is not None:
+            reset()
+
+
+def seed_mock(size: int, seed: int = 42, tables: Optional[list[str]] = None):
+    """
+    Replace the contents of MOCK_DB with a generated dataset.
+    """
+    from supabase_client import MOCK_DB
+
+    for table in tables or TABLES:
+        MOCK_DB[table] = list(iter_table(table, size, seed))
+    reset_caches()
+
+
+def seed_sqlite(path: str, size: int, seed: int = 42, tables: Optional[list[str]] = None, batch_size: int = 10000):
+    """
+    Bulk-load a generated dataset into a SQLite file, one batch per transaction.
+    """
+    import sqlite_store
+
+    for table in tables or TABLES:
+        rows = iter_table(table, size, seed)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            sqlite_store.insert_rows(table, batch, path=path)
+
+
+# jsonb columns; other list columns are Postgres arrays
+JSON_COLUMNS = {"metadata", "condition_json", "actions_json"}
+
+
+def _csv_value(column: str, value):
+    if isinstance(value, dict) or (column in JSON_COLUMNS and value is not None):
+        return json.dumps(value)
+    if isinstance(value, list):
+        return "{" + ",".join(str(v) for v in value) + "}"  # Postgres array literal for COPY
+    return value
+
+
+def write_files(out_dir: str, fmt: str, size: int, seed: int = 42, tables: Optional[list[str]] = None) -> list[str]:
+    """
+    Write one <table>.csv or <table>.ndjson file per table, streaming row by row.
+    CSV files are laid out for Postgres COPY ... WITH (FORMAT csv, HEADER).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for table in tables or TABLES:
+        path = os.path.join(out_dir, f"{table}.{fmt}")
+        with open(path, "w", newline="") as f:
+            if fmt == "csv":
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS[table])
+                for row in iter_table(table, size, seed):
+                    writer.writerow([_csv_value(c, row.get(c)) for c in COLUMNS[table]])
+            elif fmt == "ndjson":
+                for row in iter_table(table, size, seed):
+                    f.write(json.dumps(row) + "\n")
+            else:
+                raise ValueError(f"Unknown format: {fmt}")
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Marketing Hub dataset.")
+    parser.add_argument("--size", type=int, default=10000, help="Number of tasks / activity rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tables", help=f"Comma-separated subset of: {', '.join(TABLES)}")
+    parser.add_argument("--sqlite", help="Seed this SQLite file (created if missing)")
+    parser.add_argument("--force", action="store_true", help="Delete an existing --sqlite file first")
+    parser.add_argument("--csv", help="Write CSV files to this directory")
+    parser.add_argument("--ndjson", help="Write NDJSON files to this directory")
+    args = parser.parse_args(argv)
+
+    tables = args.tables.split(",") if args.tables else None
+    if not (args.sqlite or args.csv or args.ndjson):
+        parser.error("choose at least one of --sqlite, --csv, --ndjson")
+
+    print(f"Row counts: {plan(args.size)}")
+    if args.sqlite:
+        if os.path.exists(args.sqlite):
+            if not args.force:
+                parser.error(f"{args.sqlite} already exists (use --force to replace it)")
+            os.remove(args.sqlite)
+        seed_sqlite(args.sqlite, args.size, args.seed, tables)
+        print(f"Seeded {args.sqlite}")
+    if args.csv:
+        print("Wrote", ", ".join(write_files(args.csv, "csv", args.size, args.seed, tables)))
+    if args.ndjson:
+        print("Wrote", ", ".join(write_files(args.ndjson, "ndjson", args.size, args.seed, tables)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Date-range indexes over campaign runs and task due dates.
+
+Campaigns are intervals [start_date, end_date]; a missing end_date means the
+campaign runs indefinitely. Open tasks (any status but completed) are points
+at their due_date. Each process keeps both in memory:
+
+- A static part: campaign intervals in a centered interval tree plus an array
+  sorted by start, and open tasks in an array sorted by due date. Window
+  queries on it cost O(log n + k).
+- A delta: rows written since the static part was built, applied from
+  events.on_change and scanned linearly by queries. Once it grows past
+  DATE_INDEX_DELTA_MAX rows (or an eighth of the index) the static part is
+  rebuilt from memory.
+
+Dates compare as ISO strings; timestamps are cut to their date. The index is
+built on first use. Writes from other processes are not seen here, so with
+SQLite or Supabase it is reloaded in the background every
+DATE_INDEX_REFRESH_SECONDS. With tenancy on, each tenant has its own index
+of its own rows (see tenancy.py).
+"""
+import os
+import time
+import heapq
+import bisect
+import threading
+import contextvars
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import events
+import tenancy
+import supabase_client as db
+
+DATE_INDEX_DELTA_MAX = int(os.environ.get("DATE_INDEX_DELTA_MAX", "1000"))
+DATE_INDEX_REFRESH_SECONDS = float(os.environ.get("DATE_INDEX_REFRESH_SECONDS", "300"))
+
+OPEN_ENDED = "9999-12-31"
+DONE_STATUS = "completed"
+
+
+def today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _day(value) -> Optional[str]:
+    if not value:
+        return None
+    value = str(value)[:10]
+    return value if len(value) == 10 and value[4] == "-" and value[7] == "-" else None
+
+
+def _interval(row: dict) -> Optional[tuple[str, str]]:
+    start, end = _day(row.get("start_date")), _day(row.get("end_date"))
+    if start is None and end is None:
+        return None
+    start = start or end
+    return start, max(start, end or OPEN_ENDED)
+
+
+# --- Centered interval tree ---
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+
+def _build_tree(intervals: list) -> Optional[_Node]:
+    """
+    Tree over (start, end, id) tuples sorted by start. Each node keeps the
+    intervals containing its center, which is the median start, so neither
+    child gets more than half and the depth is O(log n).
+    """
+    if not intervals:
+        return None
+    node = _Node()
+    node.center = intervals[len(intervals) // 2][0]
+    left, mid, right = [], [], []
+    for interval in intervals:
+        if interval[1] < node.center:
+            left.append(interval)
+        elif interval[0] > node.center:
+            right.append(interval)
+        else:
+            mid.append(interval)
+    node.by_start = mid
+    node.by_end = sorted(mid, key=lambda interval: interval[1], reverse=True)
+    node.left = _build_tree(left)
+    node.right = _build_tree(right)
+    return node
+
+
+def _stab(node: Optional[_Node], day: str) -> Iterator[tuple]:
+    """
+    Intervals containing day.
+    """
+    while node is not None:
+        if day < node.center:
+            for interval in node.by_start:
+                if interval[0] > day:
+                    break
+                yield interval
+            node = node.left
+        elif day > node.center:
+            for interval in node.by_end:
+                if interval[1] < day:
+                    break
+                yield interval
+            node = node.right
+        else:
+            yield from node.by_start
+            return
+
+
+class DateIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.campaigns = {}        # id -> row
+        self.intervals = {}        # id -> (start, end)
+        self.due = {}              # open task id -> due date
+        self.campaigns_changed = set()
+        self.tasks_changed = {}    # task id -> its due date in the static part (None if absent)
+        self._rebuild_campaigns()
+        self._rebuild_tasks()
+
+    # --- Static part ---
+
+    def _rebuild_campaigns(self):
+        intervals = sorted((start, end, cid) for cid, (start, end) in self.intervals.items())
+        self.tree = _build_tree(intervals)
+        self.starts = [start for start, _, _ in intervals]
+        self.start_ids = [cid for _, _, cid in intervals]
+        self.campaigns_changed = set()
+
+    def _rebuild_tasks(self):
+        pairs = sorted((due, tid) for tid, due in self.due.items())
+        self.due_days = [due for due, _ in pairs]
+        self.due_ids = [tid for _, tid in pairs]
+        self.tasks_changed = {}
+
+    def _maybe_rebuild(self):
+        if len(self.campaigns_changed) > max(DATE_INDEX_DELTA_MAX, len(self.intervals) // 8):
+            self._rebuild_campaigns()
+        if len(self.tasks_changed) > max(DATE_INDEX_DELTA_MAX, len(self.due) // 8):
+            self._rebuild_tasks()
+
+    # --- Writes ---
+
+    def put_campaign(self, row: dict):
+        cid = str(row.get("id"))
+        with self.lock:
+            self.campaigns_changed.add(cid)
+            self.campaigns[cid] = dict(row)
+            interval = _interval(row)
+            if interval is None:
+                self.intervals.pop(cid, None)
+            else:
+                self.intervals[cid] = interval
+            self._maybe_rebuild()
+
+    def remove_campaign(self, cid):
+        cid = str(cid)
+        with self.lock:
+            self.campaigns_changed.add(cid)
+            self.campaigns.pop(cid, None)
+            self.intervals.pop(cid, None)
+            self._maybe_rebuild()
+
+    def put_task(self, row: dict):
+        tid = str(row.get("id"))
+        due = _day(row.get("due_date")) if row.get("status") != DONE_STATUS else None
+        with self.lock:
+            if tid not in self.tasks_changed:
+                self.tasks_changed[tid] = self.due.get(tid)
+            if due is None:
+                self.due.pop(tid, None)
+            else:
+                self.due[tid] = due
+            self._maybe_rebuild()
+
+    def remove_task(self, tid):
+        tid = str(tid)
+        with self.lock:
+            if tid not in self.tasks_changed:
+                self.tasks_changed[tid] = self.due.get(tid)
+            self.due.pop(tid, None)
+            self._maybe_rebuild()
+
+    # --- Campaign queries ---
+
+    def campaigns_between(self, start: str, end: str) -> list[dict]:
+        """
+        Campaigns whose run overlaps [start, end], ordered by start date.
+        """
+        with self.lock:
+            changed = self.campaigns_changed
+            # Running on `start`, plus starting within (start, end]: disjoint, and together every overlap
+            ids = [cid for _, _, cid in _stab(self.tree, start) if cid not in changed]
+            first, last = bisect.bisect_right(self.starts, start), bisect.bisect_right(self.starts, end)
+            ids += [cid for cid in self.start_ids[first:last] if cid not in changed]
+            ids += [cid for cid in changed
+                    if cid in self.intervals and self.intervals[cid][0] <= end and self.intervals[cid][1] >= start]
+            ids.sort(key=lambda cid: (self.intervals[cid][0], cid))
+            return [self.campaigns[cid] for cid in ids]
+
+    def campaign_interval(self, cid) -> Optional[tuple[str, str]]:
+        return self.intervals.get(str(cid))
+
+    # --- Task queries ---
+
+    def _tasks_in(self, low: Optional[str], high: str) -> Iterator[tuple[str, str]]:
+        # Open tasks with low <= due < high, by due date
+        with self.lock:
+            first = 0 if low is None else bisect.bisect_left(self.due_days, low)
+            last = bisect.bisect_left(self.due_days, high)
+            changed = self.tasks_changed
+            static = [(self.due_days[i], self.due_ids[i]) for i in range(first, last) if self.due_ids[i] not in changed]
+            delta = sorted((self.due[tid], tid) for tid in changed
+                           if tid in self.due and (low is None or self.due[tid] >= low) and self.due[tid] < high)
+        return heapq.merge(static, delta)
+
+    def overdue_tasks(self, day: Optional[str] = None) -> Iterator[tuple[str, str]]:
+        """
+        (due date, task id) of open tasks due before day (default today), oldest first.
+        """
+        return self._tasks_in(None, day or today())
+
+    def count_overdue(self, day: Optional[str] = None) -> int:
+        day = day or today()
+        with self.lock:
+            count = bisect.bisect_left(self.due_days, day)
+            for tid, was in self.tasks_changed.items():
+                count -= was is not None and was < day
+                now = self.due.get(tid)
+                count += now is not None and now < day
+        return count
+
+    def tasks_due_between(self, start: str, end: str) -> Iterator[tuple[str, str]]:
+        """
+        (due date, task id) of open tasks due within [start, end].
+        """
+        return self._tasks_in(start, end + "\x00")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"campaigns": len(self.intervals), "open_tasks": len(self.due),
+                    "delta": {"campaigns": len(self.campaigns_changed), "tasks": len(self.tasks_changed)}}
+
+
+# --- Lifecycle ---
+
+_states = {}  # tenant (None when tenancy is off) -> that tenant's index and its lifecycle
+_states_lock = threading.Lock()
+
+
+def _state() -> dict:
+    key = tenancy.partition()
+    state = _states.get(key)
+    if state is None:
+        with _states_lock:
+            state = _states.setdefault(key, {"index": None, "built_at": None, "building": False, "replay": None,
+                                             "build_ms": None, "lock": threading.Lock()})
+    return state
+
+
+def build() -> DateIndex:
+    """
+    Load a fresh index from the backend and swap it in. Writes that arrive
+    during the load are replayed onto the new index.
+    """
+    state = _state()
+    with state["lock"]:
+        state["replay"] = []
+        started = time.perf_counter()
+        index = DateIndex()
+        page_size = 1000 if db.backend_name() == "supabase" else 100000
+        for row in db.iter_rows("campaigns", page_size=page_size):
+            index.campaigns[str(row["id"])] = dict(row)
+            interval = _interval(row)
+            if interval is not None:
+                index.intervals[str(row["id"])] = interval
+        for row in db.iter_rows("tasks", page_size=page_size):
+            due = _day(row.get("due_date"))
+            if due is not None and row.get("status") != DONE_STATUS:
+                index.due[str(row["id"])] = due
+        with index.lock:
+            index._rebuild_campaigns()
+            index._rebuild_tasks()
+            replay, state["replay"] = state["replay"], None
+            for change in replay:
+                _apply(index, *change)
+            state["index"] = index
+            state["built_at"] = time.monotonic()
+        state["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return index
+
+
+def _build_in_background():
+    state = _state()
+    if state["building"]:
+        return
+    state["building"] = True
+
+    def run():
+        try:
+            build()
+        except Exception as e:
+            print(f"⚠️ Date index build failed: {e}")
+        finally:
+            state["building"] = False
+    # The copied context builds the current tenant's index
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="date-index", daemon=True).start()
+
+
+def get_index() -> DateIndex:
+    state = _state()
+    index = state["index"]
+    if index is None:
+        return build()
+    if db.backend_name() != "mock" and time.monotonic() - state["built_at"] > DATE_INDEX_REFRESH_SECONDS:
+        _build_in_background()
+    return index
+
+
+def reset():
+    """
+    Drop every tenant's index, so the next read builds it again. For callers
+    that replace the data without writes (datagen, benchmarks).
+    """
+    with _states_lock:
+        _states.clear()
+
+
+def _apply(index: DateIndex, table: str, op: str, rows: Optional[list], filters: Optional[dict]):
+    put, remove = (index.put_campaign, index.remove_campaign) if table == "campaigns" else \
+        (index.put_task, index.remove_task)
+    if op != "delete":
+        for row in rows or []:
+            put(row)
+        return
+    filters = filters or {}
+    ids = filters.get("id__in") or ([filters["id"]] if "id" in filters else None)
+    if ids is not None and len(filters) == 1:
+        for row_id in ids:
+            remove(row_id)
+    elif table == "campaigns":
+        compiled = db.compile_filters(filters)
+        for cid in [cid for cid, row in index.campaigns.items() if db.row_matches(row, compiled)]:
+            remove(cid)
+    else:
+        _build_in_background()  # Task rows are not kept; cannot tell which went
+
+
+def _on_change(table: str, op: str, rows: Optional[list], changes: Optional[dict], filters: Optional[dict]):
+    if table not in ("campaigns", "tasks"):
+        return
+    # Writes run on behalf of the tenant whose rows they touch
+    state = _states.get(tenancy.partition())
+    if state is None:
+        return
+    replay = state["replay"]
+    if replay is not None:
+        replay.append((table, op, rows, filters))
+    if state["index"] is not None:
+        _apply(state["index"], table, op, rows, filters)
+
+
+# --- Queries ---
+
+def campaigns_between(start: str, end: str) -> list[dict]:
+    return get_index().campaigns_between(start, end)
+
+
+def campaigns_on(day: str) -> list[dict]:
+    return get_index().campaigns_between(day, day)
+
+
+def overdue_tasks(day: Optional[str] = None) -> Iterator[tuple[str, str]]:
+    return get_index().overdue_tasks(day)
+
+
+def count_overdue(day: Optional[str] = None) -> int:
+    return get_index().count_overdue(day)
+
+
+def tasks_due_between(start: str, end: str) -> Iterator[tuple[str, str]]:
+    return get_index().tasks_due_between(start, end)
+
+
+def stats() -> dict:
+    state = _state()
+    index = state["index"]
+    return {"built": index is not None, "build_ms": state["build_ms"],
+            "age_s": round(time.monotonic() - state["built_at"], 1) if state["built_at"] else None,
+            **(index.stats() if index else {})}
+
+
+events.on_change(_on_change)
@@ -0,0 +1,179 @@
+"""
+Delta sync ("what changed since my cursor") for the list tools.
+
+Every insert or update of a versioned table (supabase_client.VERSIONED_TABLES)
+stamps the row with a `version` from one monotonic counter, and every delete or
+archival leaves a tombstone carrying a version too. A client keeps a table in
+sync like this:
+
+    changes(table, "0")     -> snapshot pages ordered by id, until has_more is false
+    changes(table, cursor)  -> rows matching the filters inserted or changed
+                               since the cursor, plus tombstones for rows
+                               deleted, archived, or no longer matching them
+    ... repeat with the returned cursor
+
+The follow-up calls read the `version` index, so steady-state polling costs
+what changed, not the table size. The filters apply to the changed rows in
+the query. Tombstones record the previous values of the columns syncs filter
+on, and an update changing one of them records a "changed" tombstone, so a
+sync is only told about rows that were deleted from, or may have left, its
+own result. Cursors are opaque. A cursor older than
+TOMBSTONE_RETENTION_DAYS returns {"reset": true}: tombstones it needs may have
+been pruned, so the client must start again from "0".
+
+Supabase allocates versions from a sequence when each statement runs, so a
+slow transaction can commit a version below one a client has already seen.
+Supabase polls therefore also re-read rows updated within
+DELTA_SETTLE_SECONDS before the previous poll (PostgREST's statement timeout
+keeps writes shorter than that). Mock and SQLite allocate versions inside
+the serialised write, so they need no overlap.
+"""
+import os
+import json
+import time
+import heapq
+import base64
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+import activity_store
+from supabase_client import (TOMBSTONE_TABLE, backend_name, fetch_rows, fetch_page, delete_rows, split_filter,
+                             row_matches)
+
+DELTA_PAGE_SIZE = int(os.environ.get("DELTA_PAGE_SIZE", "500"))
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get("TOMBSTONE_RETENTION_DAYS", "30"))
+DELTA_SETTLE_SECONDS = float(os.environ.get("DELTA_SETTLE_SECONDS", "10"))
+
+
+# --- Cursors ---
+
+def _encode(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    if cursor in ("0", ""):
+        return {"m": "s"}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor; start a sync with '0'")
+    if not isinstance(state, dict) or state.get("m") not in ("s", "v"):
+        raise ValueError("Invalid cursor; start a sync with '0'")
+    return state
+
+
+# --- Reads ---
+
+def _tables(table: str) -> list[str]:
+    # Activity lives in the default table plus one table per month (locally)
+    return [table] + activity_store.partitions() if table == activity_store.TABLE else [table]
+
+
+def _page(table: str, filters: Optional[dict], order_by: str, limit: int, after: Optional[tuple] = None) -> list[dict]:
+    """
+    One keyset page ordered by (order_by, id), merged across the table's partitions.
+    """
+    pages = [fetch_page(t, filters, order_by, limit, after) for t in _tables(table)]
+    if len(pages) == 1:
+        return pages[0]
+    merged = heapq.merge(*pages, key=lambda row: (row[order_by], str(row["id"])))
+    return [row for _, row in zip(range(limit), merged)]
+
+
+def _max_version(table: str) -> int:
+    latest = [rows[0]["version"] for t in _tables(table)
+              if (rows := fetch_rows(t, {"version__gte": 0}, order_by="-version", limit=1))]
+    return max(latest, default=0)
+
+
+def _snapshot(table: str, state: dict, filters: Optional[dict], limit: int) -> dict:
+    # Changes made while the snapshot is paged have versions above base and arrive afterwards
+    base = state.get("b")
+    if base is None:
+        base, state = _max_version(table), {"t": time.time()}
+    after = state.get("a")
+    rows = _page(table, filters, "id", limit, (after, after) if after is not None else None)
+    has_more = len(rows) == limit
+    if has_more:
+        next_state = {"m": "s", "b": base, "a": rows[-1]["id"], "t": state["t"]}
+    else:
+        next_state = {"m": "v", "v": base, "t": state["t"]}
+    return {"rows": rows, "tombstones": [], "cursor": _encode(next_state), "has_more": has_more}
+
+
+def _may_have_matched(tombstone: dict, filters: Optional[dict]) -> bool:
+    """
+    Whether the row a tombstone stands for may have been in the filtered result
+    before it left. Tombstones keep the row's previous values of the columns
+    syncs filter on (supabase_client.SYNC_COLUMNS); filters on other columns
+    cannot be judged and count as matching.
+    """
+    previous = tombstone.get("previous")
+    if previous is None or not filters:
+        return True
+    return row_matches(previous, {key: value for key, value in filters.items() if split_filter(key)[0] in previous})
+
+
+def _since(table: str, state: dict, filters: Optional[dict], limit: int) -> dict:
+    version = state["v"]
+    changed = _page(table, {**(filters or {}), "version__gt": version}, "version", limit)
+    deleted = fetch_page(TOMBSTONE_TABLE, {"table_name": table, "version__gt": version}, order_by="version",
+                         limit=limit)
+
+    # A full page may stop short of the other list's versions; resume from the lower boundary
+    boundaries = [page[-1]["version"] for page in (changed, deleted) if len(page) == limit]
+    if boundaries:
+        upto = min(boundaries)
+        changed = [row for row in changed if row["version"] <= upto]
+        deleted = [t for t in deleted if t["version"] <= upto]
+    else:
+        upto = max([version] + [row["version"] for row in changed] + [t["version"] for t in deleted])
+
+    if backend_name() == "supabase" and state.get("t"):
+        column = "created_at" if table == activity_store.TABLE else "updated_at"
+        settled = datetime.fromtimestamp(state["t"] - DELTA_SETTLE_SECONDS, timezone.utc).isoformat()
+        seen = {row["id"] for row in changed}
+        changed += [row for row in fetch_rows(table, {**(filters or {}), f"{column}__gte": settled,
+                                                      "version__lte": version})
+                    if row["id"] not in seen]
+
+    # Only rows that may have been in this sync's result produce tombstones. A
+    # "changed" tombstone means the row may have left it, unless it still matches.
+    current = {str(row["id"]) for row in changed}
+    tombstones = {}
+    for t in deleted:
+        if not _may_have_matched(t, filters):
+            continue
+        if t["reason"] != "changed":
+            tombstones[t["row_id"]] = {"id": t["row_id"], "reason": t["reason"], "version": t["version"],
+                                       "deleted_at": t.get("deleted_at")}
+        elif t["row_id"] not in current:
+            tombstones[t["row_id"]] = {"id": t["row_id"], "reason": "no_longer_matches", "version": t["version"]}
+
+    next_state = {"m": "v", "v": upto, "t": state.get("t") if boundaries else time.time()}
+    return {"rows": changed, "tombstones": list(tombstones.values()), "cursor": _encode(next_state),
+            "has_more": bool(boundaries)}
+
+
+def changes(table: str, cursor: str, filters: Optional[dict] = None, limit: int = DELTA_PAGE_SIZE) -> dict:
+    """
+    Rows of `table` matching the filters that changed since the cursor ("0" for
+    a snapshot), tombstones, the next cursor, and whether more pages are waiting.
+    """
+    state = _decode(cursor)
+    if state.get("t") and TOMBSTONE_RETENTION_DAYS > 0 and time.time() - state["t"] > TOMBSTONE_RETENTION_DAYS * 86400:
+        return {"reset": True, "rows": [], "tombstones": [], "cursor": "0", "has_more": True}
+    if state["m"] == "s":
+        return _snapshot(table, state, filters, limit)
+    return _since(table, state, filters, limit)
+
+
+def prune_tombstones(days: int = TOMBSTONE_RETENTION_DAYS) -> int:
+    """
+    Delete tombstones older than `days`; cursors that old get {"reset": true}.
+    """
+    if days <= 0:
+        return 0
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    return delete_rows(TOMBSTONE_TABLE, {"deleted_at__lt": cutoff})
@@ -0,0 +1,73 @@
+"""
+Daily task digest pipeline.
+
+    stream open tasks ordered by assignee (keyset pages)
+      -> group consecutive tasks per assignee
+      -> render each digest from precompiled templates
+      -> hand messages to the bulk sender (bounded concurrency)
+
+Every stage is a generator, so memory stays at one page of tasks plus one
+assignee's digest plus the sender's in-flight window, however many tasks
+and recipients there are.
+"""
+import os
+import html
+from itertools import groupby
+from string import Template
+from typing import Iterable, Iterator, Optional
+
+from supabase_client import iter_rows
+from tools.notifications import send_bulk_email
+
+DIGEST_PAGE_SIZE = int(os.environ.get("DIGEST_PAGE_SIZE", "1000"))
+# Tasks listed per email; the rest are summarised as "and N more".
+DIGEST_MAX_ITEMS = int(os.environ.get("DIGEST_MAX_ITEMS", "50"))
+DONE_STATUS = "completed"
+
+SUBJECT = Template("Daily Task Digest: $count tasks assigned to you")
+BODY = Template("<h3>You have $count tasks:</h3><ul>$items</ul>$more")
+ITEM = Template("<li>$title ($status)</li>")
+MORE = Template("<p>…and $hidden more.</p>")
+
+
+def stream_open_tasks(page_size: int = DIGEST_PAGE_SIZE) -> Iterator[dict]:
+    return iter_rows("tasks", {"status__neq": DONE_STATUS}, order_by="assignee", page_size=page_size)
+
+
+def group_by_assignee(tasks: Iterable[dict], max_items: int = DIGEST_MAX_ITEMS) -> Iterator[tuple[str, int, list[dict]]]:
+    """
+    Yield (assignee, task count, first max_items tasks) per assignee. Input must
+    be ordered by assignee.
+    """
+    for assignee, group in groupby(tasks, key=lambda t: t["assignee"]):
+        shown = []
+        count = 0
+        for task in group:
+            count += 1
+            if count <= max_items:
+                shown.append(task)
+        yield assignee, count, shown
+
+
+def render_digest(count: int, tasks: list[dict]) -> tuple[str, str]:
+    items = "".join(ITEM.substitute(title=html.escape(str(t.get("title", ""))), status=html.escape(str(t.get("status", ""))))
+                    for t in tasks)
+    more = MORE.substitute(hidden=count - len(tasks)) if count > len(tasks) else ""
+    return SUBJECT.substitute(count=count), BODY.substitute(count=count, items=items, more=more)
+
+
+def run_daily_digest(page_size: int = DIGEST_PAGE_SIZE, concurrency: Optional[int] = None) -> dict:
+    """
+    Send one digest per assignee with open tasks. Returns row and send counts.
+    """
+    stats = {"tasks": 0, "recipients": 0}
+
+    def messages():
+        for assignee, count, tasks in group_by_assignee(stream_open_tasks(page_size)):
+            stats["tasks"] += count
+            stats["recipients"] += 1
+            subject, body = render_digest(count, tasks)
+            yield assignee, subject, body
+
+    sent = send_bulk_email(messages(), concurrency) if concurrency else send_bulk_email(messages())
+    return {**stats, **{f"emails_{status}": n for status, n in sent.items()}}
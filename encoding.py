@@ -0,0 +1,90 @@
+"""
+Response encoding for tool results.
+
+FastMCP turns a tool's return value into an MCP result in two passes: pydantic
+first walks every value to make it JSON-safe, then serialises it for the text
+block. Rows from the data layer are already plain JSON values, so
+tool_result() skips the walk. It serialises once with orjson (or the standard
+json module when orjson is not installed) and builds the result directly. A
+value the encoder cannot take natively is left to FastMCP's usual conversion.
+
+columnar() is the compact row format list tools return on request:
+
+    {"columns": ["id", "name", ...], "rows": [[1, "Spring Launch", ...], ...]}
+
+Every key is named once rather than once per row.
+"""
+import os
+import json
+from typing import Any, Optional
+
+from mcp.types import TextContent
+from fastmcp.tools import ToolResult
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_ENCODING = os.environ.get("FAST_ENCODING", "true").lower() == "true"
+
+
+def dumps(value: Any) -> str:
+    """
+    Compact JSON text. Raises TypeError for values that are not JSON (orjson
+    also takes datetimes and UUIDs, which pydantic serialises the same way).
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def columnar(rows: list[dict]) -> dict:
+    """
+    {"columns", "rows"} for a list of row dicts. Columns are every key, in order
+    of first appearance; a row without a column has null there.
+    """
+    columns = {}
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns[key] = None
+    names = list(columns)
+    return {"columns": names, "rows": [[row.get(name) for name in names] for row in rows]}
+
+
+def apply_format(result, columns: bool):
+    """
+    The columnar form of a list tool's result when requested: a list of rows,
+    or the "rows" of a changed_since page.
+    """
+    if not columns:
+        return result
+    if isinstance(result, list):
+        return columnar(result)
+    if isinstance(result, dict) and isinstance(result.get("rows"), list):
+        return {**result, "rows": columnar(result["rows"])}
+    return result
+
+
+def tool_result(value: Any, output_schema: Optional[dict]) -> Any:
+    """
+    A ToolResult for a dict or list value, shaped the way FastMCP shapes it for
+    this output schema; any other value is returned unchanged for FastMCP.
+    """
+    if not FAST_ENCODING or not isinstance(value, (dict, list)):
+        return value
+    try:
+        text = dumps(value)
+    except (TypeError, ValueError, OverflowError):
+        return value
+    content = [TextContent(type="text", text=text)]
+    meta = None
+    if output_schema is None:
+        structured = value if isinstance(value, dict) else None
+    elif output_schema.get("x-fastmcp-wrap-result"):
+        structured, meta = {"result": value}, {"fastmcp": {"wrap_result": True}}
+    else:
+        structured = value
+    # model_construct: ToolResult() would walk the structured content through pydantic again
+    return ToolResult.model_construct(content=content, structured_content=structured, meta=meta, is_error=False)
@@ -0,0 +1,217 @@
+"""
+Change events emitted by the data layer.
+
+Every write through supabase_client calls publish_change(). There are two
+kinds of consumer:
+
+- Change handlers (on_change) run synchronously inside the write, for
+  in-process bookkeeping that must see the write immediately, such as
+  cache invalidation.
+- Event subscribers (subscribe) receive domain events such as
+  "task.created", "task.status_changed", "asset.reviewed" and
+  "campaign.status_changed". A background dispatcher thread delivers them
+  in batches. Events arriving within EVENT_DEBOUNCE_MS of each other are
+  coalesced into one batch, keeping only the latest event per
+  (tenant, name, row id). A burst is never held back longer than
+  EVENT_MAX_DELAY_MS.
+
+With no handlers or subscribers interested, publish_change returns at once.
+The dispatcher thread starts with the first subscription.
+"""
+import os
+import time
+import fnmatch
+import threading
+import contextvars
+from datetime import datetime, timezone
+from typing import Callable, Optional, Union
+
+import tenancy
+
+EVENT_DEBOUNCE_MS = float(os.environ.get("EVENT_DEBOUNCE_MS", "20"))
+EVENT_MAX_DELAY_MS = float(os.environ.get("EVENT_MAX_DELAY_MS", "250"))
+# Writes made by event handlers emit events too; stop the chain at this depth.
+EVENT_MAX_DEPTH = int(os.environ.get("EVENT_MAX_DEPTH", "3"))
+
+ENTITIES = {"tasks": "task", "campaigns": "campaign", "assets": "asset", "users": "user",
+            "automations": "automation"}
+REVIEWED_STATUSES = ("approved", "rejected")
+
+_depth = contextvars.ContextVar("event_depth", default=0)
+
+
+class Event:
+    __slots__ = ("name", "table", "op", "row", "changes", "at", "depth", "tenant")
+
+    def __init__(self, name: str, table: str, op: str, row: Optional[dict], changes: Optional[dict], depth: int,
+                 tenant: Optional[str] = None):
+        self.name = name
+        self.table = table
+        self.op = op
+        self.row = row
+        self.changes = changes
+        self.at = datetime.now(timezone.utc).isoformat()
+        self.depth = depth
+        self.tenant = tenant  # whose write it was, with tenancy on (see tenancy.py)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "table": self.table, "op": self.op, "row": self.row,
+                "changes": self.changes, "at": self.at}
+
+
+def event_names(table: str, op: str, row: Optional[dict], changes: Optional[dict]) -> list[str]:
+    """
+    Domain events for one changed row.
+    """
+    entity = ENTITIES.get(table)
+    if entity is None:
+        return []
+    if op == "insert":
+        names = [f"{entity}.created"]
+    elif op == "delete":
+        names = [f"{entity}.deleted"]
+    else:
+        names = [f"{entity}.updated"]
+        if changes and "status" in changes:
+            names.append(f"{entity}.status_changed")
+            if entity == "asset" and changes["status"] in REVIEWED_STATUSES:
+                names.append("asset.reviewed")
+    return names
+
+
+# --- Change handlers (synchronous) ---
+
+_change_handlers: list[Callable] = []
+
+
+def on_change(handler: Callable[[str, str, Optional[list], Optional[dict], Optional[dict]], None]):
+    """
+    Call handler(table, op, rows, changes, filters) synchronously after every write.
+    Registering the same handler again has no effect.
+    """
+    if handler not in _change_handlers:
+        _change_handlers.append(handler)
+
+
+# --- Subscribers (asynchronous, debounced) ---
+
+class _Subscription:
+    def __init__(self, matcher: Union[str, Callable[[str], bool]], handler: Callable[[list[Event]], None]):
+        self.matches = matcher if callable(matcher) else (lambda name, pattern=matcher: fnmatch.fnmatchcase(name, pattern))
+        self.handler = handler
+        self.pending = {}  # (name, row id) -> Event
+        self.first_at = 0.0
+        self.last_at = 0.0
+
+
+_subscriptions: list[_Subscription] = []
+_lock = threading.Condition()
+_dispatcher: Optional[threading.Thread] = None
+_inflight = 0
+_stats = {"published": 0, "delivered": 0, "coalesced": 0, "batches": 0, "dropped_depth": 0, "handler_errors": 0}
+
+
+def subscribe(matcher: Union[str, Callable[[str], bool]], handler: Callable[[list[Event]], None]):
+    """
+    Deliver matching events to handler(events) in debounced batches. matcher is
+    a glob ("task.*") or a predicate on the event name.
+    """
+    global _dispatcher
+    with _lock:
+        _subscriptions.append(_Subscription(matcher, handler))
+        if _dispatcher is None:
+            _dispatcher = threading.Thread(target=_dispatch_loop, name="event-dispatcher", daemon=True)
+            _dispatcher.start()
+
+
+def publish_change(table: str, op: str, rows: Optional[list] = None, changes: Optional[dict] = None,
+                   filters: Optional[dict] = None):
+    """
+    Called by the data layer after a write. rows are the written rows (None for deletes).
+    """
+    for handler in _change_handlers:
+        handler(table, op, rows, changes, filters)
+    if not _subscriptions or table not in ENTITIES:
+        return
+    depth = _depth.get()
+    if depth >= EVENT_MAX_DEPTH:
+        _stats["dropped_depth"] += 1
+        return
+    now = time.monotonic()
+    tenant = tenancy.partition(table)
+    with _lock:
+        for row in rows if rows is not None else [None]:
+            for name in event_names(table, op, row, changes):
+                event = None
+                for sub in _subscriptions:
+                    if not sub.matches(name):
+                        continue
+                    event = event or Event(name, table, op, row, changes if changes is not None else row, depth + 1,
+                                           tenant)
+                    key = (tenant, name, (row or {}).get("id"))
+                    if key in sub.pending:
+                        _stats["coalesced"] += 1
+                    elif not sub.pending:
+                        sub.first_at = now
+                    sub.pending[key] = event
+                    sub.last_at = now
+                    _stats["published"] += 1
+        _lock.notify()
+
+
+def _due(sub: _Subscription, now: float) -> Optional[float]:
+    """
+    Seconds until sub's batch is due (<= 0 means now), or None if it has nothing pending.
+    """
+    if not sub.pending:
+        return None
+    return min(sub.last_at + EVENT_DEBOUNCE_MS / 1000, sub.first_at + EVENT_MAX_DELAY_MS / 1000) - now
+
+
+def _dispatch_loop():
+    global _inflight
+    while True:
+        with _lock:
+            while True:
+                now = time.monotonic()
+                waits = [d for d in (_due(sub, now) for sub in _subscriptions) if d is not None]
+                if waits and min(waits) <= 0:
+                    break
+                _lock.wait(min(waits) if waits else None)
+            ready = []
+            for sub in _subscriptions:
+                due = _due(sub, now)
+                if due is not None and due <= 0:
+                    ready.append((sub, list(sub.pending.values())))
+                    sub.pending = {}
+            _inflight += 1
+        for sub, batch in ready:
+            _stats["batches"] += 1
+            _stats["delivered"] += len(batch)
+            token = _depth.set(max(e.depth for e in batch))
+            try:
+                sub.handler(batch)
+            except Exception as e:
+                _stats["handler_errors"] += 1
+                print(f"Event handler error: {e}")
+            finally:
+                _depth.reset(token)
+        with _lock:
+            _inflight -= 1
+
+
+def flush(timeout: float = 2.0) -> bool:
+    """
+    Wait until every pending event has been delivered (for scripts and benchmarks).
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with _lock:
+            if not _inflight and not any(sub.pending for sub in _subscriptions):
+                return True
+        time.sleep(0.005)
+    return False
+
+
+def stats() -> dict:
+    return dict(_stats, subscriptions=len(_subscriptions), change_handlers=len(_change_handlers))
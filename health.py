@@ -0,0 +1,289 @@
+"""
+Dependency health: background probes with cached results.
+
+A daemon thread probes each configured dependency every HEALTH_INTERVAL_SECONDS:
+
+- database: a head query on one table (Supabase), SELECT on sqlite_master
+  (SQLite), nothing in mock mode
+- smtp: connect and EHLO, without logging in
+- twilio: fetch the account resource
+- openai: list models
+
+Each probe gets HEALTH_TIMEOUT_SECONDS. Results are cached with the time of
+the check and the latency of the last HEALTH_WINDOW probes, so
+check_backend_config, /healthz and /readyz answer from memory and send no
+traffic of their own.
+
+A dependency is "ok", "degraded" (slower than HEALTH_SLOW_MS, or failing fewer
+than HEALTH_FAILURES_TO_DOWN times in a row), "down", "unconfigured" or
+"pending" (not probed yet). The process is ready unless a dependency in
+HEALTH_REQUIRED (default: database) is down, pending, or was last checked over
+HEALTH_STALE_SECONDS ago. Slow dependencies are reported but keep the process
+ready: every worker shares them, so draining one worker would not help.
+"""
+import os
+import time
+import smtplib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import requests
+
+import sqlite_store
+import supabase_client as db
+
+HEALTH_PROBES = os.environ.get("HEALTH_PROBES", "true").lower() == "true"
+HEALTH_INTERVAL_SECONDS = float(os.environ.get("HEALTH_INTERVAL_SECONDS", "30"))
+HEALTH_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_TIMEOUT_SECONDS", "5"))
+HEALTH_STALE_SECONDS = float(os.environ.get("HEALTH_STALE_SECONDS", "0")) or HEALTH_INTERVAL_SECONDS * 3
+HEALTH_SLOW_MS = float(os.environ.get("HEALTH_SLOW_MS", "1000"))
+HEALTH_FAILURES_TO_DOWN = int(os.environ.get("HEALTH_FAILURES_TO_DOWN", "2"))
+HEALTH_WINDOW = int(os.environ.get("HEALTH_WINDOW", "20"))
+HEALTH_REQUIRED = [d.strip() for d in os.environ.get("HEALTH_REQUIRED", "database").split(",") if d.strip()]
+# The table the Supabase probe reads its head from
+HEALTH_SUPABASE_TABLE = os.environ.get("HEALTH_SUPABASE_TABLE", "campaigns")
+
+TWILIO_API_URL = os.environ.get("TWILIO_API_URL", "https://api.twilio.com").rstrip("/")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+
+class ProbeFailed(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- Probes ---
+# Each returns None (or details for the result) on success, raises on failure,
+# and is only run when its dependency is configured.
+
+_supabase = None
+
+
+def _probe_database():
+    backend = db.backend_name()
+    if backend == "sqlite":
+        sqlite_store.connect().execute("SELECT count(*) FROM sqlite_master").fetchone()
+    elif backend == "supabase":
+        global _supabase
+        if _supabase is None:
+            _supabase = db.get_client()
+            if _supabase is None:
+                raise ProbeFailed("could not create a Supabase client")
+        _supabase.table(HEALTH_SUPABASE_TABLE).select("id", head=True).limit(1).execute()
+    return {"backend": backend}
+
+
+def _smtp_host() -> Optional[str]:
+    return os.getenv("EMAIL_SMTP_HOST") or os.getenv("SMTP_HOST")
+
+
+def _probe_smtp():
+    port = int(os.getenv("EMAIL_SMTP_PORT") or os.getenv("SMTP_PORT") or 587)
+    server = smtplib.SMTP(_smtp_host(), port, timeout=HEALTH_TIMEOUT_SECONDS)
+    try:
+        code, _ = server.ehlo()
+        if code != 250:
+            raise ProbeFailed(f"EHLO answered {code}")
+    finally:
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+def _get(url: str, **kwargs):
+    response = requests.get(url, timeout=HEALTH_TIMEOUT_SECONDS, **kwargs)
+    if response.status_code >= 300:
+        raise ProbeFailed(f"HTTP {response.status_code}")
+
+
+def _probe_twilio():
+    sid = os.getenv("TWILIO_ACCOUNT_SID")
+    _get(f"{TWILIO_API_URL}/2010-04-01/Accounts/{sid}.json", auth=(sid, os.getenv("TWILIO_AUTH_TOKEN")))
+
+
+def _probe_openai():
+    _get(f"{OPENAI_BASE_URL}/models", headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"})
+
+
+# name -> (is it configured, probe)
+PROBES: dict[str, tuple[Callable[[], bool], Callable]] = {
+    "database": (lambda: True, _probe_database),
+    "smtp": (lambda: bool(_smtp_host()), _probe_smtp),
+    "twilio": (lambda: bool(os.getenv("TWILIO_ACCOUNT_SID") and os.getenv("TWILIO_AUTH_TOKEN")), _probe_twilio),
+    "openai": (lambda: bool(os.getenv("OPENAI_API_KEY")), _probe_openai),
+}
+
+
+# --- Cached results ---
+
+class _Result:
+    __slots__ = ("status", "checked_at", "checked", "last_ok_at", "error", "failures", "latencies", "details",
+                 "in_flight", "timed_out")
+
+    def __init__(self):
+        self.status = "pending"
+        self.checked_at = None
+        self.checked = None  # monotonic time of checked_at
+        self.last_ok_at = None
+        self.error = None
+        self.failures = 0
+        self.latencies = deque(maxlen=HEALTH_WINDOW)
+        self.details = None
+        self.in_flight = None
+        self.timed_out = False  # the in-flight probe was already counted as a timeout
+
+    def record(self, ms: float, error: Optional[str], details: Optional[dict]):
+        self.checked_at = _now()
+        self.checked = time.monotonic()
+        self.latencies.append(ms)
+        self.error = error
+        if error is None:
+            self.failures = 0
+            self.last_ok_at = self.checked_at
+            self.details = details
+            self.status = "degraded" if ms > HEALTH_SLOW_MS else "ok"
+        else:
+            self.failures += 1
+            self.status = "down" if self.failures >= HEALTH_FAILURES_TO_DOWN else "degraded"
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        result = {"status": self.status, "checked_at": self.checked_at,
+                  "age_s": round(time.monotonic() - self.checked, 1) if self.checked else None,
+                  "last_ok_at": self.last_ok_at, "consecutive_failures": self.failures, "error": self.error,
+                  "latency_ms": round(self.latencies[-1], 1) if latencies else None,
+                  "avg_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+                  "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1)
+                  if latencies else None,
+                  "samples": len(latencies)}
+        if self.details:
+            result.update(self.details)
+        return result
+
+
+_results = {name: _Result() for name in PROBES}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=len(PROBES), thread_name_prefix="health-probe")
+_thread = None
+_stop = threading.Event()
+_started_at = time.monotonic()
+
+
+def _run_probe(name: str, probe: Callable):
+    started = time.perf_counter()
+    try:
+        details, error = probe(), None
+    except (ProbeFailed, OSError, smtplib.SMTPException, requests.RequestException) as e:
+        details, error = None, str(e) or type(e).__name__
+    except Exception as e:
+        details, error = None, f"{type(e).__name__}: {e}"
+    ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        result = _results[name]
+        # A probe that outlived its timeout was recorded then; its late answer is not another sample
+        if not result.timed_out:
+            result.record(ms, error, details)
+        result.in_flight, result.timed_out = None, False
+
+
+def probe_all():
+    """
+    Probe every configured dependency once, concurrently, waiting at most
+    HEALTH_TIMEOUT_SECONDS. A probe still running then is recorded as timed out,
+    once; it is not started again until it returns, and its result is dropped.
+    """
+    started = {}
+    with _lock:
+        for name, (configured, probe) in PROBES.items():
+            result = _results[name]
+            if not configured():
+                result.status, result.error = "unconfigured", None
+                result.checked_at, result.checked = _now(), time.monotonic()
+                continue
+            if result.in_flight is not None:
+                started[name] = result.in_flight
+                continue
+            result.in_flight = started[name] = _executor.submit(_run_probe, name, probe)
+    wait(list(started.values()), timeout=HEALTH_TIMEOUT_SECONDS)
+    with _lock:
+        for name, future in started.items():
+            result = _results[name]
+            if not future.done() and result.in_flight is future and not result.timed_out:
+                result.record(HEALTH_TIMEOUT_SECONDS * 1000, f"timed out after {HEALTH_TIMEOUT_SECONDS:g}s", None)
+                result.timed_out = True
+
+
+def _loop():
+    while not _stop.is_set():
+        try:
+            probe_all()
+        except Exception as e:
+            print(f"⚠️ Health probes failed: {e}")
+        _stop.wait(HEALTH_INTERVAL_SECONDS)
+
+
+def start():
+    """
+    Start probing in the background (once per process; no-op with HEALTH_PROBES=false).
+    """
+    global _thread
+    if not HEALTH_PROBES:
+        return
+    with _lock:
+        if _thread is not None:
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_loop, name="health", daemon=True)
+    _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    _thread = None
+
+
+def snapshot() -> dict:
+    """
+    The cached result of every dependency and the overall status: "ok",
+    "degraded" (something is slow or failing) or "down" (a required
+    dependency is down).
+    """
+    with _lock:
+        dependencies = {name: result.to_dict() for name, result in _results.items()}
+    statuses = [d["status"] for d in dependencies.values()]
+    if any(dependencies[name]["status"] == "down" for name in HEALTH_REQUIRED if name in dependencies):
+        status = "down"
+    elif "down" in statuses or "degraded" in statuses:
+        status = "degraded"
+    else:
+        status = "ok"
+    return {"status": status, "probing": _thread is not None, "interval_s": HEALTH_INTERVAL_SECONDS,
+            "uptime_s": round(time.monotonic() - _started_at, 1), "dependencies": dependencies}
+
+
+def readiness(health: Optional[dict] = None) -> tuple[bool, list[str]]:
+    """
+    Whether this process should receive traffic, with the reasons it should not.
+    Always ready when probing is off.
+    """
+    if not HEALTH_PROBES:
+        return True, []
+    health = health or snapshot()
+    reasons = []
+    for name in HEALTH_REQUIRED:
+        result = health["dependencies"].get(name)
+        if result is None or result["status"] == "unconfigured":
+            continue
+        if result["status"] in ("down", "pending"):
+            reasons.append(f"{name} is {result['status']}" + (f": {result['error']}" if result["error"] else ""))
+        elif result["age_s"] is not None and result["age_s"] > HEALTH_STALE_SECONDS:
+            reasons.append(f"{name} was last checked {result['age_s']:g}s ago")
+    return not reasons, reasons
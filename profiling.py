@@ -0,0 +1,189 @@
+import os
+import sys
+import glob
+import time
+import random
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+# Profiling is opt-in. When nothing is configured, profile_call() is a single
+# boolean check in front of the tool call.
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+_config = {
+    "sample_rate": float(os.environ.get("PROFILE_SAMPLE_RATE", "0") or 0),
+    "tools": {t.strip() for t in os.environ.get("PROFILE_TOOLS", "").split(",") if t.strip()},
+    "mode": os.environ.get("PROFILE_MODE", "sampling"),  # "sampling" or "cprofile"
+    "interval_ms": float(os.environ.get("PROFILE_INTERVAL_MS", "5")),
+    "max_files": int(os.environ.get("PROFILE_MAX_FILES", "50")),
+    "header": os.environ.get("PROFILE_HEADER", "false").lower() == "true",
+}
+_armed = Counter()  # tool name -> number of upcoming calls to profile
+_lock = threading.Lock()
+_active = False
+
+
+def _refresh_active():
+    global _active
+    _active = bool(_config["sample_rate"] > 0 or _config["tools"] or _armed or _config["header"])
+
+
+_refresh_active()
+
+
+def configure(sample_rate: Optional[float] = None, tools: Optional[list[str]] = None,
+              mode: Optional[str] = None, max_files: Optional[int] = None, profile_next: Optional[str] = None) -> dict:
+    """
+    Update the profiling configuration at runtime, and arm profile_next for its
+    next call. Every argument is checked before anything changes. Returns the
+    new config.
+    """
+    if sample_rate is not None and not 0 <= sample_rate <= 1:
+        raise ValueError("sample_rate must be between 0 and 1")
+    if mode is not None and mode not in ("sampling", "cprofile"):
+        raise ValueError("mode must be 'sampling' or 'cprofile'")
+    with _lock:
+        if sample_rate is not None:
+            _config["sample_rate"] = sample_rate
+        if tools is not None:
+            _config["tools"] = set(tools)
+        if mode is not None:
+            _config["mode"] = mode
+        if max_files is not None:
+            _config["max_files"] = max(1, max_files)
+        if profile_next:
+            _armed[profile_next] += 1
+        _refresh_active()
+    return status()
+
+
+def arm(tool_name: str, calls: int = 1):
+    """
+    Flag the next `calls` invocations of a tool for profiling.
+    """
+    with _lock:
+        _armed[tool_name] += calls
+        _refresh_active()
+
+
+def status() -> dict:
+    """
+    Current profiling configuration plus the most recent profile files.
+    """
+    files = sorted(glob.glob(os.path.join(PROFILE_DIR, "*")), key=os.path.getmtime, reverse=True)
+    return {
+        "enabled": _active,
+        "sample_rate": _config["sample_rate"],
+        "tools": sorted(_config["tools"]),
+        "armed": dict(_armed),
+        "mode": _config["mode"],
+        "max_files": _config["max_files"],
+        "profile_dir": PROFILE_DIR,
+        "recent_profiles": files[:10],
+    }
+
+
+def _header_requested() -> bool:
+    try:
+        from fastmcp.server.dependencies import get_http_headers
+        return get_http_headers().get("x-profile", "").lower() in ("1", "true")
+    except Exception:
+        return False
+
+
+def _should_profile(tool_name: str) -> bool:
+    if tool_name in _config["tools"]:
+        return True
+    if _armed:
+        with _lock:
+            if _armed.get(tool_name):
+                _armed[tool_name] -= 1
+                if not _armed[tool_name]:
+                    del _armed[tool_name]
+                _refresh_active()
+                return True
+    if _config["header"] and _header_requested():
+        return True
+    return random.random() < _config["sample_rate"]
+
+
+class _StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread at a fixed interval and counts collapsed stacks.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _output_path(tool_name: str, suffix: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    return os.path.join(PROFILE_DIR, f"{stamp}_{tool_name}{suffix}")
+
+
+def _enforce_retention():
+    files = sorted(glob.glob(os.path.join(PROFILE_DIR, "*")), key=os.path.getmtime)
+    for path in files[:max(0, len(files) - _config["max_files"])]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def profile_call(tool_name: str, fn, args: tuple, kwargs: dict):
+    """
+    Call fn(*args, **kwargs), profiling it if this call is selected.
+
+    Sampling mode writes a collapsed-stack file (one "frame;frame;frame count"
+    line per stack) that flamegraph.pl / speedscope render directly. cProfile
+    mode writes a pstats dump.
+    """
+    if not _active or not _should_profile(tool_name):
+        return fn(*args, **kwargs)
+
+    started = time.perf_counter()
+    if _config["mode"] == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            path = _output_path(tool_name, ".prof")
+            profiler.dump_stats(path)
+            _enforce_retention()
+            print(f"Profiled {tool_name} in {time.perf_counter() - started:.3f}s -> {path}")
+
+    sampler = _StackSampler(threading.get_ident(), _config["interval_ms"] / 1000)
+    sampler.start()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        sampler.stop()
+        path = _output_path(tool_name, ".collapsed")
+        with open(path, "w") as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        _enforce_retention()
+        print(f"Profiled {tool_name} in {time.perf_counter() - started:.3f}s -> {path}")
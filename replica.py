@@ -0,0 +1,381 @@
+"""
+In-memory read replicas of small, read-mostly tables.
+
+Enable with REPLICA_TABLES=users,campaigns,tasks,assets. supabase_client then
+serves fetch_rows/count_rows for those tables from a per-process copy of each
+table, indexed on the columns in sqlite_store.INDEXED_COLUMNS.
+
+Each replica is loaded on first read and kept fresh by a change feed:
+
+- Writes made by this process reach it synchronously through
+  events.on_change, so a worker always reads its own writes. In mock mode
+  this is the whole feed, since there is no other writer.
+- With Supabase, a Realtime subscription (postgres_changes) applies writes
+  made by other workers and by the dashboard. The tables must be in the
+  supabase_realtime publication.
+
+Without a live feed (SQLite shared by several workers, Realtime unreachable
+or disconnected), reads are stale-while-revalidate. A replica older than
+REPLICA_TTL_SECONDS is still served, and one background reload is started.
+Reads block on a reload only once it is older than REPLICA_MAX_STALE_SECONDS.
+
+With tenancy on (see tenancy.py), each tenant has its own replica of each
+tenant table, loaded, refreshed and capped independently.
+"""
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from typing import Optional
+
+import events
+import sqlite_store
+import tenancy
+import supabase_client as db
+
+REPLICA_TABLES = [t.strip() for t in os.environ.get("REPLICA_TABLES", "").split(",") if t.strip()]
+REPLICA_TTL_SECONDS = float(os.environ.get("REPLICA_TTL_SECONDS", "30"))
+REPLICA_MAX_STALE_SECONDS = float(os.environ.get("REPLICA_MAX_STALE_SECONDS", "300"))
+# Tables larger than this are not replicated; reads go to the backend.
+REPLICA_MAX_ROWS = int(os.environ.get("REPLICA_MAX_ROWS", "200000"))
+REPLICA_REALTIME = os.environ.get("REPLICA_REALTIME", "true").lower() == "true"
+
+_stats = {"hits": 0, "loads": 0, "background_reloads": 0, "stale_reads": 0, "changes_applied": 0,
+          "feed_events": 0, "too_large": 0}
+
+
+def _key(row: dict):
+    # Demo users have no id; their email is unique
+    return row["id"] if row.get("id") is not None else row.get("email")
+
+
+class TableReplica:
+    def __init__(self, table: str, tenant: Optional[str] = None):
+        self.table = table
+        self.tenant = tenant
+        # version is unique per row and only read by delta sync, which bypasses the replica
+        self.indexed = [c for c in sqlite_store.INDEXED_COLUMNS.get(table, []) if c != "version"]
+        self.rows = {}
+        self.indexes = {column: {} for column in self.indexed}
+        self.loaded_at = None
+        self.too_large = False
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self._replay = None  # changes that arrive during a reload
+
+    # --- Loading ---
+
+    def load(self):
+        requested = time.monotonic()
+        with self._load_lock:
+            if self.loaded_at is None or self.loaded_at < requested:  # else another thread just loaded it
+                self._load()
+
+    def _load(self):
+        with self._lock:
+            self._replay = []
+        rows = {}
+        # Supabase caps responses at 1000 rows; local stores read the table in one page
+        page_size = 1000 if db.backend_name() == "supabase" else REPLICA_MAX_ROWS + 1
+        for row in db.iter_rows(self.table, page_size=page_size):
+            rows[_key(row)] = dict(row)
+            if len(rows) > REPLICA_MAX_ROWS:
+                print(f"⚠️ {self._label()} has more than {REPLICA_MAX_ROWS} rows; not replicating it")
+                _stats["too_large"] += 1
+                with self._lock:
+                    self.too_large, self._replay = True, None
+                return
+        with self._lock:
+            self.rows = rows
+            self.indexes = {column: {} for column in self.indexed}
+            for key, row in rows.items():
+                self._index(key, row)
+            replay, self._replay = self._replay, None
+            for change in replay:
+                self._apply(*change)
+            self.loaded_at = time.monotonic()
+        _stats["loads"] += 1
+
+    def _label(self) -> str:
+        return self.table if self.tenant is None else f"{self.table} of tenant {self.tenant}"
+
+    def _reload_in_background(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.load()
+                _stats["background_reloads"] += 1
+            except Exception as e:
+                print(f"⚠️ Replica reload of {self._label()} failed: {e}")
+            finally:
+                self._loading = False
+        # Started from a read by this replica's tenant, so the copied context loads its rows
+        threading.Thread(target=contextvars.copy_context().run, args=(run,), name=f"replica-{self.table}",
+                         daemon=True).start()
+
+    def ensure_fresh(self, live: bool) -> bool:
+        """
+        Make the replica servable. Returns False if reads must go to the backend.
+        """
+        if self.too_large:
+            return False
+        if self.loaded_at is None:
+            self.load()
+            return not self.too_large
+        age = time.monotonic() - self.loaded_at
+        if live or age <= REPLICA_TTL_SECONDS:
+            return True
+        if age > REPLICA_MAX_STALE_SECONDS:
+            self.load()
+            return not self.too_large
+        _stats["stale_reads"] += 1
+        self._reload_in_background()
+        return True
+
+    def invalidate(self):
+        """
+        Reload on the next read.
+        """
+        with self._lock:
+            self.loaded_at = None
+
+    # --- Changes ---
+
+    def _index(self, key, row: dict):
+        for column, index in self.indexes.items():
+            try:
+                index.setdefault(row.get(column), set()).add(key)
+            except TypeError:
+                pass  # Unhashable value: found by a scan instead
+
+    def _unindex(self, key, row: dict):
+        for column, index in self.indexes.items():
+            try:
+                keys = index.get(row.get(column))
+            except TypeError:
+                continue
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[row.get(column)]
+
+    def _put(self, row: dict):
+        key = _key(row)
+        old = self.rows.get(key)
+        if old is not None:
+            self._unindex(key, old)
+        row = dict(row)
+        self.rows[key] = row
+        self._index(key, row)
+
+    def _remove(self, key):
+        old = self.rows.pop(key, None)
+        if old is not None:
+            self._unindex(key, old)
+
+    def _apply(self, op: str, rows: Optional[list], filters: Optional[dict]):
+        if op == "delete":
+            if filters:
+                for key in [key for key, row in self.rows.items() if db.row_matches(row, filters)]:
+                    self._remove(key)
+            for row in rows or []:
+                self._remove(_key(row))
+        else:
+            for row in rows or []:
+                self._put(row)
+
+    def apply(self, op: str, rows: Optional[list], filters: Optional[dict]):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((op, rows, filters))
+            if self.loaded_at is not None:
+                self._apply(op, rows, filters)
+        _stats["changes_applied"] += 1
+
+    # --- Reads ---
+
+    def _candidates(self, compiled: list) -> list:
+        best = None
+        for column, op, value in compiled:
+            if column not in self.indexes or op not in ("eq", "in"):
+                continue
+            index = self.indexes[column]
+            try:
+                keys = index.get(value, ()) if op == "eq" else [k for v in value for k in index.get(v, ())]
+            except TypeError:
+                continue
+            if best is None or len(keys) < len(best):
+                best = keys
+        if best is None:
+            return list(self.rows.values())
+        return [self.rows[key] for key in best]
+
+    def query(self, filters: Optional[dict], order_by: Optional[str], limit: Optional[int]) -> list[dict]:
+        compiled = db.compile_filters(filters)
+        with self._lock:
+            rows = [row for row in self._candidates(compiled) if db.row_matches(row, compiled)]
+        _stats["hits"] += 1
+        if order_by:
+            rows = db._mock_order(rows, order_by, limit)
+        return rows[:limit] if limit is not None else rows
+
+    def count(self, filters: Optional[dict]) -> int:
+        if filters and len(filters) == 1:
+            (column, op, value), = db.compile_filters(filters)
+            if column in self.indexes and op in ("eq", "neq"):
+                try:
+                    with self._lock:
+                        matching = len(self.indexes[column].get(value, ()))
+                        return matching if op == "eq" else len(self.rows) - matching
+                except TypeError:
+                    pass
+        return len(self.query(filters, None, None))
+
+
+_replicas = {table: {} for table in REPLICA_TABLES}  # table -> tenant (None if shared) -> replica
+_replicas_lock = threading.Lock()
+_feed = {"live": False, "status": "off"}
+
+
+def enabled(table: str) -> bool:
+    return table in _replicas
+
+
+def _partition(table: str, tenant: Optional[str]) -> TableReplica:
+    partitions = _replicas[table]
+    replica = partitions.get(tenant)
+    if replica is None:
+        with _replicas_lock:
+            replica = partitions.setdefault(tenant, TableReplica(table, tenant))
+    return replica
+
+
+def _all() -> list[TableReplica]:
+    with _replicas_lock:
+        return [replica for partitions in _replicas.values() for replica in partitions.values()]
+
+
+def _live() -> bool:
+    backend = db.backend_name()
+    return backend == "mock" or (backend == "supabase" and _feed["live"])
+
+
+def get(table: str) -> Optional[TableReplica]:
+    """
+    The table's replica (the current tenant's) if reads can be served from it now, else None.
+    """
+    if table not in _replicas:
+        return None
+    if db.backend_name() == "supabase":
+        _start_feed()
+    replica = _partition(table, tenancy.partition(table))
+    return replica if replica.ensure_fresh(_live()) else None
+
+
+def reset():
+    """
+    Drop every replica, so the next read loads it again. For callers that
+    replace the data without writes (datagen, benchmarks).
+    """
+    with _replicas_lock:
+        for partitions in _replicas.values():
+            partitions.clear()
+
+
+def _on_change(table: str, op: str, rows: Optional[list], changes: Optional[dict], filters: Optional[dict]):
+    # Writes run on behalf of the tenant whose rows they touch
+    replica = _replicas.get(table, {}).get(tenancy.partition(table))
+    if replica is not None:
+        replica.apply(op, rows, filters)
+
+
+# --- Supabase Realtime feed ---
+
+_feed_lock = threading.Lock()
+
+
+def _on_feed_change(payload: dict):
+    data = payload.get("data", payload)
+    table = data.get("table")
+    partitions = _replicas.get(table)
+    if partitions is None:
+        return
+    _stats["feed_events"] += 1
+    kind = str(data.get("type", "")).rsplit(".", 1)[-1].upper()
+    if kind == "DELETE":
+        # The old record carries only the key; ids are unique across tenants
+        old = data.get("old_record") or {}
+        for replica in list(partitions.values()):
+            if old.get("id") is None and old.get("email") is None:
+                replica.invalidate()  # Cannot tell which row went
+            else:
+                replica.apply("delete", [old], None)
+    elif data.get("record"):
+        record = data["record"]
+        replica = partitions.get(record.get(tenancy.COLUMN) if tenancy.scoped(table) else None)
+        if replica is not None:
+            replica.apply("upsert", [record], None)
+
+
+def _on_feed_state(state, error=None):
+    state = str(getattr(state, "value", state))
+    was_live = _feed["live"]
+    _feed["status"] = state
+    _feed["live"] = state == "SUBSCRIBED"
+    if error:
+        print(f"⚠️ Replica change feed {state}: {error}")
+    if _feed["live"] and not was_live:
+        # Changes may have been missed while disconnected
+        for replica in _all():
+            replica.invalidate()
+
+
+async def _run_feed():
+    from supabase import acreate_client
+    client = await acreate_client(db.SUPABASE_URL, db.SUPABASE_KEY)
+    channel = client.channel("replica")
+    for table in _replicas:
+        channel.on_postgres_changes("*", callback=_on_feed_change, table=table, schema="public")
+    await channel.subscribe(_on_feed_state)
+    while True:
+        await asyncio.sleep(3600)
+
+
+def _start_feed():
+    if _feed["status"] != "off" or not REPLICA_REALTIME:
+        return
+    with _feed_lock:
+        if _feed["status"] != "off":
+            return
+        _feed["status"] = "connecting"
+
+    def run():
+        try:
+            asyncio.run(_run_feed())
+        except Exception as e:
+            print(f"⚠️ Replica change feed unavailable ({e}); falling back to TTL refresh")
+        _feed["live"] = False
+        _feed["status"] = "unavailable"
+    threading.Thread(target=run, name="replica-feed", daemon=True).start()
+
+
+def stats() -> dict:
+    """
+    Counters, and the state of the current tenant's replica of each table.
+    """
+    tables = {}
+    for table, partitions in _replicas.items():
+        r = partitions.get(tenancy.partition(table)) or TableReplica(table)
+        tables[table] = {"rows": len(r.rows), "loaded": r.loaded_at is not None and not r.too_large,
+                         "age_s": round(time.monotonic() - r.loaded_at, 1) if r.loaded_at else None}
+    return dict(_stats, feed=_feed["status"], tables=tables)
+
+
+if _replicas:
+    events.on_change(_on_change)
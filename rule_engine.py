@@ -0,0 +1,366 @@
+"""
+Automation rule engine.
+
+Enabled automations are cached in memory, indexed by trigger type (one cache
+per tenant with tenancy on). The cache is invalidated by
+create_automation/toggle_automation in this process, and expires after
+AUTOMATION_CACHE_TTL seconds so other workers see changes too.
+
+condition_json is compiled once per rule into a predicate over a shared
+context. The context holds metrics such as overdue_tasks. Each metric is
+computed once per trigger run, and only if some rule needs it. A trigger
+with hundreds of rules therefore costs one fetch per metric plus one pass
+over the predicates.
+
+Condition syntax:
+    {}                                        always true
+    {"min_overdue": 1}                        overdue_tasks >= 1 (legacy form)
+    {"min_<metric>": n} / {"max_<metric>": n} metric >= n / metric <= n
+    {"metric": "pending_assets", "op": "gt", "value": 10}
+    {"all": [...]} / {"any": [...]} / {"not": {...}}
+    {"where": {"status": "completed"}}        some triggering event's row matches
+    {"min_event_count": 5}                    at least 5 events in the batch
+Several keys in one object must all hold.
+
+Automations whose trigger_type is a change event name ("task.status_changed",
+"asset.reviewed", ...; see events.py) run when that event fires, in debounced
+batches, once enable_event_triggers() has been called.
+
+A matched rule's actions run concurrently on a shared thread pool.
+"""
+import os
+import time
+import threading
+import contextvars
+import events
+import tenancy
+import date_index
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from supabase_client import fetch_rows, count_rows, compile_filters, row_matches
+from tracing import span
+from tools.notifications import send_whatsapp_message, send_email
+from tools.reports import send_periodic_marketing_report
+
+AUTOMATION_CACHE_TTL = float(os.environ.get("AUTOMATION_CACHE_TTL", "60"))
+AUTOMATION_ACTION_CONCURRENCY = int(os.environ.get("AUTOMATION_ACTION_CONCURRENCY", "8"))
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+# Context metrics: name -> function computing it from the data layer.
+METRICS: dict[str, Callable[[], int]] = {
+    "overdue_tasks": lambda: date_index.count_overdue(_today()),
+    "open_tasks": lambda: count_rows("tasks", {"status__neq": "completed"}),
+    "tasks_in_progress": lambda: count_rows("tasks", {"status": "in_progress"}),
+    "active_campaigns": lambda: count_rows("campaigns", {"status": "active"}),
+    "pending_assets": lambda: count_rows("assets", {"status": "pending"}),
+}
+# Metrics of the triggering event batch, available to event-triggered rules.
+EVENT_METRICS = ("event_count",)
+# Shorthand keys kept for existing rules.
+ALIASES = {"overdue": "overdue_tasks"}
+
+_OPS = {
+    "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+}
+
+
+class ConditionError(ValueError):
+    pass
+
+
+class Context:
+    """
+    Shared data for one trigger run. Metrics are computed on first use.
+    """
+
+    def __init__(self, trigger_events: Optional[list] = None):
+        self.events = trigger_events or []
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, metric: str):
+        if metric == "event_count":
+            return len(self.events)
+        with self._lock:
+            if metric not in self._values:
+                self._values[metric] = METRICS[metric]()
+            return self._values[metric]
+
+    def prefetch(self, metrics: set):
+        for metric in metrics - set(EVENT_METRICS):
+            self[metric]
+
+    def values(self) -> dict:
+        return dict(self._values)
+
+
+def _metric(name: str) -> str:
+    name = ALIASES.get(name, name)
+    if name not in METRICS and name not in EVENT_METRICS:
+        raise ConditionError(f"Unknown metric '{name}'. Choose from: {', '.join([*METRICS, *EVENT_METRICS])}")
+    return name
+
+
+def compile_condition(condition: Optional[dict]) -> tuple[Callable[[Context], bool], set]:
+    """
+    Compile condition_json into (predicate, metrics it reads).
+    """
+    if not condition:
+        return (lambda ctx: True), set()
+    if not isinstance(condition, dict):
+        raise ConditionError("Condition must be an object")
+
+    parts = []
+    metrics = set()
+    for key, value in condition.items():
+        if key in ("all", "any"):
+            compiled = [compile_condition(c) for c in value]
+            preds = [p for p, _ in compiled]
+            metrics.update(m for _, ms in compiled for m in ms)
+            combine = all if key == "all" else any
+            parts.append(lambda ctx, preds=preds, combine=combine: combine(p(ctx) for p in preds))
+        elif key == "not":
+            pred, ms = compile_condition(value)
+            metrics |= ms
+            parts.append(lambda ctx, pred=pred: not pred(ctx))
+        elif key == "metric":
+            name = _metric(value)
+            op = condition.get("op", "gte")
+            if op not in _OPS:
+                raise ConditionError(f"Unknown op '{op}'")
+            metrics.add(name)
+            parts.append(lambda ctx, name=name, fn=_OPS[op], target=condition.get("value", 0): fn(ctx[name], target))
+        elif key == "where":
+            compiled_where = compile_filters(value)
+            parts.append(lambda ctx, where=compiled_where: any(row_matches(e.row or {}, where) for e in ctx.events))
+        elif key in ("op", "value"):
+            continue
+        elif key.startswith("min_") or key.startswith("max_"):
+            name = _metric(key[4:])
+            metrics.add(name)
+            fn = _OPS["gte"] if key.startswith("min_") else _OPS["lte"]
+            parts.append(lambda ctx, name=name, fn=fn, target=value: fn(ctx[name], target))
+        else:
+            raise ConditionError(f"Unknown condition key '{key}'")
+
+    if len(parts) == 1:
+        return parts[0], metrics
+    return (lambda ctx: all(p(ctx) for p in parts)), metrics
+
+
+class Rule:
+    __slots__ = ("automation", "predicate", "metrics", "error")
+
+    def __init__(self, automation: dict):
+        self.automation = automation
+        self.error = None
+        try:
+            self.predicate, self.metrics = compile_condition(automation.get("condition_json"))
+        except (ConditionError, TypeError, AttributeError) as e:
+            self.predicate, self.metrics = (lambda ctx: False), set()
+            self.error = f"Invalid condition: {e}"
+
+
+# --- Cache ---
+
+_caches_lock = threading.Lock()
+_caches = {}  # tenant (None when tenancy is off) -> {"rules": by trigger type, "loaded_at", "lock"}
+# Trigger types with enabled rules in any tenant, read on the write path by the event matcher.
+_trigger_types: frozenset = frozenset()
+_events_enabled = False
+
+
+def _cache() -> dict:
+    key = tenancy.partition()
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(key, {"rules": None, "loaded_at": 0.0, "lock": threading.Lock()})
+    return cache
+
+
+def invalidate():
+    cache = _cache()
+    with cache["lock"]:
+        cache["rules"] = None
+    if _events_enabled:
+        rules_for("")  # Reload now so the event matcher sees new triggers
+
+
+def rules_for(trigger_type: str) -> list[Rule]:
+    global _trigger_types
+    cache = _cache()
+    with cache["lock"]:
+        if cache["rules"] is None or time.monotonic() - cache["loaded_at"] > AUTOMATION_CACHE_TTL:
+            index = {}
+            for automation in fetch_rows("automations", {"is_enabled": True}):
+                index.setdefault(automation.get("trigger_type"), []).append(Rule(automation))
+            cache["rules"] = index
+            cache["loaded_at"] = time.monotonic()
+            with _caches_lock:
+                _trigger_types = frozenset(t for c in _caches.values() for t in c["rules"] or ())
+        return cache["rules"].get(trigger_type, [])
+
+
+# --- Actions ---
+
+_ROLES = ("admin", "manager", "team")
+
+
+def _phone_numbers(to: Optional[str]) -> list[str]:
+    if to in _ROLES:
+        return [u["phone_number"] for u in fetch_rows("users", {"role": to}) if u.get("phone_number")] or ["mock_number"]
+    return [to or "mock_number"]
+
+
+def _run_action(automation: dict, action: dict) -> dict:
+    action_type = action.get("type")
+    with span("automation.action", type=action_type, automation_id=automation.get("id")):
+        if action_type == "whatsapp":
+            message = action.get("message") or f"Automation Triggered: {automation.get('name')}"
+            results = [send_whatsapp_message(number, message) for number in _phone_numbers(action.get("to"))]
+            return results[0] if len(results) == 1 else {"status": "success", "results": results}
+        if action_type == "email_report":
+            return send_periodic_marketing_report(action.get("to"), action.get("period", "weekly"))
+        if action_type == "email":
+            return send_email(action.get("to"), action.get("subject") or automation.get("name", "Automation"),
+                              action.get("body", ""))
+        return {"status": "error", "message": f"Unknown action type '{action_type}'"}
+
+
+def _timed(fn, *args) -> tuple[dict, float]:
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    return result, (time.perf_counter() - started) * 1000
+
+
+# --- Engine ---
+
+def run_trigger(trigger_type: str, trigger_events: Optional[list] = None) -> dict:
+    """
+    Evaluate every enabled rule for trigger_type against one shared context and
+    run the matching rules' actions concurrently. trigger_events is the event
+    batch when called from the event bus.
+    """
+    started = time.perf_counter()
+    rules = rules_for(trigger_type)
+    loaded = time.perf_counter()
+
+    context = Context(trigger_events)
+    context.prefetch(set().union(*(rule.metrics for rule in rules)) if rules else set())
+    prefetched = time.perf_counter()
+
+    matched, skipped = [], []
+    for rule in rules:
+        eval_started = time.perf_counter()
+        if rule.error:
+            skipped.append({"automation_id": rule.automation.get("id"), "name": rule.automation.get("name"),
+                            "reason": rule.error})
+            continue
+        try:
+            ok = rule.predicate(context)
+        except Exception as e:
+            skipped.append({"automation_id": rule.automation.get("id"), "name": rule.automation.get("name"),
+                            "reason": f"Condition failed: {e}"})
+            continue
+        condition_ms = (time.perf_counter() - eval_started) * 1000
+        if ok:
+            matched.append((rule, condition_ms))
+        else:
+            skipped.append({"automation_id": rule.automation.get("id"), "name": rule.automation.get("name"),
+                            "reason": "condition_not_met", "timing_ms": {"condition": round(condition_ms, 3)}})
+
+    executed = []
+    with ThreadPoolExecutor(max_workers=AUTOMATION_ACTION_CONCURRENCY, thread_name_prefix="automation") as pool:
+        submitted = []
+        for rule, condition_ms in matched:
+            # Copy the context so action spans join the caller's trace
+            futures = [pool.submit(contextvars.copy_context().run, _timed, _run_action, rule.automation, action)
+                       for action in rule.automation.get("actions_json") or []]
+            submitted.append((rule, condition_ms, futures))
+        for rule, condition_ms, futures in submitted:
+            outcomes = [f.result() for f in futures]
+            executed.append({
+                "automation_id": rule.automation["id"],
+                "name": rule.automation.get("name"),
+                "results": [result for result, _ in outcomes],
+                "timing_ms": {
+                    "condition": round(condition_ms, 3),
+                    "actions": [round(ms, 3) for _, ms in outcomes],
+                },
+            })
+
+    return {
+        "status": "success",
+        "trigger_type": trigger_type,
+        "evaluated": len(rules),
+        "executed": executed,
+        "skipped": skipped,
+        "context": context.values(),
+        "timing_ms": {
+            "load_rules": round((loaded - started) * 1000, 3),
+            "fetch_context": round((prefetched - loaded) * 1000, 3),
+            "total": round((time.perf_counter() - started) * 1000, 3),
+        },
+    }
+
+
+# --- Event triggers ---
+
+_refreshing = threading.Lock()
+
+
+def _refresh_in_background():
+    if _refreshing.acquire(blocking=False):
+        def run():
+            try:
+                for tenant in list(_caches):
+                    with tenancy.use(tenant):
+                        rules_for("")
+            finally:
+                _refreshing.release()
+        threading.Thread(target=run, name="automation-refresh", daemon=True).start()
+
+
+def _wants(event_name: str) -> bool:
+    # Runs inside every write: only a set lookup, plus a background reload when a cache is stale
+    now = time.monotonic()
+    if any(now - cache["loaded_at"] > AUTOMATION_CACHE_TTL for cache in list(_caches.values())):
+        _refresh_in_background()
+    return event_name in _trigger_types
+
+
+def _on_events(batch: list) -> None:
+    groups = {}
+    for event in batch:
+        groups.setdefault((event.tenant, event.name), []).append(event)
+    for (tenant, name), group in groups.items():
+        with tenancy.use(tenant):
+            if not rules_for(name):
+                continue  # Another tenant's automations want this event
+            result = run_trigger(name, group)
+        print(f"Automations for {name}: {len(group)} events, {len(result['executed'])} of {result['evaluated']} rules ran "
+              f"in {result['timing_ms']['total']}ms")
+
+
+def enable_event_triggers():
+    """
+    Subscribe automations to change events; called once per process at startup.
+    """
+    global _events_enabled
+    if _events_enabled:
+        return
+    _events_enabled = True
+    tenancy.for_each(lambda: rules_for(""))
+    events.subscribe(_wants, _on_events)
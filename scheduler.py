@@ -1,10 +1,20 @@
 import os
 import logging
+from datetime import datetime, timedelta
+from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+import tenancy
 from tools.notifications import send_email, send_whatsapp_message
+from digest import run_daily_digest
+from archive import run_archival
+from activity_store import run_maintenance as run_activity_maintenance
+from delta import prune_tombstones
+from uploads import expire as expire_uploads
+from asset_processing import requeue as requeue_assets
+from session_tokens import prune as prune_revoked_tokens
 from tools.reports import generate_dashboard_summary
-from supabase_client import fetch_rows
+from coordination import elect_leader, claim_run, finish_run, has_run
 
 # Configure logging
 logging.basicConfig()
@@ -12,31 +22,10 @@ logging.getLogger('apscheduler').setLevel(logging.WARNING)
 
 def job_daily_task_digest():
     """
-    Runs daily to send task digests to users.
+    Runs daily to send each assignee a digest of their open tasks.
     """
     print("Running job: daily_task_digest")
-    # Mock logic: Fetch all tasks, group by assignee, send email
-    tasks = fetch_rows("tasks")
-    if not tasks:
-        return
-
-    tasks_by_user = {}
-    for t in tasks:
-        assignee = t.get("assignee_email")
-        if assignee:
-            if assignee not in tasks_by_user:
-                tasks_by_user[assignee] = []
-            tasks_by_user[assignee].append(t)
-            
-    for email, user_tasks in tasks_by_user.items():
-        count = len(user_tasks)
-        subject = f"Daily Task Digest: {count} tasks assigned to you"
-        html = f"<h3>You have {count} tasks:</h3><ul>"
-        for t in user_tasks:
-            html += f"<li>{t.get('title')} ({t.get('status')})</li>"
-        html += "</ul>"
-        
-        send_email(email, subject, html)
+    return run_daily_digest()
 
 def job_weekly_campaign_report():
     """
@@ -54,33 +43,195 @@ def job_weekly_campaign_report():
     <p>Completed Campaigns: {summary['completed_campaigns']}</p>
     """
     send_email(admin_email, subject, html)
+    return {"emails": 1}
 
 def job_archive_finished_campaigns():
     """
     Runs hourly to archive finished campaigns.
     """
     print("Running job: archive_finished_campaigns")
-    # Mock logic: find campaigns with end_date < now
-    pass
+    return run_archival()
+
+def job_activity_maintenance():
+    """
+    Runs hourly to partition, roll up and expire activity logs.
+    """
+    print("Running job: activity_maintenance")
+    return run_activity_maintenance()
+
+def job_prune_tombstones():
+    """
+    Runs daily to drop delta-sync tombstones past their retention, and
+    session token revocations whose tokens have expired.
+    """
+    print("Running job: prune_tombstones")
+    return {"tombstones": prune_tombstones(), "revoked_tokens": prune_revoked_tokens()}
+
+def job_expire_uploads():
+    """
+    Runs hourly to drop asset uploads that were started but never completed.
+    """
+    print("Running job: expire_uploads")
+    return {"uploads": expire_uploads()}
+
+def job_process_assets():
+    """
+    Runs every 10 minutes to queue asset processing that was deferred or lost.
+    """
+    print("Running job: process_assets")
+    return {"assets": requeue_assets()}
+
+# Job registry. Each run is keyed by its schedule slot (the cron fire time it
+# belongs to), so a slot runs at most once across all replicas and restarts.
+#   catch_up: "latest" -> a newly elected leader runs the most recent missed
+#             slot if it is no older than max_lateness; "skip" -> wait for the
+#             next slot.
+JOBS = {
+    "daily_task_digest": {
+        "func": job_daily_task_digest,
+        "trigger": CronTrigger(hour=9, minute=0),  # Daily at 09:00
+        "catch_up": "latest",
+        "max_lateness": timedelta(hours=12),
+    },
+    "weekly_campaign_report": {
+        "func": job_weekly_campaign_report,
+        "trigger": CronTrigger(day_of_week='fri', hour=17, minute=0),  # Weekly on Friday at 17:00
+        "catch_up": "latest",
+        "max_lateness": timedelta(days=2),
+    },
+    "archive_finished_campaigns": {
+        "func": job_archive_finished_campaigns,
+        "trigger": CronTrigger(minute=0),  # Hourly; the next run covers a missed one
+        "catch_up": "skip",
+        "max_lateness": timedelta(hours=1),
+    },
+    "activity_maintenance": {
+        "func": job_activity_maintenance,
+        "trigger": CronTrigger(minute=5),  # Hourly at :05; each run catches up from its watermark
+        "catch_up": "skip",
+        "max_lateness": timedelta(hours=1),
+    },
+    "prune_tombstones": {
+        "func": job_prune_tombstones,
+        "trigger": CronTrigger(hour=3, minute=15),  # Daily at 03:15
+        "catch_up": "skip",
+        "max_lateness": timedelta(days=1),
+    },
+    "expire_uploads": {
+        "func": job_expire_uploads,
+        "trigger": CronTrigger(minute=40),  # Hourly at :40
+        "catch_up": "skip",
+        "max_lateness": timedelta(hours=1),
+    },
+    "process_assets": {
+        "func": job_process_assets,
+        "trigger": CronTrigger(minute="5/10"),  # Every 10 minutes
+        "catch_up": "skip",
+        "max_lateness": timedelta(minutes=10),
+    },
+}
+
+# How late APScheduler may start a run (e.g. after a long GC pause or a busy
+# pool) before counting it as missed. Missed runs are coalesced into one.
+JOB_MISFIRE_GRACE_SECONDS = int(os.environ.get("JOB_MISFIRE_GRACE_SECONDS", "300"))
+
+def latest_slot(name: str, now: Optional[datetime] = None, lookback: Optional[timedelta] = None) -> Optional[datetime]:
+    """
+    The most recent fire time of a job's trigger at or before `now`, looking
+    back at most `lookback` (default 8 days, enough for weekly jobs).
+    """
+    trigger = JOBS[name]["trigger"]
+    now = now or datetime.now(trigger.timezone)
+    slot = None
+    fire_time = trigger.get_next_fire_time(None, now - (lookback or timedelta(days=8)))
+    while fire_time and fire_time <= now:
+        slot = fire_time
+        fire_time = trigger.get_next_fire_time(fire_time, fire_time + timedelta(microseconds=1))
+    return slot
+
+def run_job(name: str, slot: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Run a job for one schedule slot (default: the latest one) unless that slot
+    has already run. Returns the job_runs record, or None if skipped.
+    """
+    slot = slot or latest_slot(name) or datetime.now(JOBS[name]["trigger"].timezone)
+    run = claim_run(name, slot)
+    if run is None:
+        print(f"Skipping {name} for {slot.isoformat()}: already run or running")
+        return None
+    try:
+        # With tenancy on, once per tenant; the result maps each tenant to its rows
+        rows = tenancy.for_each(JOBS[name]["func"])
+    except Exception as e:
+        print(f"❌ Job {name} failed: {e}")
+        return finish_run(run, "failed", error=str(e))
+    failed = {tenant: r["error"] for tenant, r in rows.items() if isinstance(r, dict) and "error" in r} \
+        if tenancy.MULTI_TENANT else {}
+    if failed:
+        return finish_run(run, "failed", rows=rows, error="; ".join(f"{t}: {e}" for t, e in failed.items()))
+    return finish_run(run, "succeeded", rows=rows)
+
+def catch_up(scheduler: BackgroundScheduler):
+    """
+    Queue the latest missed slot of each "latest" job, e.g. one that fell due
+    while no leader was running.
+    """
+    for name, job in JOBS.items():
+        if job["catch_up"] != "latest":
+            continue
+        slot = latest_slot(name, lookback=job["max_lateness"])
+        if slot and not has_run(name, slot):
+            print(f"Catching up {name} for missed slot {slot.isoformat()}")
+            scheduler.add_job(run_job, args=[name, slot], id=f"catch-up-{name}", replace_existing=True)
+
+_election = None
+_scheduler = None
+
+def _run_scheduler():
+    """
+    Creates and starts the APScheduler instance. Runs in the elected leader only.
+    """
+    global _scheduler
+    scheduler = BackgroundScheduler(job_defaults={
+        "coalesce": True,
+        "max_instances": 1,
+        "misfire_grace_time": JOB_MISFIRE_GRACE_SECONDS,
+    })
+    for name, job in JOBS.items():
+        scheduler.add_job(run_job, job["trigger"], args=[name], id=name)
+    scheduler.start()
+    _scheduler = scheduler
+    catch_up(scheduler)
+    print("Scheduler started.")
+
+def _stop_jobs():
+    """
+    Stops the APScheduler instance, e.g. after this process loses leadership.
+    """
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+        print("Scheduler stopped.")
 
 def start_scheduler():
     """
-    Starts the background scheduler.
+    Starts the background scheduler in whichever worker process wins leader
+    election, so multi-worker deployments run each job once.
     """
+    global _election
     if os.getenv("ENABLE_SCHEDULER", "false").lower() != "true":
         print("Scheduler disabled (ENABLE_SCHEDULER != true)")
         return
+    if _election is None:
+        _election = elect_leader("scheduler", _run_scheduler, _stop_jobs)
 
-    scheduler = BackgroundScheduler()
-    
-    # Daily at 09:00
-    scheduler.add_job(job_daily_task_digest, CronTrigger(hour=9, minute=0))
-    
-    # Weekly on Friday at 17:00
-    scheduler.add_job(job_weekly_campaign_report, CronTrigger(day_of_week='fri', hour=17, minute=0))
-    
-    # Hourly
-    scheduler.add_job(job_archive_finished_campaigns, CronTrigger(minute=0))
-    
-    scheduler.start()
-    print("Scheduler started.")
+def stop_scheduler():
+    """
+    Stops the scheduler (if this process is the leader) and releases leadership.
+    """
+    global _election
+    _stop_jobs()
+    if _election is not None:
+        _election.stop()
+        _election = None
@@ -0,0 +1,435 @@
+"""
+In-memory full-text search over campaigns, tasks and assets.
+
+Indexed text: campaign names, task titles and descriptions, asset descriptions.
+Each document also keeps its entity type and status for filtering.
+
+Postings are compact arrays of doc numbers, ascending. Term frequencies are
+kept only for terms that occur more than once in some document. Documents
+are added and removed incrementally from data-layer writes (events.on_change).
+A changed row is re-added under a new doc number and the old one is marked
+dead. Dead postings are dropped by a compaction once they pass a third of the
+live documents.
+
+Queries are tokenised like documents. Each query term expands to:
+    the exact term                           weight 1.0
+    terms it prefixes (the last query term,  weight 0.7, the 20 most frequent
+      terms ending in "*", or unknown terms)
+    trigram-similar terms (unknown terms)    weight 0.6 x similarity, best 5
+Expansions are scored with BM25, rarest first. A term in more than
+SEARCH_SCAN_LIMIT documents, or in ten times as many as the rarer terms
+matched, only adds to documents those terms already matched. No term
+scores more than SEARCH_SCAN_LIMIT documents, so a query of only common
+words ranks its first matches rather than all of them. This keeps queries
+in milliseconds at a million documents.
+
+The index is built on first use (or at startup with SEARCH_WARM=true). With
+tenancy on, each tenant has its own index of its own rows (see tenancy.py).
+Writes from other processes are not seen here, so with SQLite or Supabase
+the index is rebuilt in the background every SEARCH_REFRESH_SECONDS.
+"""
+import os
+import re
+import math
+import time
+import heapq
+import bisect
+import threading
+import contextvars
+import unicodedata
+from array import array
+from typing import Optional
+
+import events
+import tenancy
+import supabase_client as db
+
+SEARCH_SCAN_LIMIT = int(os.environ.get("SEARCH_SCAN_LIMIT", "10000"))
+SEARCH_REFRESH_SECONDS = float(os.environ.get("SEARCH_REFRESH_SECONDS", "300"))
+
+# entity type -> (table, text columns)
+ENTITIES = {
+    "campaign": ("campaigns", ("name",)),
+    "task": ("tasks", ("title", "description")),
+    "asset": ("assets", ("description",)),
+}
+_TABLES = {table: (code, entity, columns) for code, (entity, (table, columns)) in enumerate(ENTITIES.items())}
+_ENTITY_CODES = {entity: code for code, entity in enumerate(ENTITIES)}
+
+STOPWORDS = frozenset("a an and are as at be by for from in into is it of on or the to with".split())
+_TOKEN = re.compile(r"[a-z0-9]+")
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.7
+PREFIX_EXPANSIONS = 20
+FUZZY_WEIGHT = 0.6
+FUZZY_EXPANSIONS = 5
+FUZZY_MIN_SIMILARITY = 0.35
+
+
+def tokenize(text) -> list[str]:
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode().lower()
+    return [t for t in _TOKEN.findall(folded) if t not in STOPWORDS]
+
+
+def trigrams(term: str) -> set[str]:
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.doc_of = [{} for _ in ENTITIES]  # per entity code: row id -> doc number
+        self.doc_ids = []                     # doc number -> row id, None once dead
+        self.doc_len = array("H")
+        self.doc_entity = array("b")
+        self.doc_status = array("h")
+        self.statuses = {}                    # status -> code
+        # term -> doc number while one document has it, then an ascending array of doc numbers.
+        # Most terms (ids, numbers in names) occur once, and a bare int is a fraction of an array.
+        self.postings = {}
+        self.tfs = {}                         # term -> term frequencies parallel to postings; absent while all are 1
+        self.vocab = []                       # sorted non-numeric terms, for prefix matching
+        self.trigram_terms = {}               # trigram -> set of terms
+        self.live = 0
+        self.dead = 0
+        self.total_len = 0
+
+    def _docs(self, term: str):
+        docs = self.postings[term]
+        return (docs,) if type(docs) is int else docs
+
+    def _df(self, term: str) -> int:
+        docs = self.postings[term]
+        return 1 if type(docs) is int else len(docs)
+
+    # --- Writes ---
+
+    def add(self, table: str, row: dict):
+        code, _, columns = _TABLES[table]
+        row_id = str(row.get("id"))
+        tokens = [t for column in columns for t in tokenize(row.get(column))]
+        counts = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        with self.lock:
+            self._remove(code, row_id)
+            doc = len(self.doc_ids)
+            self.doc_ids.append(row_id)
+            self.doc_of[code][row_id] = doc
+            self.doc_len.append(min(len(tokens), 65535))
+            self.doc_entity.append(code)
+            self.doc_status.append(self.statuses.setdefault(row.get("status"), len(self.statuses)))
+            for term, tf in counts.items():
+                tf = min(tf, 65535)
+                docs = self.postings.get(term)
+                if docs is None:
+                    self.postings[term] = doc
+                    self._add_term(term)
+                    if tf > 1:
+                        self.tfs[term] = array("H", (tf,))
+                    continue
+                if type(docs) is int:
+                    docs = self.postings[term] = array("I", (docs,))
+                docs.append(doc)
+                tfs = self.tfs.get(term)
+                if tfs is not None:
+                    tfs.append(tf)
+                elif tf > 1:
+                    self.tfs[term] = array("H", [1] * (len(docs) - 1) + [tf])
+            self.live += 1
+            self.total_len += len(tokens)
+            self._maybe_compact()
+
+    def _add_term(self, term: str):
+        if term.isdigit():
+            return  # Numbers match exactly only
+        bisect.insort(self.vocab, term)
+        for gram in trigrams(term):
+            self.trigram_terms.setdefault(gram, set()).add(term)
+
+    def _remove(self, code: int, row_id: str) -> bool:
+        doc = self.doc_of[code].pop(row_id, None)
+        if doc is None:
+            return False
+        self.doc_ids[doc] = None
+        self.live -= 1
+        self.dead += 1
+        self.total_len -= self.doc_len[doc]
+        return True
+
+    def remove(self, table: str, row_id):
+        with self.lock:
+            self._remove(_TABLES[table][0], str(row_id))
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self.dead > 10000 and self.dead > self.live // 3:
+            self.compact()
+
+    def remove_matching(self, table: str, status) -> int:
+        code = _TABLES[table][0]
+        status_code = self.statuses.get(status)
+        with self.lock:
+            row_ids = [row_id for row_id, doc in self.doc_of[code].items() if self.doc_status[doc] == status_code]
+            for row_id in row_ids:
+                self._remove(code, row_id)
+        return len(row_ids)
+
+    def compact(self):
+        """
+        Drop dead documents from the postings and renumber the live ones.
+        """
+        with self.lock:
+            renumber = {}
+            doc_ids, doc_len, doc_entity, doc_status = [], array("H"), array("b"), array("h")
+            for doc, row_id in enumerate(self.doc_ids):
+                if row_id is not None:
+                    renumber[doc] = len(doc_ids)
+                    doc_ids.append(row_id)
+                    doc_len.append(self.doc_len[doc])
+                    doc_entity.append(self.doc_entity[doc])
+                    doc_status.append(self.doc_status[doc])
+            postings, tfs = {}, {}
+            for term in self.postings:
+                old_tfs = self.tfs.get(term)
+                kept = [(renumber[d], old_tfs[i] if old_tfs is not None else 1)
+                        for i, d in enumerate(self._docs(term)) if d in renumber]
+                if not kept:
+                    if not term.isdigit():
+                        del self.vocab[bisect.bisect_left(self.vocab, term)]
+                        for gram in trigrams(term):
+                            self.trigram_terms[gram].discard(term)
+                    continue
+                postings[term] = kept[0][0] if len(kept) == 1 else array("I", (d for d, _ in kept))
+                if any(tf > 1 for _, tf in kept):
+                    tfs[term] = array("H", (tf for _, tf in kept))
+            self.postings, self.tfs = postings, tfs
+            self.doc_ids, self.doc_len, self.doc_entity, self.doc_status = doc_ids, doc_len, doc_entity, doc_status
+            self.doc_of = [{} for _ in ENTITIES]
+            for doc, row_id in enumerate(doc_ids):
+                self.doc_of[doc_entity[doc]][row_id] = doc
+            self.dead = 0
+
+    # --- Queries ---
+
+    def _expand(self, token: str, prefix: bool) -> list[tuple[str, float]]:
+        expanded = []
+        exact = token in self.postings
+        if exact:
+            expanded.append((token, 1.0))
+        if prefix or not exact:
+            start = bisect.bisect_left(self.vocab, token)
+            end = bisect.bisect_left(self.vocab, token + "\x7f")
+            longer = [t for t in self.vocab[start:end] if t != token]
+            if len(longer) > PREFIX_EXPANSIONS:
+                longer = heapq.nlargest(PREFIX_EXPANSIONS, longer, key=self._df)
+            expanded += [(t, PREFIX_WEIGHT) for t in longer]
+        if not exact and len(token) >= 3 and not token.isdigit():
+            grams = trigrams(token)
+            shared = {}
+            for gram in grams:
+                for term in self.trigram_terms.get(gram, ()):
+                    shared[term] = shared.get(term, 0) + 1
+            # Jaccard similarity of the trigram sets; a term of n letters has n trigrams
+            similar = [(n / (len(grams) + len(term) - n), term) for term, n in shared.items()]
+            seen = {t for t, _ in expanded}
+            expanded += [(term, FUZZY_WEIGHT * similarity)
+                         for similarity, term in heapq.nlargest(FUZZY_EXPANSIONS, similar)
+                         if similarity >= FUZZY_MIN_SIMILARITY and term not in seen]
+        return expanded
+
+    def search(self, query: str, entity_types: Optional[list[str]] = None, statuses: Optional[list[str]] = None,
+               limit: int = 20) -> tuple[list[tuple[str, str, float]], int]:
+        """
+        Best matches as (entity type, row id, score), and how many documents were scored.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return [], 0
+        starred = set(tokenize(" ".join(w for w in query.split() if w.endswith("*"))))
+        with self.lock:
+            terms = {}
+            for i, token in enumerate(tokens):
+                # The last term may still be being typed
+                prefix = i == len(tokens) - 1 or token in starred
+                for term, weight in self._expand(token, prefix):
+                    terms[term] = max(terms.get(term, 0), weight)
+
+            entity_codes = None if not entity_types else {_ENTITY_CODES[e] for e in entity_types if e in _ENTITY_CODES}
+            status_codes = None if not statuses else {self.statuses[s] for s in statuses if s in self.statuses}
+            if entity_codes is not None and not entity_codes or status_codes is not None and not status_codes:
+                return [], 0
+
+            n = max(self.live, 1)
+            avg_len = self.total_len / n or 1.0
+            doc_ids, doc_len, doc_entity, doc_status = self.doc_ids, self.doc_len, self.doc_entity, self.doc_status
+            scores = {}
+            for term, weight in sorted(terms.items(), key=lambda item: self._df(item[0])):
+                docs, tfs = self._docs(term), self.tfs.get(term)
+                df = len(docs)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                if scores and df > min(SEARCH_SCAN_LIMIT, 10 * len(scores)):
+                    # Common term: only add to the documents rarer terms matched
+                    positions = []
+                    for d in scores:
+                        i = bisect.bisect_left(docs, d)
+                        if i < df and docs[i] == d:
+                            positions.append(i)
+                else:
+                    positions = range(df)
+                scored = 0
+                for i in positions:
+                    d = docs[i]
+                    if doc_ids[d] is None:
+                        continue
+                    if entity_codes is not None and doc_entity[d] not in entity_codes:
+                        continue
+                    if status_codes is not None and doc_status[d] not in status_codes:
+                        continue
+                    tf = tfs[i] if tfs is not None else 1
+                    norm = tf + K1 * (1 - B + B * doc_len[d] / avg_len)
+                    scores[d] = scores.get(d, 0.0) + weight * idf * tf * (K1 + 1) / norm
+                    scored += 1
+                    if scored >= SEARCH_SCAN_LIMIT:
+                        break
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            entities = list(ENTITIES)
+            return [(entities[doc_entity[d]], doc_ids[d], round(score, 4)) for d, score in best], len(scores)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"documents": self.live, "dead": self.dead, "terms": len(self.postings),
+                    "postings": sum(self._df(term) for term in self.postings)}
+
+
+# --- Lifecycle ---
+
+_states = {}  # tenant (None when tenancy is off) -> that tenant's index and its lifecycle
+_states_lock = threading.Lock()
+
+
+def _state() -> dict:
+    key = tenancy.partition()
+    state = _states.get(key)
+    if state is None:
+        with _states_lock:
+            state = _states.setdefault(key, {"index": None, "built_at": None, "building": False, "replay": None,
+                                             "build_ms": None, "lock": threading.Lock()})
+    return state
+
+
+def build() -> SearchIndex:
+    """
+    Build a fresh index from the backend and swap it in. Writes that arrive
+    during the build are replayed onto the new index.
+    """
+    state = _state()
+    with state["lock"]:
+        state["replay"] = []
+        started = time.perf_counter()
+        index = SearchIndex()
+        # Supabase caps responses at 1000 rows
+        page_size = 1000 if db.backend_name() == "supabase" else 100000
+        for table in _TABLES:
+            for row in db.iter_rows(table, page_size=page_size):
+                index.add(table, row)
+        with index.lock:
+            replay, state["replay"] = state["replay"], None
+            for change in replay:
+                _apply(index, *change)
+            state["index"] = index
+            state["built_at"] = time.monotonic()
+        state["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return index
+
+
+def _build_in_background():
+    state = _state()
+    if state["building"]:
+        return
+    state["building"] = True
+
+    def run():
+        try:
+            build()
+        except Exception as e:
+            print(f"⚠️ Search index build failed: {e}")
+        finally:
+            state["building"] = False
+    # The copied context builds the current tenant's index
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="search-index", daemon=True).start()
+
+
+def get_index() -> SearchIndex:
+    state = _state()
+    index = state["index"]
+    if index is None:
+        return build()
+    if db.backend_name() != "mock" and time.monotonic() - state["built_at"] > SEARCH_REFRESH_SECONDS:
+        _build_in_background()
+    return index
+
+
+def warm():
+    """
+    Build the index (each tenant's) in a background thread (server startup).
+    """
+    def start():
+        if _state()["index"] is None:
+            _build_in_background()
+    tenancy.for_each(start)
+
+
+def reset():
+    """
+    Drop every tenant's index, so the next read builds it again. For callers
+    that replace the data without writes (datagen, benchmarks).
+    """
+    with _states_lock:
+        _states.clear()
+
+
+def _apply(index: SearchIndex, table: str, op: str, rows: Optional[list], filters: Optional[dict]):
+    if op != "delete":
+        for row in rows or []:
+            index.add(table, row)
+        return
+    filters = filters or {}
+    ids = filters.get("id__in") or ([filters["id"]] if "id" in filters else None)
+    if ids is not None and len(filters) == 1:
+        for row_id in ids:
+            index.remove(table, row_id)
+    elif set(filters) == {"status"}:
+        index.remove_matching(table, filters["status"])
+    else:
+        _build_in_background()  # Cannot tell which documents went
+
+
+def _on_change(table: str, op: str, rows: Optional[list], changes: Optional[dict], filters: Optional[dict]):
+    if table not in _TABLES:
+        return
+    # Writes run on behalf of the tenant whose rows they touch
+    state = _states.get(tenancy.partition())
+    if state is None:
+        return
+    replay = state["replay"]
+    if replay is not None:
+        replay.append((table, op, rows, filters))
+    if state["index"] is not None:
+        _apply(state["index"], table, op, rows, filters)
+
+
+def stats() -> dict:
+    state = _state()
+    index = state["index"]
+    return {"built": index is not None, "build_ms": state["build_ms"],
+            "age_s": round(time.monotonic() - state["built_at"], 1) if state["built_at"] else None,
+            **(index.stats() if index else {})}
+
+
+events.on_change(_on_change)
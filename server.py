@@ -1,90 +1,388 @@
 import os
+import re
+import time
 import asyncio
+import threading
+import functools
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_http_headers
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import Response, JSONResponse, FileResponse
 
-# Import tools
-import tools.auth as auth_tools
-import tools.campaigns as campaigns_tools
-import tools.tasks as tasks_tools
-import tools.assets as assets_tools
-import tools.activity as activity_tools
-import tools.dashboard as dashboard_tools
-import tools.notifications as notifications_tools
-import tools.reports as reports_tools
-import tools.automations as automations_tools
-import tools.system as system_tools
-import tools.ai_engine as ai_engine_tools
-import scheduler
+import tool_manifest
+import profiling
+import tracing
+import session_tokens
+import tenancy
+import events
+import encoding
+from compression import CompressionMiddleware
+
+# rule_engine imports the notification and report tools and reads every
+# tenant's automations, so it loads on the first write that can fire an event
+# rather than on every cold start. The writer's own event is still delivered.
+_automations_loaded = False
+_automation_lock = threading.Lock()
+
+
+def _enable_automations(table, op, rows, changes, filters):
+    global _automations_loaded
+    if _automations_loaded or table not in events.ENTITIES:
+        return
+    with _automation_lock:
+        if not _automations_loaded:
+            import rule_engine
+            rule_engine.enable_event_triggers()
+            _automations_loaded = True
+
+
+@contextlib.asynccontextmanager
+async def lifespan(server):
+    """
+    Per-process startup/shutdown. Hooks automations up to change events (loaded on
+    the first write), starts the health probes, and every worker competes for scheduler leadership; only
+    the winner runs the jobs.
+    """
+    if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1 and os.environ.get("MOCK_MODE") == "true" \
+            and not os.environ.get("SQLITE_PATH"):
+        print("⚠️ Multiple workers in mock mode: each worker has its own MOCK_DB. Set SQLITE_PATH to share state.")
+    if os.getenv("AUTOMATION_EVENTS", "true").lower() == "true":
+        events.on_change(_enable_automations)
+    if os.getenv("SEARCH_WARM", "false").lower() == "true":
+        import search_index
+        search_index.warm()
+    import health
+    health.start()
+    if os.getenv("ENABLE_SCHEDULER", "false").lower() != "true":
+        try:
+            yield {}
+        finally:
+            health.stop()
+        return
+    import scheduler
+    scheduler.start_scheduler()
+    try:
+        yield {}
+    finally:
+        scheduler.stop_scheduler()
+        health.stop()
 
 # Initialize FastMCP
-mcp = FastMCP("Marketing Hub MCP")
+mcp = FastMCP("Marketing Hub MCP", lifespan=lifespan)
+
+
+# Registered tools by name, for the batch tool.
+TOOLS = {}
+
+
+def register(fn):
+    """
+    Register a tool behind the dispatch hooks (session token, tenant and its quotas,
+    tracing, profiling).
+    The wrapper keeps the tool's name, docstring and signature, and encodes
+    dict and list results itself (see encoding.py).
+    """
+    TOOLS[fn.__name__] = fn
+    output_schema = None
+
+    @functools.wraps(fn)
+    def dispatch(*args, **kwargs):
+        headers = get_http_headers(include={"authorization", session_tokens.ISSUER_HEADER, tenancy.HEADER,
+                                            tenancy.KEY_HEADER})
+        with session_tokens.bearer(headers.get("authorization"), headers.get(session_tokens.ISSUER_HEADER)):
+            tenant = tenancy.resolve(headers.get(tenancy.HEADER), session_tokens.current(),
+                                     headers.get(tenancy.KEY_HEADER))
+            with tenancy.admit(tenant), tracing.trace(f"tool.{fn.__name__}", tool=fn.__name__):
+                result = profiling.profile_call(fn.__name__, fn, args, kwargs)
+        return encoding.tool_result(result, output_schema)
+
+    output_schema = mcp.add_tool(dispatch).output_schema
+    return fn
 
 # --- Tool Registration ---
+# Tools are registered from tool_manifest.json; each tool module (and the
+# providers it imports) loads on the tool's first call. After adding or
+# changing a tool, regenerate the manifest: python tool_manifest.py
+
+for entry in tool_manifest.load_manifest():
+    register(tool_manifest.lazy_tool(entry))
+
+
+# --- Batch tool ---
+
+BATCH_MAX_STEPS = int(os.environ.get("BATCH_MAX_STEPS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+_REF = re.compile(r"^\$([A-Za-z_][\w-]*)((?:\.[\w-]+)*)$")
+
+
+def _refs(value) -> set:
+    """
+    Step ids referenced by "$id..." strings anywhere in value.
+    """
+    if isinstance(value, str):
+        match = _REF.match(value)
+        return {match.group(1)} - {"item"} if match else set()
+    if isinstance(value, dict):
+        return set().union(*map(_refs, value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*map(_refs, value)) if value else set()
+    return set()
+
+
+def _substitute(value, results: dict, item=None):
+    if isinstance(value, str):
+        match = _REF.match(value)
+        if not match:
+            return value
+        found = item if match.group(1) == "item" else results[match.group(1)]
+        for part in match.group(2).split(".")[1:]:
+            found = found[int(part)] if isinstance(found, list) else found[part]
+        return found
+    if isinstance(value, dict):
+        return {k: _substitute(v, results, item) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, results, item) for v in value]
+    return value
+
+
+def _run_step(name: str, step_id: str, args: dict) -> tuple[str, object, float]:
+    started = time.perf_counter()
+    try:
+        # Each call counts against the tenant's quotas, as if it came on its own
+        with tenancy.admit(tenancy.current()), tracing.span("batch.step", tool=name, step=step_id):
+            result = profiling.profile_call(name, TOOLS[name], (), args)
+        status = "success"
+    except Exception as e:
+        status, result = "error", str(e)
+    return status, result, (time.perf_counter() - started) * 1000
+
+
+def batch(steps: list[dict], max_concurrency: Optional[int] = None) -> dict:
+    """
+    Run several tool calls in one request. Each step is {"id", "tool", "args"}.
+    An argument "$<id>" or "$<id>.<key or index>..." is replaced by an earlier
+    step's result. A step with "for_each": "$<id>..." runs once per item of that
+    list, with "$item" / "$item.<key>" in its args, and returns a list. Steps run
+    concurrently once the steps they reference have finished; each step's
+    result comes back with its status and timing. A batch makes at most
+    BATCH_MAX_STEPS tool calls, counting every for_each item.
+    """
+    import supabase_client
+    from tools.auth import user_scope
 
-# Auth
-mcp.add_tool(auth_tools.get_user_by_email)
-mcp.add_tool(auth_tools.get_user_role)
-mcp.add_tool(auth_tools.list_team_members)
-
-# Campaigns
-mcp.add_tool(campaigns_tools.list_campaigns)
-mcp.add_tool(campaigns_tools.create_campaign)
-mcp.add_tool(campaigns_tools.update_campaign_status)
-
-# Tasks
-mcp.add_tool(tasks_tools.list_tasks)
-mcp.add_tool(tasks_tools.create_task)
-mcp.add_tool(tasks_tools.update_task_status)
-
-# Assets
-mcp.add_tool(assets_tools.list_assets)
-mcp.add_tool(assets_tools.upload_asset)
-mcp.add_tool(assets_tools.review_asset)
-
-# Activity
-mcp.add_tool(activity_tools.log_activity)
-mcp.add_tool(activity_tools.list_activity)
-
-# Dashboard
-mcp.add_tool(dashboard_tools.marketing_snapshot)
-mcp.add_tool(dashboard_tools.channel_performance)
-
-# Notifications
-mcp.add_tool(notifications_tools.send_whatsapp_message)
-mcp.add_tool(notifications_tools.notify_campaign_status_change)
-mcp.add_tool(notifications_tools.notify_overdue_tasks)
-mcp.add_tool(notifications_tools.send_email_report)
-mcp.add_tool(notifications_tools.send_campaign_update)
-mcp.add_tool(notifications_tools.send_email)
-
-# Reports
-mcp.add_tool(reports_tools.generate_dashboard_summary)
-mcp.add_tool(reports_tools.send_periodic_marketing_report)
-
-# Automations
-mcp.add_tool(automations_tools.list_automations)
-mcp.add_tool(automations_tools.create_automation)
-mcp.add_tool(automations_tools.toggle_automation)
-mcp.add_tool(automations_tools.run_automation_trigger)
-
-# System
-mcp.add_tool(system_tools.check_backend_config)
-
-# AI Engine
-mcp.add_tool(ai_engine_tools.ai_campaign_review)
-mcp.add_tool(ai_engine_tools.ai_generate_ideas)
-mcp.add_tool(ai_engine_tools.ai_generate_copy)
-mcp.add_tool(ai_engine_tools.ai_marketing_calendar)
-mcp.add_tool(ai_engine_tools.ai_dev_assistant)
+    if len(steps) > BATCH_MAX_STEPS:
+        return {"status": "error", "message": f"At most {BATCH_MAX_STEPS} steps per batch"}
+    plan = {}
+    for i, step in enumerate(steps):
+        step_id = str(step.get("id") or f"step{i + 1}")
+        name = step.get("tool")
+        if step_id in plan or step_id == "item":
+            return {"status": "error", "message": f"Duplicate or reserved step id '{step_id}'"}
+        if name not in TOOLS or name == "batch":
+            return {"status": "error", "message": f"Step '{step_id}': unknown tool '{name}'"}
+        deps = _refs(step.get("args") or {}) | _refs(step.get("for_each"))
+        if not deps <= plan.keys():
+            return {"status": "error", "message": f"Step '{step_id}' references {sorted(deps - plan.keys())}, "
+                                                  f"which are not earlier steps"}
+        plan[step_id] = {"tool": name, "args": step.get("args") or {}, "for_each": step.get("for_each"), "deps": deps}
+
+    started = time.perf_counter()
+    results, outcomes = {}, {}
+    pending = dict(plan)
+    running = {}  # future -> (step id, item index)
+    units = {}    # step id -> [outcome per item]
+    submitted = 0
+    workers = max_concurrency or BATCH_CONCURRENCY
+    limit = tenancy.concurrency_limit(tenancy.current())
+    if limit:
+        workers = min(workers, max(limit - 1, 1))  # The batch call itself holds one of the tenant's slots
+    with supabase_client.session(), user_scope(), \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        while pending or running:
+            for step_id, step in list(pending.items()):
+                if any(dep not in outcomes for dep in step["deps"]):
+                    continue
+                del pending[step_id]
+                failed = [dep for dep in step["deps"] if outcomes[dep]["status"] != "success"]
+                if failed:
+                    outcomes[step_id] = {"status": "skipped", "message": f"Depends on failed step(s) {failed}"}
+                    continue
+                try:
+                    if step["for_each"] is not None:
+                        items = _substitute(step["for_each"], results)
+                        if not isinstance(items, list):
+                            raise TypeError("for_each must reference a list")
+                        calls = [_substitute(step["args"], results, item) for item in items]
+                    else:
+                        calls = [_substitute(step["args"], results)]
+                except (KeyError, IndexError, ValueError, TypeError) as e:
+                    outcomes[step_id] = {"status": "error", "message": f"Bad reference: {e}"}
+                    continue
+                if submitted + len(calls) > BATCH_MAX_STEPS:
+                    outcomes[step_id] = {"status": "error", "message": f"Step '{step_id}' would make {len(calls)} "
+                                         f"calls; at most {BATCH_MAX_STEPS} per batch, {submitted} made already"}
+                    continue
+                submitted += len(calls)
+                units[step_id] = [None] * len(calls)
+                for index, args in enumerate(calls):
+                    future = pool.submit(contextvars.copy_context().run, _run_step, step["tool"], step_id, args)
+                    running[future] = (step_id, index)
+                if not calls:
+                    results[step_id] = []
+                    outcomes[step_id] = {"status": "success", "result": [], "timing_ms": 0.0}
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_id, index = running.pop(future)
+                units[step_id][index] = future.result()
+                if any(unit is None for unit in units[step_id]):
+                    continue
+                step_units = units.pop(step_id)
+                errors = [result for status, result, _ in step_units if status != "success"]
+                values = [result for _, result, _ in step_units]
+                timing = round(max(ms for _, _, ms in step_units), 3)
+                if errors:
+                    outcomes[step_id] = {"status": "error", "message": errors[0], "timing_ms": timing}
+                else:
+                    results[step_id] = values if plan[step_id]["for_each"] is not None else values[0]
+                    outcomes[step_id] = {"status": "success", "result": results[step_id], "timing_ms": timing}
+
+    ordered = [{"id": step_id, "tool": plan[step_id]["tool"], **outcomes[step_id]} for step_id in plan]
+    return {
+        "status": "success" if all(o["status"] == "success" for o in ordered) else "partial",
+        "steps": ordered,
+        "timing_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+register(batch)
+
+
+# --- Asset file bytes over HTTP ---
+# start_asset_upload returns an upload_url. PUT streams the request body into the
+# upload in constant memory, starting at the Upload-Offset header (bytes already
+# sent; HEAD returns it). A dropped PUT keeps what arrived, so the client resumes.
+# Uploads belong to a tenant: send the same Authorization (or X-Tenant-ID and
+# X-Tenant-Key) headers as for tool calls.
+
+@mcp.custom_route("/uploads/{upload_id}", methods=["PUT", "HEAD"])
+async def upload_bytes(request: Request) -> Response:
+    upload_id = request.path_params["upload_id"]
+    try:
+        with session_tokens.bearer(request.headers.get("authorization")):
+            tenant = tenancy.resolve(request.headers.get(tenancy.HEADER), session_tokens.current(),
+                                     request.headers.get(tenancy.KEY_HEADER))
+        with tenancy.use(tenant):
+            return await _upload_bytes(request, upload_id)
+    except session_tokens.TokenError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=401)
+    except tenancy.TenantError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=403)
+
+
+async def _upload_bytes(request: Request, upload_id: str) -> Response:
+    import uploads
+    try:
+        if request.method == "HEAD":
+            uploads.get(upload_id)
+            return Response(status_code=204, headers={"Upload-Offset": str(uploads.received(upload_id))})
+        offset = int(request.headers.get("Upload-Offset", "0"))
+        writer = await asyncio.to_thread(uploads.writer, upload_id, offset)
+        try:
+            async for chunk in request.stream():
+                await asyncio.to_thread(writer.write, chunk)
+        finally:
+            writer.close()
+        return JSONResponse({"status": "ok", "received": writer.received},
+                            headers={"Upload-Offset": str(writer.received)})
+    except ValueError as e:
+        received = getattr(e, "received", None)
+        return JSONResponse({"status": "error", "message": str(e), "received": received},
+                            status_code=404 if isinstance(e, uploads.UploadNotFound) else 409,
+                            headers={"Upload-Offset": str(received)} if received is not None else None)
+
+
+# Blobs are served to the tenants whose assets (or archived assets) use them as
+# file or thumbnail; send the same headers as for tool calls.
+
+def _blob_referenced(store, key: str) -> bool:
+    from supabase_client import fetch_rows
+    from archive import fetch_archived
+    return bool(fetch_rows("assets", {"sha256": key}, None, 1)
+                or fetch_rows("assets", {"thumbnail_url": store.url(key)}, None, 1)
+                or fetch_archived("assets", {"sha256": key})
+                or fetch_archived("assets", {"thumbnail_url": store.url(key)}))
+
+
+@mcp.custom_route("/blobs/{key}", methods=["GET"])
+async def get_blob(request: Request) -> Response:
+    import blob_store
+    key = request.path_params["key"]
+    store = blob_store.get_store()
+    if not blob_store.valid_key(key) or not isinstance(store, blob_store.LocalBlobStore) or not store.exists(key):
+        return JSONResponse({"status": "error", "message": "Not found"}, status_code=404)
+    try:
+        with session_tokens.bearer(request.headers.get("authorization")):
+            tenant = tenancy.resolve(request.headers.get(tenancy.HEADER), session_tokens.current(),
+                                     request.headers.get(tenancy.KEY_HEADER))
+    except session_tokens.TokenError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=401)
+    except tenancy.TenantError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=403)
+    with tenancy.use(tenant):
+        referenced = await asyncio.to_thread(_blob_referenced, store, key)
+    if not referenced:
+        return JSONResponse({"status": "error", "message": "Not found"}, status_code=404)
+    cache = "private" if tenancy.MULTI_TENANT else "public"
+    return FileResponse(store.path(key), headers={"Cache-Control": f"{cache}, max-age=31536000, immutable"})
+
+
+# --- Health ---
+# Served from the cached results of the background probes (see health.py), so
+# load balancer checks cost no calls to the dependencies. /healthz is liveness
+# and always 200; /readyz is 503 while a required dependency is down.
+
+@mcp.custom_route("/healthz", methods=["GET"])
+async def healthz(request: Request) -> Response:
+    import health
+    return JSONResponse(health.snapshot(), headers={"Cache-Control": "no-store"})
+
+
+@mcp.custom_route("/readyz", methods=["GET"])
+async def readyz(request: Request) -> Response:
+    import health
+    snapshot = health.snapshot()
+    ready, reasons = health.readiness(snapshot)
+    return JSONResponse({"ready": ready, "status": snapshot["status"], "reasons": reasons},
+                        status_code=200 if ready else 503, headers={"Cache-Control": "no-store"})
+
+
+# ASGI app for uvicorn/gunicorn, e.g. `uvicorn server:app --workers 4`.
+# Stateless HTTP (the default) lets any worker serve any request, since MCP
+# sessions would otherwise be pinned to the process that created them.
+# Responses are plain JSON rather than one-event streams by default, so
+# large results can be compressed (HTTP_COMPRESSION, see compression.py).
+HTTP_OPTIONS = {
+    "stateless_http": os.environ.get("MCP_STATELESS_HTTP", "true").lower() == "true",
+    "json_response": os.environ.get("MCP_JSON_RESPONSE", "true").lower() == "true",
+    "middleware": [Middleware(CompressionMiddleware)] if os.environ.get("HTTP_COMPRESSION", "true").lower() == "true"
+    else None,
+}
+app = mcp.http_app(**HTTP_OPTIONS)
 
 
 if __name__ == "__main__":
     print("Starting Marketing Hub Backend with FastMCP")
-    # Start the scheduler in the background
-    scheduler.start_scheduler()
-    
+    # The scheduler is started by the lifespan hook.
+
     # Run user FastMCP on HTTP
     # Host is 0.0.0.0 for Docker/Railway
     # Port is injected by Railway via $PORT, defaulting to 8000
     port = int(os.environ.get("PORT", 8000))
-    mcp.run(transport="http", host="0.0.0.0", port=port)
+    mcp.run(transport="http", host="0.0.0.0", port=port, **HTTP_OPTIONS)
@@ -0,0 +1,260 @@
+"""
+Signed session tokens: the caller's email and role, checked without I/O.
+
+    issue(email, role)   -> (token, claims); the token is valid for AUTH_TOKEN_TTL_SECONDS
+    verify(token)        -> claims {"sub", "role", "iat", "exp", "jti"} (+ "tenant", "asserted"); raises TokenError
+    revoke(claims)       -> that token stops verifying
+    revoke_email(email)  -> every token issued to email so far stops verifying
+
+A token is "mh1.<key id>.<claims>.<signature>": base64url JSON claims signed
+with HMAC-SHA256. Tool calls carrying "Authorization: Bearer <token>" are
+authorized from the claims alone (see server.register and tools.auth).
+
+Keys: AUTH_SIGNING_KEYS is a comma-separated list of <key id>:<secret>. The
+first key signs new tokens, and any listed key verifies. To rotate, put a new
+key first; remove the old one once its last tokens have expired, i.e.
+AUTH_TOKEN_TTL_SECONDS later. Without the variable a single process makes a
+random key, so a token only works on that process; with WEB_CONCURRENCY > 1
+the import fails instead.
+
+Issuing: a call with a session token gets tokens for its own user (admins:
+for anyone). Without one, the caller's email is only asserted, so the token
+is marked "asserted" and is refused for admins and managers, unless the call
+carries AUTH_ISSUER_KEY in the X-Auth-Issuer-Key header: the key of a trusted
+front end that has already signed the user in.
+
+Revocations are rows in the `revoked_tokens` table, held in memory here.
+Each process reloads them in the background every
+AUTH_REVOCATION_REFRESH_SECONDS, so a revocation reaches other processes
+within that time. The process that revoked sees it at once.
+"""
+import os
+import re
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import binascii
+import threading
+import contextlib
+import contextvars
+from datetime import datetime, timezone
+from typing import Optional
+
+AUTH_TOKEN_TTL_SECONDS = int(os.environ.get("AUTH_TOKEN_TTL_SECONDS", "900"))
+AUTH_REVOCATION_REFRESH_SECONDS = float(os.environ.get("AUTH_REVOCATION_REFRESH_SECONDS", "30"))
+AUTH_ISSUER_KEY = os.environ.get("AUTH_ISSUER_KEY", "")
+
+ISSUER_HEADER = "x-auth-issuer-key"
+
+PREFIX = "mh1"
+TABLE = "revoked_tokens"
+_KEY_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class TokenError(ValueError):
+    pass
+
+
+def _load_keys() -> dict:
+    keys = {}
+    for entry in filter(None, (e.strip() for e in os.environ.get("AUTH_SIGNING_KEYS", "").split(","))):
+        kid, _, secret = entry.partition(":")
+        if not _KEY_ID.match(kid) or not secret:
+            raise ValueError("AUTH_SIGNING_KEYS entries must be <key id>:<secret>, key ids [A-Za-z0-9_-]")
+        keys[kid] = secret.encode()
+    if not keys:
+        # A random key only verifies on this process; other workers would reject its tokens
+        workers = int(os.environ.get("WEB_CONCURRENCY") or "1")
+        if workers > 1:
+            raise RuntimeError(f"AUTH_SIGNING_KEYS must be set to run {workers} workers (WEB_CONCURRENCY): "
+                               "a token issued by one worker would not verify on the others")
+        print("⚠️ AUTH_SIGNING_KEYS not set -> session tokens use a per-process key")
+        keys["local"] = secrets.token_bytes(32)
+    return keys
+
+
+KEYS = _load_keys()
+SIGNING_KEY_ID = next(iter(KEYS))
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _signature(kid: str, body: str) -> str:
+    return _b64(hmac.new(KEYS[kid], f"{PREFIX}.{kid}.{body}".encode(), hashlib.sha256).digest())
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def issue(email: str, role: str, tenant: Optional[str] = None, asserted: bool = False) -> tuple[str, dict]:
+    now = time.time()
+    claims = {"sub": email, "role": role, "iat": round(now, 3), "exp": int(now + AUTH_TOKEN_TTL_SECONDS),
+              "jti": secrets.token_hex(12)}
+    if tenant is not None:
+        claims["tenant"] = tenant
+    if asserted:
+        claims["asserted"] = True
+    body = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{PREFIX}.{SIGNING_KEY_ID}.{body}.{_signature(SIGNING_KEY_ID, body)}", claims
+
+
+def decode(token: str) -> dict:
+    """
+    Claims of a token signed with one of our keys, expired or revoked or not.
+    """
+    parts = (token or "").split(".")
+    if len(parts) != 4 or parts[0] != PREFIX:
+        raise TokenError("Malformed session token")
+    _, kid, body, signature = parts
+    if kid not in KEYS:
+        raise TokenError("Session token was signed with an unknown key")
+    if not hmac.compare_digest(_signature(kid, body), signature):
+        raise TokenError("Session token signature does not match")
+    try:
+        return json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+    except (binascii.Error, ValueError):
+        raise TokenError("Malformed session token")
+
+
+def verify(token: str) -> dict:
+    claims = decode(token)
+    if claims["exp"] <= time.time():
+        raise TokenError("Session token has expired")
+    if is_revoked(claims):
+        raise TokenError("Session token has been revoked")
+    return claims
+
+
+# --- Revocation ---
+
+_revoked_ids = {}     # jti -> exp
+_revoked_before = {}  # email -> tokens issued at or before this time are revoked
+_state = {"loaded_at": None, "loading": False}
+_load_lock = threading.Lock()
+
+
+def is_revoked(claims: dict) -> bool:
+    if _state["loaded_at"] is None:
+        load()  # Once per process, so a new process does not accept revoked tokens
+    elif time.monotonic() - _state["loaded_at"] > AUTH_REVOCATION_REFRESH_SECONDS:
+        _load_in_background()
+    return claims["jti"] in _revoked_ids or claims["iat"] <= _revoked_before.get(claims["sub"], -1)
+
+
+def _add(row: dict):
+    if row.get("issued_before") is not None:
+        email = row["email"]
+        _revoked_before[email] = max(float(row["issued_before"]), _revoked_before.get(email, -1))
+    else:
+        _revoked_ids[row["id"]] = datetime.fromisoformat(row["expires_at"]).timestamp()
+
+
+def load():
+    """
+    Merge unexpired revocations from the table and drop expired ones from memory.
+    """
+    import supabase_client as db
+    with _load_lock:
+        now = time.time()
+        for row in db.fetch_rows(TABLE, {"expires_at__gt": _iso(now)}):
+            _add(row)
+        for jti in [jti for jti, exp in _revoked_ids.items() if exp <= now]:
+            del _revoked_ids[jti]
+        for email in [email for email, before in _revoked_before.items() if before + AUTH_TOKEN_TTL_SECONDS <= now]:
+            del _revoked_before[email]
+        _state["loaded_at"] = time.monotonic()
+
+
+def _load_in_background():
+    if _state["loading"]:
+        return
+    _state["loading"] = True
+
+    def run():
+        try:
+            load()
+        except Exception as e:
+            print(f"⚠️ Could not reload revoked session tokens: {e}")
+        finally:
+            _state["loading"] = False
+    threading.Thread(target=run, name="revoked-tokens", daemon=True).start()
+
+
+def _save(row: dict):
+    import supabase_client as db
+    _add(row)
+    db.upsert_rows(TABLE, [{**row, "revoked_at": _iso(time.time())}])
+
+
+def revoke(claims: dict):
+    _save({"id": claims["jti"], "email": claims["sub"], "issued_before": None, "expires_at": _iso(claims["exp"])})
+
+
+def revoke_email(email: str):
+    now = round(time.time(), 3)
+    _save({"id": f"email:{email}", "email": email, "issued_before": now,
+           "expires_at": _iso(now + AUTH_TOKEN_TTL_SECONDS)})
+
+
+def prune() -> int:
+    """
+    Delete revocations whose tokens have all expired.
+    """
+    import supabase_client as db
+    return db.delete_rows(TABLE, {"expires_at__lt": _iso(time.time())})
+
+
+# --- The calling user ---
+
+_claims = contextvars.ContextVar("session_claims", default=None)
+_issuer = contextvars.ContextVar("trusted_issuer", default=False)
+
+
+def current() -> Optional[dict]:
+    """
+    Claims of the session token on the current tool call, if it carried one.
+    """
+    return _claims.get()
+
+
+def trusted_issuer() -> bool:
+    """
+    Whether the current call carried AUTH_ISSUER_KEY.
+    """
+    return _issuer.get()
+
+
+@contextlib.contextmanager
+def bearer(authorization: Optional[str], issuer_key: Optional[str] = None):
+    """
+    Verify an Authorization header value (and an X-Auth-Issuer-Key value) and
+    make them current inside the block. Without a header, the current claims
+    are left as they are.
+    """
+    resets = []
+    if issuer_key:
+        if not AUTH_ISSUER_KEY or not hmac.compare_digest(issuer_key.encode(), AUTH_ISSUER_KEY.encode()):
+            raise TokenError("Issuer key does not match")
+        resets.append((_issuer, _issuer.set(True)))
+    if authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer":
+            raise TokenError("Authorization must be 'Bearer <session token>'")
+        resets.append((_claims, _claims.set(verify(token.strip()))))
+    try:
+        yield
+    finally:
+        for var, reset in reversed(resets):
+            var.reset(reset)
+
+
+def stats() -> dict:
+    return {"signing_key": SIGNING_KEY_ID, "keys": len(KEYS), "revoked_tokens": len(_revoked_ids),
+            "revoked_emails": len(_revoked_before),
+            "revocations_age_s": round(time.monotonic() - _state["loaded_at"], 1) if _state["loaded_at"] else None}
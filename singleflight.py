@@ -0,0 +1,152 @@
+"""
+Request coalescing ("single flight") for identical concurrent reads.
+
+When several callers ask for the same thing at once (a dashboard opening in
+several agents, a burst of identical list calls), the first caller runs the
+query. The others wait for it and receive the same result, so the backend
+sees one request per distinct query instead of one per caller. Nothing is
+cached: a call that starts after the in-flight one finished runs again.
+
+Writes bump a per-table epoch (supabase_client._publishes calls wrote()),
+and the epoch is part of the key: the table's for table reads, the sum over
+all tables for the tools. A call never joins a flight that started before a
+write this process finished, so a caller always reads its own writes.
+
+Applied to the supabase_client reads (fetch_rows, count_rows, fetch_page)
+and to the dashboard and report tools. SINGLEFLIGHT=false turns it off.
+Calls made for different tenants (see tenancy.py) never share a flight.
+"""
+import os
+import inspect
+import threading
+import functools
+from typing import Callable, Optional
+
+import tenancy
+
+SINGLEFLIGHT = os.environ.get("SINGLEFLIGHT", "true").lower() == "true"
+
+_lock = threading.Lock()
+_inflight = {}
+_stats = {}
+_epochs = {}  # table -> writes finished in this process
+_epoch = 0    # writes finished to any table
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def _copy(result):
+    # Each caller gets its own container; the rows inside are shared
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+
+def do(name: str, key, fn: Callable):
+    """
+    Run fn(), or if a call with the same key is already running, wait for it
+    and return its result (or raise its exception).
+    """
+    key = (name, key)
+    with _lock:
+        stats = _stats.setdefault(name, {"calls": 0, "executed": 0, "coalesced": 0})
+        stats["calls"] += 1
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+            stats["executed"] += 1
+        else:
+            call.waiters += 1
+            stats["coalesced"] += 1
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return _copy(call.result)
+
+    try:
+        call.result = fn()
+        return call.result if not call.waiters else _copy(call.result)
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _inflight[key]
+        call.done.set()
+
+
+def wrote(table: str):
+    """
+    Record a finished write to table. Calls starting from now on do not join
+    flights that started before it.
+    """
+    global _epoch
+    with _lock:
+        _epochs[table] = _epochs.get(table, 0) + 1
+        _epoch += 1
+
+
+def epoch(table: Optional[str] = None) -> int:
+    return _epoch if table is None else _epochs.get(table, 0)
+
+
+def coalesced(fn: Optional[Callable] = None, *, name: Optional[str] = None,
+              skip: Optional[Callable[..., bool]] = None):
+    """
+    Decorator: coalesce concurrent calls with equal arguments and no write in
+    between (to their "table" argument, or to any table). skip(*args, **kwargs)
+    returning True runs the call directly.
+    """
+    def decorator(fn):
+        label = name or fn.__name__
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not SINGLEFLIGHT or (skip is not None and skip(*args, **kwargs)):
+                return fn(*args, **kwargs)
+            # Bind so that positional, keyword and defaulted spellings share a key
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            try:
+                key = (tenancy.partition(), epoch(bound.arguments.get("table")), _freeze(bound.arguments))
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            return do(label, key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator(fn) if fn is not None else decorator
+
+
+def stats() -> dict:
+    """
+    Per operation: calls, backend executions, and calls served by another caller's flight.
+    """
+    with _lock:
+        result = {name: dict(s) for name, s in _stats.items()}
+        in_flight = len(_inflight)
+    totals = {k: sum(s[k] for s in result.values()) for k in ("calls", "executed", "coalesced")}
+    return {"enabled": SINGLEFLIGHT, "in_flight": in_flight, "totals": totals, "by_operation": result}
@@ -0,0 +1,133 @@
+-- Monthly partitioning for activity_log (Postgres / Supabase).
+-- The app reads and writes the parent table; queries bounded on created_at
+-- only touch the matching partitions. activity_store.run_maintenance() calls
+-- create_activity_partitions() and drop_activity_partitions_before() hourly.
+--
+-- An existing plain activity_log table is converted in place: it is renamed
+-- to activity_log_default and attached to a new partitioned parent as its
+-- default partition, so no rows are copied. create_activity_partitions() then
+-- moves the rows of each month it creates out of the default partition.
+-- If change_versions.sql or tenants.sql were applied before, re-run them
+-- afterwards so the parent gets their trigger and indexes.
+
+do $$
+declare
+    idx record;
+    seq text;
+begin
+    if to_regclass('activity_log') is null then
+        create table activity_log (
+            id bigint generated by default as identity,
+            actor_email text,
+            action text,
+            entity_type text,
+            entity_id text,
+            metadata jsonb default '{}'::jsonb,
+            created_at timestamptz not null default now(),
+            primary key (id, created_at)
+        ) partition by range (created_at);
+    elsif not exists (select 1 from pg_partitioned_table where partrelid = 'activity_log'::regclass) then
+        alter table activity_log rename to activity_log_default;
+        -- Free the index names (activity_log_pkey, ...) for the parent's indexes
+        for idx in select indexname from pg_indexes
+                   where schemaname = current_schema() and tablename = 'activity_log_default'
+                     and indexname like 'activity\_log\_%' and indexname not like 'activity\_log\_default\_%' loop
+            execute format('alter index %I rename to %I', idx.indexname,
+                           'activity_log_default_' || substr(idx.indexname, 14));
+        end loop;
+        -- Row triggers are re-created on the parent (change_versions.sql) and cloned to partitions
+        drop trigger if exists activity_log_version on activity_log_default;
+        update activity_log_default set created_at = now() where created_at is null;
+        alter table activity_log_default alter column created_at set not null;
+        execute 'create table activity_log (like activity_log_default including defaults including identity)
+                 partition by range (created_at)';
+        alter table activity_log add primary key (id, created_at);
+        -- A copied identity starts again at 1; continue after the existing ids
+        seq := pg_get_serial_sequence('activity_log', 'id');
+        if seq is not null then
+            execute format('select setval(%L, coalesce((select max(id) from activity_log_default), 0) + 1, false)', seq);
+            alter table activity_log_default alter column id drop identity if exists;
+        end if;
+        alter table activity_log attach partition activity_log_default default;
+        if to_regproc('stamp_row_version') is not null then
+            create trigger activity_log_version before insert or update on activity_log
+                for each row execute function stamp_row_version();
+        end if;
+    end if;
+    if not exists (select 1 from pg_inherits i join pg_class c on c.oid = i.inhrelid
+                   where i.inhparent = 'activity_log'::regclass and c.relpartbound is not null
+                     and pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT') then
+        create table activity_log_default partition of activity_log default;
+    end if;
+end $$;
+
+create index if not exists activity_log_created_at_idx on activity_log (created_at desc);
+create index if not exists activity_log_actor_idx on activity_log (actor_email, created_at desc);
+create index if not exists activity_log_entity_idx on activity_log (entity_type, entity_id);
+
+-- Create partitions for the current month and the next `months_ahead` months.
+-- Rows of that month already in the default partition are moved into the new
+-- one first; Postgres refuses to attach a partition whose rows the default holds.
+create or replace function create_activity_partitions(months_ahead int default 2)
+returns void language plpgsql as $$
+declare
+    month_start date;
+    month_end date;
+    part text;
+    default_part regclass;
+begin
+    select i.inhrelid::regclass into default_part
+    from pg_inherits i join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'activity_log'::regclass and pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT';
+    for i in 0..months_ahead loop
+        month_start := (date_trunc('month', now()) + make_interval(months => i))::date;
+        month_end := (month_start + interval '1 month')::date;
+        part := 'activity_log_' || to_char(month_start, 'YYYY_MM');
+        continue when to_regclass(part) is not null;
+        execute format('create table %I (like activity_log including defaults including constraints)', part);
+        if default_part is not null then
+            execute format('with moved as (delete from %s where created_at >= %L and created_at < %L returning *) '
+                           'insert into %I select * from moved', default_part, month_start, month_end, part);
+        end if;
+        execute format('alter table activity_log attach partition %I for values from (%L) to (%L)',
+                       part, month_start, month_end);
+    end loop;
+end $$;
+
+-- Drop partitions that end on or before `cutoff` (retention).
+create or replace function drop_activity_partitions_before(cutoff date)
+returns void language plpgsql as $$
+declare
+    part record;
+begin
+    for part in
+        select c.relname from pg_inherits i
+        join pg_class c on c.oid = i.inhrelid
+        join pg_class p on p.oid = i.inhparent
+        where p.relname = 'activity_log' and c.relname ~ '^activity_log_\d{4}_\d{2}$'
+    loop
+        if (to_date(substr(part.relname, 14), 'YYYY_MM') + interval '1 month')::date <= cutoff then
+            execute format('drop table %I', part.relname);
+        end if;
+    end loop;
+end $$;
+
+select create_activity_partitions(2);
+
+-- Pre-aggregated counts (see activity_store.py).
+create table if not exists activity_rollups (
+    id text primary key,          -- "<grain>|<bucket>|<actor>|<entity_type>|<action>"
+    grain text not null,          -- "hour" or "day"
+    bucket text not null,         -- "2025-01-01T10" or "2025-01-01"
+    actor_email text,
+    entity_type text,
+    action text,
+    count integer not null
+);
+create index if not exists activity_rollups_bucket_idx on activity_rollups (grain, bucket);
+
+create table if not exists activity_rollup_state (
+    id text primary key,
+    watermark date,
+    updated_at timestamptz
+);
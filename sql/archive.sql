@@ -0,0 +1,49 @@
+-- Campaign archival in table mode (see archive.py; ARCHIVE_MODE=table).
+-- Apply after the other migrations (change_versions.sql, asset_uploads.sql,
+-- asset_processing.sql, tenants.sql), and re-apply after adding columns to a
+-- hot table: each archive table gets every column of its hot table, plus
+-- archived_at and archive_chunk_id.
+
+create table if not exists archive_checkpoints (
+    id text primary key,               -- "campaigns" ("<tenant>:campaigns" with tenancy on)
+    pending jsonb,                     -- {"chunk_id", "campaign_ids"} while a chunk is in flight
+    totals jsonb not null default '{}'::jsonb,
+    last_chunk_id text,
+    updated_at timestamptz
+);
+
+do $$
+declare
+    t text;
+    col record;
+begin
+    foreach t in array array['campaigns', 'tasks', 'assets', 'activity_log'] loop
+        -- Plain tables (no identity, no partitioning): ids are copied from the hot rows
+        execute format('create table if not exists %I (like %I including defaults)', t || '_archive', t);
+        for col in
+            select c.attname, format_type(c.atttypid, c.atttypmod) as type
+            from pg_attribute c
+            where c.attrelid = t::regclass and c.attnum > 0 and not c.attisdropped
+              and not exists (select 1 from pg_attribute a
+                              where a.attrelid = (t || '_archive')::regclass and a.attname = c.attname
+                                and not a.attisdropped)
+        loop
+            execute format('alter table %I add column %I %s', t || '_archive', col.attname, col.type);
+        end loop;
+        execute format('alter table %I add column if not exists archived_at timestamptz not null default now()',
+                       t || '_archive');
+        execute format('alter table %I add column if not exists archive_chunk_id text', t || '_archive');
+        if not exists (select 1 from pg_index where indrelid = (t || '_archive')::regclass and indisprimary) then
+            execute format('alter table %I add primary key (id)', t || '_archive');
+        end if;
+    end loop;
+end $$;
+
+-- Filters of the list tools' include_archived reads
+create index if not exists campaigns_archive_status_idx on campaigns_archive (status);
+create index if not exists tasks_archive_assignee_idx on tasks_archive (assignee, status);
+create index if not exists tasks_archive_campaign_idx on tasks_archive (campaign_id);
+create index if not exists assets_archive_status_idx on assets_archive (status);
+create index if not exists assets_archive_campaign_idx on assets_archive (related_campaign_id);
+create index if not exists activity_log_archive_entity_idx on activity_log_archive (entity_type, entity_id);
+create index if not exists activity_log_archive_created_at_idx on activity_log_archive (created_at desc);
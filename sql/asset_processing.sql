@@ -0,0 +1,19 @@
+-- Background asset processing (see asset_processing.py). Workers write file
+-- metadata and a thumbnail URL to each asset; results are cached per content
+-- hash in `blob_metadata` so identical files are processed once.
+
+create table if not exists blob_metadata (
+    id text primary key,               -- SHA-256 of the file
+    metadata jsonb,
+    thumbnail_url text,
+    created_at timestamptz not null default now()
+);
+
+alter table assets add column if not exists processing_status text;  -- queued, deferred, done, failed, skipped
+alter table assets add column if not exists metadata jsonb;
+alter table assets add column if not exists thumbnail_url text;
+alter table assets add column if not exists processed_at timestamptz;
+
+create index if not exists assets_thumbnail_url_idx on assets (thumbnail_url) where thumbnail_url is not null;
+create index if not exists assets_processing_status_idx on assets (processing_status, created_at)
+    where processing_status in ('queued', 'deferred');
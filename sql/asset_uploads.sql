@@ -0,0 +1,36 @@
+-- Chunked asset uploads with content-hash deduplication (see uploads.py).
+-- Upload sessions live in `uploads`; the bytes themselves go to the blob
+-- store (BLOB_STORE), keyed by SHA-256. Assets created from an upload carry
+-- the hash and size of their file.
+
+create table if not exists uploads (
+    id text primary key,               -- random hex token, also the upload URL
+    requester_email text not null,
+    file_name text,
+    content_type text,
+    description text,
+    related_campaign_id text,
+    expected_size bigint,
+    expected_sha256 text,
+    status text not null default 'open',  -- open, stored, complete, failed, expired
+    sha256 text,
+    size_bytes bigint,
+    deduplicated boolean,
+    asset_id text,
+    error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz
+);
+
+alter table uploads add column if not exists size_bytes bigint;
+alter table uploads add column if not exists deduplicated boolean;
+
+create index if not exists uploads_status_created_idx on uploads (status, created_at);
+
+alter table assets add column if not exists sha256 text;
+alter table assets add column if not exists size_bytes bigint;
+alter table assets add column if not exists file_name text;
+alter table assets add column if not exists content_type text;
+
+-- Dedup and /blobs/<sha256> look up the caller's assets by hash
+create index if not exists assets_sha256_idx on assets (sha256);
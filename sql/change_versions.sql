@@ -0,0 +1,104 @@
+-- Row versions and tombstones for delta sync (see delta.py).
+-- Every insert or update of a versioned table takes the next value of one
+-- shared sequence as its `version` and sets updated_at (activity_log is
+-- append-only and keeps created_at). The app writes tombstones for deleted
+-- and archived rows; their version comes from the same sequence.
+
+create sequence if not exists row_version_seq;
+
+create or replace function stamp_row_version()
+returns trigger language plpgsql as $$
+begin
+    new.version := nextval('row_version_seq');
+    if tg_table_name not like 'activity_log%' then
+        new.updated_at := now();
+    end if;
+    return new;
+end $$;
+
+create table if not exists tombstones (
+    id text primary key,               -- "<table>:<row id>"
+    table_name text not null,
+    row_id text not null,
+    reason text not null,              -- "deleted" or "archived"
+    deleted_at timestamptz not null default now(),
+    version bigint
+);
+
+create or replace function stamp_tombstone_version()
+returns trigger language plpgsql as $$
+begin
+    new.version := nextval('row_version_seq');
+    return new;
+end $$;
+
+drop trigger if exists tombstones_version on tombstones;
+create trigger tombstones_version before insert or update on tombstones
+    for each row execute function stamp_tombstone_version();
+create index if not exists tombstones_table_version_idx on tombstones (table_name, version);
+create index if not exists tombstones_deleted_at_idx on tombstones (deleted_at);
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['campaigns', 'tasks', 'assets', 'activity_log'] loop
+        execute format('alter table %I add column if not exists version bigint', t);
+        if t <> 'activity_log' then
+            execute format('alter table %I add column if not exists updated_at timestamptz default now()', t);
+            execute format('create index if not exists %I on %I (updated_at)', t || '_updated_at_idx', t);
+        end if;
+        -- Backfill existing rows so a snapshot's base version covers them
+        execute format('update %I set version = nextval(''row_version_seq'') where version is null', t);
+        execute format('drop trigger if exists %I on %I', t || '_version', t);
+        execute format('create trigger %I before insert or update on %I for each row execute function stamp_row_version()',
+                       t || '_version', t);
+        execute format('create index if not exists %I on %I (version)', t || '_version_idx', t);
+    end loop;
+end $$;
+
+-- Delta sync filters (supabase_client.SYNC_COLUMNS). Tombstones keep the row's
+-- previous values of the columns syncs filter on, and an update changing one
+-- records a "changed" tombstone, so a sync only hears about rows that may have
+-- left its own result. activity_log is append-only and needs no trigger.
+alter table tombstones add column if not exists previous jsonb;
+
+create or replace function record_sync_change()
+returns trigger language plpgsql as $$
+declare
+    old_row jsonb := to_jsonb(old);
+    new_row jsonb := to_jsonb(new);
+    previous jsonb := '{}'::jsonb;
+    changed boolean := false;
+    col text;
+begin
+    foreach col in array tg_argv loop
+        previous := previous || jsonb_build_object(col, old_row -> col);
+        changed := changed or (old_row -> col) is distinct from (new_row -> col);
+    end loop;
+    if not changed then
+        return null;
+    end if;
+    if new_row ? 'tenant_id' then
+        insert into tombstones (id, table_name, row_id, reason, previous, tenant_id)
+        values (tg_table_name || ':' || (old_row ->> 'id') || '@' || (new_row ->> 'version'),
+                tg_table_name, old_row ->> 'id', 'changed', previous, new_row ->> 'tenant_id')
+        on conflict (id) do nothing;
+    else
+        insert into tombstones (id, table_name, row_id, reason, previous)
+        values (tg_table_name || ':' || (old_row ->> 'id') || '@' || (new_row ->> 'version'),
+                tg_table_name, old_row ->> 'id', 'changed', previous)
+        on conflict (id) do nothing;
+    end if;
+    return null;
+end $$;
+
+drop trigger if exists campaigns_sync_change on campaigns;
+create trigger campaigns_sync_change after update on campaigns
+    for each row execute function record_sync_change('status');
+drop trigger if exists tasks_sync_change on tasks;
+create trigger tasks_sync_change after update on tasks
+    for each row execute function record_sync_change('assignee', 'status');
+drop trigger if exists assets_sync_change on assets;
+create trigger assets_sync_change after update on assets
+    for each row execute function record_sync_change('status');
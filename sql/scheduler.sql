@@ -0,0 +1,32 @@
+-- Scheduler coordination (see coordination.py). Apply before ENABLE_SCHEDULER=true
+-- with Supabase: without these tables no process can take the lease and no
+-- scheduled job runs.
+
+-- One row per lease name ("scheduler"). A process takes the lease by moving an
+-- expired expires_at forward, or by inserting the row; the primary key makes
+-- the insert fail for all but one contender.
+create table if not exists scheduler_leases (
+    id text primary key,
+    holder text not null,
+    expires_at timestamptz not null,
+    renewed_at timestamptz
+);
+
+-- One row per job and schedule slot, id "<job>@<slot>". claim_run() inserts it
+-- before running; a duplicate means another process has the slot.
+create table if not exists job_runs (
+    id text primary key,
+    job text not null,
+    slot timestamptz not null,
+    status text not null,              -- "running", "succeeded" or "failed"
+    holder text,
+    attempts integer not null default 1,
+    started_at timestamptz,
+    finished_at timestamptz,
+    rows jsonb not null default '{}'::jsonb,
+    error text,
+    unique (job, slot)
+);
+
+create index if not exists job_runs_job_started_idx on job_runs (job, started_at desc);
+create index if not exists job_runs_status_idx on job_runs (status);
@@ -0,0 +1,14 @@
+-- Revoked session tokens (see session_tokens.py). A row revokes one token
+-- (id = the token's jti) or every token issued to an email before
+-- issued_before (id = 'email:<email>'). Rows are kept until the tokens they
+-- cover have expired; the daily prune_tombstones job deletes them after that.
+
+create table if not exists revoked_tokens (
+    id text primary key,
+    email text not null,
+    issued_before double precision,    -- epoch seconds; null for single-token rows
+    expires_at timestamptz not null,
+    revoked_at timestamptz not null default now()
+);
+
+create index if not exists revoked_tokens_expires_idx on revoked_tokens (expires_at);
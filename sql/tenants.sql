@@ -0,0 +1,44 @@
+-- Tenant scoping (see tenancy.py). Apply before setting MULTI_TENANT=true.
+-- Every tenant table gets a tenant_id; existing rows belong to the 'default'
+-- tenant (change the default below if DEFAULT_TENANT is set to something
+-- else). The app filters every query on tenant_id, so it leads the indexes:
+-- a tenant's scans and pages read only its own rows.
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['users', 'campaigns', 'tasks', 'assets', 'activity_log', 'automations', 'uploads',
+                             'tombstones', 'activity_rollups', 'activity_rollup_state', 'archive_checkpoints',
+                             'campaigns_archive', 'tasks_archive', 'assets_archive', 'activity_log_archive'] loop
+        if to_regclass(t) is not null then
+            execute format('alter table %I add column if not exists tenant_id text not null default ''default''', t);
+            execute format('create index if not exists %I on %I (tenant_id, id)', t || '_tenant_idx', t);
+        end if;
+    end loop;
+end $$;
+
+create index if not exists campaigns_tenant_status_idx on campaigns (tenant_id, status);
+create index if not exists campaigns_tenant_end_date_idx on campaigns (tenant_id, end_date, id);
+create index if not exists tasks_tenant_status_idx on tasks (tenant_id, status);
+create index if not exists tasks_tenant_assignee_idx on tasks (tenant_id, assignee, id);
+create index if not exists tasks_tenant_campaign_idx on tasks (tenant_id, campaign_id);
+create index if not exists assets_tenant_status_idx on assets (tenant_id, status);
+create index if not exists assets_tenant_sha256_idx on assets (tenant_id, sha256);
+create index if not exists assets_tenant_processing_idx on assets (tenant_id, processing_status, created_at);
+create index if not exists automations_tenant_trigger_idx on automations (tenant_id, trigger_type);
+create index if not exists users_tenant_email_idx on users (tenant_id, email);
+create index if not exists activity_log_tenant_created_at_idx on activity_log (tenant_id, created_at desc);
+create index if not exists activity_log_tenant_entity_idx on activity_log (tenant_id, entity_type, entity_id);
+create index if not exists activity_rollups_tenant_bucket_idx on activity_rollups (tenant_id, grain, bucket);
+create index if not exists tombstones_tenant_version_idx on tombstones (tenant_id, table_name, version);
+
+-- Delta sync pages changed rows by version within a tenant
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['campaigns', 'tasks', 'assets', 'activity_log'] loop
+        execute format('create index if not exists %I on %I (tenant_id, version)', t || '_tenant_version_idx', t);
+    end loop;
+end $$;
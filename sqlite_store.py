@@ -0,0 +1,383 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import tenancy
+
+# Local SQLite backend used when SQLITE_PATH is set. Every table has the same
+# shape: a TEXT id plus the full row as JSON, so it accepts whatever columns
+# the tools write, like MOCK_DB and the Supabase tables do. Filter columns
+# the tools use are backed by expression indexes, led by tenant_id on tenant
+# tables when MULTI_TENANT is on (see tenancy.py).
+INDEXED_COLUMNS = {
+    "users": ["email"],
+    "campaigns": ["status", "end_date", "version"],
+    "tasks": ["status", "assignee", "campaign_id", "related_campaign_id", "version"],
+    "assets": ["status", "related_campaign_id", "version", "processing_status", "sha256", "thumbnail_url"],
+    "activity_log": ["actor_email", "entity_type", "entity_id", "created_at", "version"],
+    "automations": ["trigger_type"],
+    "job_runs": ["job", "status"],
+    "tombstones": ["version"],
+    "uploads": ["status"],
+    "revoked_tokens": ["expires_at"],
+}
+
+# Time partitions ("activity_log_2025_01") get their parent table's indexes.
+_PARTITION_SUFFIX = re.compile(r"_\d{4}_\d{2}$")
+
+_local = threading.local()
+_known_tables = set()
+_schema_lock = threading.Lock()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _json_path(column: str) -> str:
+    return "$." + column.replace("'", "''")
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the SQLite file at `path` (default SQLITE_PATH).
+    """
+    path = path or os.environ["SQLITE_PATH"]
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    return conn
+
+
+def ensure_table(conn: sqlite3.Connection, table: str):
+    key = (conn, table)
+    if key in _known_tables:
+        return
+    with _schema_lock:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        columns = INDEXED_COLUMNS.get(table) or INDEXED_COLUMNS.get(_PARTITION_SUFFIX.sub("", table), [])
+        if tenancy.scoped(table):
+            _ensure_tenant_indexes(conn, table, columns)
+        else:
+            for column in columns:
+                # Trailing id serves keyset pagination ordered by (column, id).
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(f'ix_{table}_{column}')} "
+                    f"ON {_quote(table)} (json_extract(data, '{_json_path(column)}'), id)"
+                )
+        _known_tables.add(key)
+
+
+def _ensure_tenant_indexes(conn: sqlite3.Connection, table: str, columns: list[str]):
+    # Every query on a tenant table filters on tenant_id, so it leads each index:
+    # a tenant's reads and pages touch its own rows only.
+    tenant = f"json_extract(data, '{_json_path(tenancy.COLUMN)}')"
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(f'ix_{table}_tenant')} ON {_quote(table)} ({tenant}, id)")
+    for column in columns:
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {_quote(f'ix_{table}_tenant_{column}')} "
+            f"ON {_quote(table)} ({tenant}, json_extract(data, '{_json_path(column)}'), id)"
+        )
+    # Rows written before tenancy was enabled belong to the default tenant
+    conn.execute(f"UPDATE {_quote(table)} SET data = json_set(data, '{_json_path(tenancy.COLUMN)}', ?) "
+                 f"WHERE {tenant} IS NULL", (tenancy.DEFAULT_TENANT,))
+
+
+_SQL_OPS = {"eq": "=", "neq": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+
+
+def _where(filters: Optional[dict]) -> tuple[str, list]:
+    from supabase_client import split_filter
+
+    if not filters:
+        return "", []
+    clauses = []
+    params = []
+    for key, value in filters.items():
+        column, op = split_filter(key)
+        expr = "id" if column == "id" else f"json_extract(data, '{_json_path(column)}')"
+        values = [str(v) if column == "id" else v for v in (value if op == "in" else [value])]
+        if op == "in":
+            clauses.append(f"{expr} IN ({', '.join('?' * len(values))})" if values else "0")
+        elif op == "neq":
+            # Rows without the column count as "not equal", as in the mock store
+            clauses.append(f"({expr} IS NULL OR {expr} != ?)")
+        else:
+            clauses.append(f"{expr} {_SQL_OPS[op]} ?")
+        params.extend(values)
+    return " WHERE " + " AND ".join(clauses), params
+
+
+def _ensure_sequences(conn: sqlite3.Connection):
+    if (conn, "_sequences") not in _known_tables:
+        conn.execute("CREATE TABLE IF NOT EXISTS _sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        _known_tables.add((conn, "_sequences"))
+
+
+class _Versions:
+    """
+    Allocates row versions inside a write transaction, so versions commit in
+    the order they were allocated (writers are serialised by BEGIN IMMEDIATE).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, table: str):
+        from supabase_client import versioned_table
+
+        self.conn = conn
+        self.table = table
+        self.enabled = versioned_table(table) is not None
+        self.last = None
+        self.now = datetime.now(timezone.utc).isoformat()
+
+    def next(self) -> int:
+        if self.last is None:
+            found = self.conn.execute("SELECT value FROM _sequences WHERE name = '__version__'").fetchone()
+            self.last = found[0] if found else 0
+        self.last += 1
+        return self.last
+
+    def stamp(self, row: dict) -> dict:
+        from supabase_client import stamp_version
+
+        return stamp_version(self.table, row, self.next(), self.now) if self.enabled else row
+
+    def save(self):
+        if self.last is not None:
+            self.conn.execute("INSERT OR REPLACE INTO _sequences (name, value) VALUES ('__version__', ?)", (self.last,))
+
+
+def _column_expr(column: str) -> str:
+    return "id" if column == "id" else f"json_extract(data, '{_json_path(column)}')"
+
+
+def fetch_rows(table: str, filters: Optional[dict] = None, order_by: Optional[str] = None,
+               limit: Optional[int] = None) -> list[dict]:
+    conn = connect()
+    ensure_table(conn, table)
+    where, params = _where(filters)
+    order = "rowid"
+    if order_by:
+        expr = _column_expr(order_by.lstrip("-"))
+        # Nulls last either way; SQLite already sorts them last for DESC, which keeps the index usable
+        order = f"{expr} DESC" if order_by.startswith("-") else f"{expr} IS NULL, {expr}"
+    sql = f"SELECT data FROM {_quote(table)}{where} ORDER BY {order}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [json.loads(data) for (data,) in conn.execute(sql, params)]
+
+
+def fetch_page(table: str, filters: Optional[dict], order_by: str, limit: int,
+               after: Optional[tuple] = None) -> list[dict]:
+    conn = connect()
+    ensure_table(conn, table)
+    where, params = _where(filters)
+    expr = "id" if order_by == "id" else f"json_extract(data, '{_json_path(order_by)}')"
+    clauses = [f"{expr} IS NOT NULL"]
+    if after is not None:
+        if order_by == "id":
+            clauses.append("id > ?")
+            params.append(str(after[1]))
+        else:
+            # The plain >= lets SQLite seek the (column, id) index
+            clauses.append(f"{expr} >= ? AND ({expr}, id) > (?, ?)")
+            params.extend([after[0], after[0], str(after[1])])
+    where = (where + " AND " if where else " WHERE ") + " AND ".join(clauses)
+    order = "id" if order_by == "id" else f"{expr}, id"
+    cursor = conn.execute(f"SELECT data FROM {_quote(table)}{where} ORDER BY {order} LIMIT ?", params + [limit])
+    return [json.loads(data) for (data,) in cursor]
+
+
+def count_rows(table: str, filters: Optional[dict] = None) -> int:
+    conn = connect()
+    ensure_table(conn, table)
+    where, params = _where(filters)
+    return conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}{where}", params).fetchone()[0]
+
+
+def insert_row(table: str, data: dict) -> dict:
+    return insert_rows(table, [data])[0]
+
+
+def insert_rows(table: str, rows: Iterable[dict], path: Optional[str] = None) -> list[dict]:
+    """
+    Insert rows in one transaction. Rows without an id get the next integer id,
+    matching the mock store's "1", "2", ... ids. Generated ids are never reused,
+    even after deletes, so archived rows keep unique ids.
+    """
+    conn = connect(path)
+    ensure_table(conn, table)
+    _ensure_sequences(conn)
+    inserted = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        versions = _Versions(conn, table)
+        next_id = conn.execute(
+            f"SELECT MAX(COALESCE((SELECT value FROM _sequences WHERE name = ?), 0), "
+            f"COALESCE((SELECT MAX(rowid) FROM {_quote(table)}), 0)) + 1", (table,)
+        ).fetchone()[0]
+        params = []
+        last_id = next_id - 1
+        for row in rows:
+            if row.get("id") is None:
+                last_id += 1
+                row["id"] = str(last_id)
+            elif str(row["id"]).isdigit():
+                last_id = max(last_id, int(row["id"]))
+            versions.stamp(row)
+            params.append((str(row["id"]), json.dumps(row, default=str)))
+            inserted.append(row)
+        conn.executemany(f"INSERT INTO {_quote(table)} (id, data) VALUES (?, ?)", params)
+        conn.execute("INSERT OR REPLACE INTO _sequences (name, value) VALUES (?, ?)", (table, last_id))
+        versions.save()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return inserted
+
+
+def upsert_rows(table: str, rows: list[dict]) -> list[dict]:
+    conn = connect()
+    ensure_table(conn, table)
+    _ensure_sequences(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        versions = _Versions(conn, table)
+        conn.executemany(f"INSERT OR REPLACE INTO {_quote(table)} (id, data) VALUES (?, ?)",
+                         [(str(row["id"]), json.dumps(versions.stamp(row), default=str)) for row in rows])
+        versions.save()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return rows
+
+
+def _change_tombstones(conn: sqlite3.Connection, table: str, versions: "_Versions", changes: list[tuple[dict, dict]]):
+    """
+    Record the "changed" tombstones of updated rows (see supabase_client.SYNC_COLUMNS),
+    inside the update's transaction.
+    """
+    from supabase_client import TOMBSTONE_TABLE, change_tombstone
+
+    tombstones = [t for old, new in changes if (t := change_tombstone(table, old, new, versions.now))]
+    if tombstones:
+        conn.executemany(f"INSERT OR REPLACE INTO {_quote(TOMBSTONE_TABLE)} (id, data) VALUES (?, ?)",
+                         [(t["id"], json.dumps(t, default=str)) for t in tombstones])
+
+
+def _ensure_tombstones(conn: sqlite3.Connection, table: str):
+    from supabase_client import TOMBSTONE_TABLE, SYNC_COLUMNS, versioned_table
+
+    if versioned_table(table) in SYNC_COLUMNS:
+        ensure_table(conn, TOMBSTONE_TABLE)
+
+
+def update_rows(table: str, filters: dict, data: dict) -> list[dict]:
+    conn = connect()
+    ensure_table(conn, table)
+    _ensure_sequences(conn)
+    _ensure_tombstones(conn, table)
+    where, params = _where(filters)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        versions = _Versions(conn, table)
+        updated = []
+        changes = []
+        for row_id, raw in conn.execute(f"SELECT id, data FROM {_quote(table)}{where}", params).fetchall():
+            row = json.loads(raw)
+            old = dict(row)
+            row.update(data)
+            versions.stamp(row)
+            conn.execute(f"UPDATE {_quote(table)} SET data = ? WHERE id = ?", (json.dumps(row, default=str), row_id))
+            updated.append(row)
+            changes.append((old, row))
+        if versions.enabled:
+            _change_tombstones(conn, table, versions, changes)
+        versions.save()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return updated
+
+
+def delete_rows(table: str, filters: dict, tombstone_reason: Optional[str] = None) -> int:
+    """
+    Delete matching rows. With tombstone_reason, record a tombstone per deleted
+    row in the same transaction.
+    """
+    conn = connect()
+    ensure_table(conn, table)
+    where, params = _where(filters)
+    if tombstone_reason is None:
+        return conn.execute(f"DELETE FROM {_quote(table)}{where}", params).rowcount
+    from supabase_client import TOMBSTONE_TABLE, tombstone, previous_values
+
+    ensure_table(conn, TOMBSTONE_TABLE)
+    _ensure_sequences(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        versions = _Versions(conn, table)
+        deleted = conn.execute(f"DELETE FROM {_quote(table)}{where} RETURNING id, data", params).fetchall()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {_quote(TOMBSTONE_TABLE)} (id, data) VALUES (?, ?)",
+            [(t["id"], json.dumps(t)) for t in (tombstone(table, row_id, versions.next(), tombstone_reason,
+                                                          versions.now, previous_values(table, json.loads(raw)))
+                                                for row_id, raw in deleted)])
+        versions.save()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(deleted)
+
+
+def list_tables(prefix: str = "") -> list[str]:
+    rows = connect().execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ESCAPE '\\'",
+                             (prefix.replace("_", "\\_") + "%",)).fetchall()
+    return sorted(name for (name,) in rows)
+
+
+def drop_table(table: str):
+    conn = connect()
+    conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+    _known_tables.discard((conn, table))
+
+
+def update_row(table: str, row_id: str, data: dict) -> dict:
+    conn = connect()
+    ensure_table(conn, table)
+    _ensure_sequences(conn)
+    _ensure_tombstones(conn, table)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        found = conn.execute(f"SELECT data FROM {_quote(table)} WHERE id = ?", (str(row_id),)).fetchone()
+        if not found:
+            conn.execute("COMMIT")
+            return {}
+        row = json.loads(found[0])
+        old = dict(row)
+        row.update(data)
+        versions = _Versions(conn, table)
+        versions.stamp(row)
+        conn.execute(f"UPDATE {_quote(table)} SET data = ? WHERE id = ?", (json.dumps(row, default=str), str(row_id)))
+        if versions.enabled:
+            _change_tombstones(conn, table, versions, [(old, row)])
+        versions.save()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return row
@@ -1,7 +1,23 @@
 import os
-from typing import Optional, Union
-from supabase import create_client, Client
+import re
+import heapq
+import functools
+import threading
+import contextlib
+import contextvars
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Union, TYPE_CHECKING
 from dotenv import load_dotenv
+from tracing import traced
+import sqlite_store
+import events
+import replica
+import tenancy
+import singleflight
+from singleflight import coalesced
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Load environment variables
 load_dotenv()
@@ -29,10 +45,50 @@ MOCK_DB = {
     ],
     "activity_log": [
         {"id": "1", "actor_email": "admin@example.com", "action": "login", "entity_type": "user", "entity_id": "admin@example.com", "created_at": "2024-06-01T09:00:00Z"}
+    ],
+    "automations": [
+        {"id": "1", "name": "Daily Overdue Task Alert", "is_enabled": True, "trigger_type": "task_overdue_daily", "condition_json": {"min_overdue": 1}, "actions_json": [{"type": "whatsapp", "to": "manager"}], "created_at": "2024-06-01T09:00:00"},
+        {"id": "2", "name": "Weekly Email Report", "is_enabled": False, "trigger_type": "campaign_summary_weekly", "condition_json": {}, "actions_json": [{"type": "email_report", "to": "admin@example.com"}], "created_at": "2024-06-01T09:00:00"}
     ]
 }
 
-def get_client() -> Optional[Client]:
+# Optionally replace the demo rows with a generated dataset (see datagen.py),
+# e.g. MOCK_SEED_SIZE=100000 for load tests in mock mode.
+if os.environ.get("MOCK_SEED_SIZE"):
+    import datagen
+    datagen.seed_mock(int(os.environ["MOCK_SEED_SIZE"]))
+
+# With tenancy on, demo rows without a tenant belong to the default tenant.
+if tenancy.MULTI_TENANT:
+    for _table, _rows in MOCK_DB.items():
+        if tenancy.scoped(_table):
+            for _row in _rows:
+                _row.setdefault(tenancy.COLUMN, tenancy.DEFAULT_TENANT)
+
+# Per-request client scope set by session(); None means a new client per call.
+_session = contextvars.ContextVar("supabase_session", default=None)
+
+@contextlib.contextmanager
+def session():
+    """
+    Reuse one Supabase client for every call made inside the block, including
+    calls from threads run with a copy of this context (see the batch tool).
+    """
+    token = _session.set({})
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+def get_client() -> Optional["Client"]:
+    scope = _session.get()
+    if scope is None:
+        return _create_client()
+    if "client" not in scope:
+        scope["client"] = _create_client()
+    return scope["client"]
+
+def _create_client() -> Optional["Client"]:
     if os.environ.get("MOCK_MODE") == "true":
         return None
         
@@ -40,86 +96,538 @@ def get_client() -> Optional[Client]:
         print("⚠️ Supabase credentials missing -> Mock Mode Enabled")
         return None
     try:
+        # Imported here so mock/SQLite mode and cold starts do not pay for the supabase package
+        from supabase import create_client
         return create_client(SUPABASE_URL, SUPABASE_KEY)
     except Exception as e:
         print(f"⚠️ Supabase connection failed ({e}) -> Mock Mode Enabled")
         return None
 
-def fetch_rows(table: str, filters: Optional[dict] = None) -> list[dict]:
+# Filters map column -> value for equality. A "__<op>" suffix selects another
+# comparison, e.g. {"status__neq": "completed", "expires_at__lt": now}.
+FILTER_OPS = ("eq", "neq", "lt", "lte", "gt", "gte", "in")
+
+# Serialises mock-mode writes so conditional updates are atomic across threads.
+_mock_lock = threading.RLock()
+# Next generated mock id per table; keeps ids unique after deletes.
+_mock_next_id = {}
+
+# Tables whose writes carry a monotonic `version` (and `updated_at`), and whose
+# deletes leave a row in TOMBSTONE_TABLE, so clients can sync changes (see delta.py).
+# Mock and SQLite allocate versions inside the write; Supabase uses the
+# triggers in sql/change_versions.sql.
+VERSIONED_TABLES = ("campaigns", "tasks", "assets", "activity_log")
+TOMBSTONE_TABLE = "tombstones"
+_PARTITION_SUFFIX = re.compile(r"_\d{4}_\d{2}$")
+
+def versioned_table(table: str) -> Optional[str]:
+    """
+    The versioned table `table` belongs to (partitions map to their parent), or None.
+    """
+    base = _PARTITION_SUFFIX.sub("", table)
+    return base if base in VERSIONED_TABLES else None
+
+def stamp_version(table: str, row: dict, version: int, now: Optional[str] = None) -> dict:
+    row["version"] = version
+    if versioned_table(table) != "activity_log":  # append-only; created_at is its timestamp
+        row["updated_at"] = now or datetime.now(timezone.utc).isoformat()
+    return row
+
+# Columns the list tools filter delta syncs on. Tombstones keep their values
+# from before the delete, and an update changing one leaves a "changed"
+# tombstone with the old values, so a sync only hears about rows that may have
+# been in its result (see delta.py). Supabase records changes with the trigger
+# in sql/change_versions.sql.
+SYNC_COLUMNS = {"campaigns": ("status",), "tasks": ("assignee", "status"), "assets": ("status",),
+                "activity_log": ("actor_email", "entity_type")}
+
+def previous_values(table: str, row: dict) -> Optional[dict]:
+    columns = SYNC_COLUMNS.get(versioned_table(table))
+    return {column: row.get(column) for column in columns} if columns else None
+
+def tombstone(table: str, row_id, version: Optional[int], reason: str, now: Optional[str] = None,
+              previous: Optional[dict] = None) -> dict:
+    base = versioned_table(table)
+    row = {"id": tenancy.qualify(f"{base}:{row_id}"), "table_name": base, "row_id": str(row_id), "reason": reason,
+           "deleted_at": now or datetime.now(timezone.utc).isoformat(), "previous": previous}
+    if version is not None:
+        row["version"] = version
+    return tenancy.stamp(TOMBSTONE_TABLE, [row])[0]
+
+def change_tombstone(table: str, old: dict, new: dict, now: Optional[str] = None) -> Optional[dict]:
+    """
+    The "changed" tombstone for an update from old to new, or None if no column
+    in SYNC_COLUMNS changed. There is one per change, keyed by the new version.
+    """
+    previous = previous_values(table, old)
+    if not previous or all(new.get(column) == value for column, value in previous.items()):
+        return None
+    row = tombstone(table, old["id"], new.get("version"), "changed", now, previous)
+    row["id"] += f"@{new.get('version')}"
+    return row
+
+def _mock_tombstones(tombstones: list[dict]):
+    # Caller holds _mock_lock
+    if tombstones:
+        by_id = {t["id"]: t for t in tombstones}
+        store = MOCK_DB.setdefault(TOMBSTONE_TABLE, [])
+        store[:] = [t for t in store if t["id"] not in by_id] + tombstones
+
+def _mock_next_version() -> int:
+    # Caller holds _mock_lock, so versions follow write order
+    version = _mock_next_id.get("__version__", 0) + 1
+    _mock_next_id["__version__"] = version
+    return version
+
+def _mock_versions(table: str, rows: list[dict]):
+    if versioned_table(table):
+        now = datetime.now(timezone.utc).isoformat()
+        for row in rows:
+            stamp_version(table, row, _mock_next_version(), now)
+
+def split_filter(key: str) -> tuple[str, str]:
+    column, sep, op = key.rpartition("__")
+    if sep and op in FILTER_OPS:
+        return column, op
+    return key, "eq"
+
+def _compare(actual, op: str, expected) -> bool:
+    if op == "eq":
+        return actual == expected
+    if op == "neq":
+        return actual != expected
+    if op == "in":
+        return actual in expected
+    if actual is None:
+        return False
+    if op == "lt":
+        return actual < expected
+    if op == "lte":
+        return actual <= expected
+    if op == "gt":
+        return actual > expected
+    return actual >= expected
+
+def compile_filters(filters: Optional[dict]) -> list[tuple]:
+    """
+    Parse filters once for matching many rows; "in" lists become sets.
+    """
+    compiled = []
+    for key, value in (filters or {}).items():
+        column, op = split_filter(key)
+        if op == "in":
+            try:
+                value = frozenset(value)
+            except TypeError:
+                pass  # Unhashable members: keep the list
+        compiled.append((column, op, value))
+    return compiled
+
+def row_matches(row: dict, filters) -> bool:
+    """
+    Evaluate filters (a dict, or the result of compile_filters) against a row in
+    Python (mock mode and in-memory caches).
+    """
+    if not filters:
+        return True
+    if isinstance(filters, dict):
+        filters = compile_filters(filters)
+    for column, op, value in filters:
+        if not _compare(row.get(column), op, value):
+            return False
+    return True
+
+def _apply_filters(query, filters: Optional[dict]):
+    for key, value in (filters or {}).items():
+        column, op = split_filter(key)
+        query = query.in_(column, list(value)) if op == "in" else getattr(query, op)(column, value)
+    return query
+
+def backend_name() -> str:
+    """
+    Which store the data layer uses: "mock", "sqlite" or "supabase".
+    """
+    if os.environ.get("MOCK_MODE") == "true":
+        return "mock"
+    if os.environ.get("SQLITE_PATH"):
+        return "sqlite"
+    return "supabase" if SUPABASE_URL and SUPABASE_KEY else "mock"
+
+def use_sqlite() -> bool:
+    """
+    True when the local SQLite backend (SQLITE_PATH) is configured and mock mode is not forced.
+    """
+    return bool(os.environ.get("SQLITE_PATH")) and os.environ.get("MOCK_MODE") != "true"
+
+def _replicated(table: str, *args, **kwargs) -> bool:
+    # Replica reads are local and take microseconds; coalescing would only add overhead
+    return replica.enabled(table)
+
+@traced("supabase.fetch_rows", "table", "filters", "order_by", "limit")
+@coalesced(name="supabase.fetch_rows", skip=_replicated)
+def fetch_rows(table: str, filters: Optional[dict] = None, order_by: Optional[str] = None,
+               limit: Optional[int] = None) -> list[dict]:
     """
     Fetch data from a Supabase table with optional filters.
-    If Supabase client is not configured, operates in mock mode.
+    order_by names a column ("-column" for descending; nulls last) and limit caps the rows returned.
+    Uses SQLite when SQLITE_PATH is set; if Supabase is not configured either, operates in mock mode.
+    Tables listed in REPLICA_TABLES are served from an in-memory replica (see replica.py).
+    Rows of tenant tables are limited to the current tenant's (see tenancy.py).
     """
+    if replica.enabled(table) and (local := replica.get(table)) is not None:
+        return local.query(filters, order_by, limit)  # The replica holds this tenant's rows only
+    filters = tenancy.filters(table, filters)
+    if use_sqlite():
+        return sqlite_store.fetch_rows(table, filters, order_by, limit)
+
     client = get_client()
     if not client:
         # Mock Mode
         data = MOCK_DB.get(table, [])
         if filters:
-            return [row for row in data if all(row.get(k) == v for k, v in filters.items())]
-        return data
+            compiled = compile_filters(filters)
+            data = [row for row in data if row_matches(row, compiled)]
+        if order_by:
+            data = _mock_order(data, order_by, limit)
+        return data[:limit] if limit is not None else data
 
-    query = client.table(table).select("*")
-    if filters:
-        for key, value in filters.items():
-            query = query.eq(key, value)
+    query = _apply_filters(client.table(table).select("*"), filters)
+    if order_by:
+        query = query.order(order_by.lstrip("-"), desc=order_by.startswith("-"))
+    if limit is not None:
+        query = query.limit(limit)
     response = query.execute()
     return response.data
 
+def _mock_order(rows: list[dict], order_by: str, limit: Optional[int]) -> list[dict]:
+    column = order_by.lstrip("-")
+    descending = order_by.startswith("-")
+    present = [row for row in rows if row.get(column) is not None]
+    missing = [row for row in rows if row.get(column) is None]
+    key = lambda row: row[column]
+    if limit is not None and limit < len(present):
+        present = (heapq.nlargest if descending else heapq.nsmallest)(limit, present, key=key)
+    else:
+        present = sorted(present, key=key, reverse=descending)
+    return present + missing
+
+def _sort_key(row: dict, order_by: str) -> tuple:
+    return (row[order_by], str(row.get("id")))
+
+@traced("supabase.fetch_page", "table", "filters", "order_by", "limit")
+@coalesced(name="supabase.fetch_page")
+def fetch_page(table: str, filters: Optional[dict] = None, order_by: str = "id", limit: int = 1000,
+               after: Optional[tuple] = None) -> list[dict]:
+    """
+    Fetch up to `limit` rows ordered by (order_by, id), starting after the
+    (order_by value, id) key of the previous page. Keyset pagination keeps every
+    page equally cheap. Rows where order_by is null are skipped.
+    """
+    filters = tenancy.filters(table, filters)
+    if use_sqlite():
+        return sqlite_store.fetch_page(table, filters, order_by, limit, after)
+
+    client = get_client()
+    if not client:
+        # Mock Mode
+        compiled = compile_filters(filters)
+
+        def candidates():
+            for row in MOCK_DB.get(table, []):
+                value = row.get(order_by)
+                if value is None:
+                    continue
+                if after is not None and (value < after[0] or (value == after[0] and str(row.get("id")) <= str(after[1]))):
+                    continue
+                if row_matches(row, compiled):
+                    yield row
+        return heapq.nsmallest(limit, candidates(), key=lambda row: _sort_key(row, order_by))
+
+    query = _apply_filters(client.table(table).select("*"), filters).not_.is_(order_by, "null")
+    if after is not None:
+        value, last_id = after
+        if order_by == "id":
+            query = query.gt("id", last_id)
+        else:
+            query = query.or_(f'{order_by}.gt."{value}",and({order_by}.eq."{value}",id.gt."{last_id}")')
+    query = query.order(order_by)
+    if order_by != "id":
+        query = query.order("id")
+    return query.limit(limit).execute().data
+
+def iter_rows(table: str, filters: Optional[dict] = None, order_by: str = "id", page_size: int = 1000) -> Iterator[dict]:
+    """
+    Stream a table page by page in (order_by, id) order, holding one page in memory.
+    """
+    after = None
+    while True:
+        page = fetch_page(table, filters, order_by, page_size, after)
+        yield from page
+        if len(page) < page_size:
+            return
+        after = (page[-1][order_by], page[-1]["id"])
+
+def _publishes(op: str, extract):
+    """
+    Publish a change event after a successful write, and end coalescing of
+    reads that started before it (singleflight.wrote). extract(result, *args)
+    returns (rows, changes, filters) for events.publish_change.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(table, *args):
+            result = fn(table, *args)
+            singleflight.wrote(table)
+            if result:
+                rows, changes, filters = extract(result, *args)
+                events.publish_change(table, op, rows, changes, filters)
+            return result
+        return wrapper
+    return decorator
+
+def _mock_insert(table: str, new_rows: list[dict]) -> list[dict]:
+    with _mock_lock:
+        rows = MOCK_DB.setdefault(table, [])
+        ids = None
+        for data in new_rows:
+            if data.get("id") is None:
+                # Generate a simple mock ID
+                next_id = max(len(rows) + 1, _mock_next_id.get(table, 0))
+                _mock_next_id[table] = next_id + 1
+                data["id"] = str(next_id)
+            else:
+                if ids is None:
+                    ids = {row.get("id") for row in rows}
+                if data["id"] in ids:
+                    raise ValueError(f"duplicate key value violates unique constraint: {table}.id = {data['id']}")
+                ids.add(data["id"])
+            rows.append(data)
+        _mock_versions(table, new_rows)
+    return new_rows
+
+@traced("supabase.insert_row", "table")
+@_publishes("insert", lambda result, data: ([result], None, None))
 def insert_row(table: str, data: dict) -> dict:
     """
     Insert data into a Supabase table.
-    If Supabase client is not configured, operates in mock mode.
+    Uses SQLite when SQLITE_PATH is set; if Supabase is not configured either, operates in mock mode.
     """
+    tenancy.stamp(table, [data])
+    if use_sqlite():
+        return sqlite_store.insert_row(table, data)
+
     client = get_client()
     if not client:
         # Mock Mode
-        if table not in MOCK_DB:
-            MOCK_DB[table] = []
-        # Generate a simple mock ID
-        data["id"] = str(len(MOCK_DB[table]) + 1)
-        MOCK_DB[table].append(data)
-        return data
+        return _mock_insert(table, [data])[0]
 
     response = client.table(table).insert(data).execute()
     if response.data:
         return response.data[0]
     return {}
 
+@traced("supabase.update_row", "table", "row_id")
+@_publishes("update", lambda result, row_id, data: ([result], data, None))
 def update_row(table: str, row_id: str, data: dict) -> dict:
     """
     Update a row in a Supabase table by ID.
-    If Supabase client is not configured, operates in mock mode.
+    Uses SQLite when SQLITE_PATH is set; if Supabase is not configured either, operates in mock mode.
+    A row of a tenant table is only found if it belongs to the current tenant.
     """
+    tenancy.stamp(table, [data])
+    match = tenancy.filters(table, {"id": row_id})
+    if use_sqlite():
+        if len(match) > 1:
+            updated = sqlite_store.update_rows(table, match, data)
+            return updated[0] if updated else {}
+        return sqlite_store.update_row(table, row_id, data)
+
     client = get_client()
     if not client:
         # Mock Mode
-        rows = MOCK_DB.get(table, [])
-        for row in rows:
-            if row.get("id") == row_id:
-                row.update(data)
-                return row
+        with _mock_lock:
+            rows = MOCK_DB.get(table, [])
+            for row in rows:
+                if row_matches(row, match):
+                    old = dict(row)
+                    row.update(data)
+                    _mock_versions(table, [row])
+                    _mock_tombstones([t for t in [change_tombstone(table, old, row)] if t])
+                    return row
         return {}
 
-    response = client.table(table).update(data).eq("id", row_id).execute()
+    response = _apply_filters(client.table(table).update(data), match).execute()
     if response.data:
         return response.data[0]
     return {}
 
+@traced("supabase.update_rows", "table", "filters")
+@_publishes("update", lambda result, filters, data: (result, data, filters))
+def update_rows(table: str, filters: dict, data: dict) -> list[dict]:
+    """
+    Update every row matching the filters in one atomic statement and return the
+    updated rows. With a filter on the current value this is a compare-and-set.
+    """
+    tenancy.stamp(table, [data])
+    filters = tenancy.filters(table, filters)
+    if use_sqlite():
+        return sqlite_store.update_rows(table, filters, data)
+
+    client = get_client()
+    if not client:
+        # Mock Mode
+        with _mock_lock:
+            compiled = compile_filters(filters)
+            updated = [row for row in MOCK_DB.get(table, []) if row_matches(row, compiled)]
+            olds = [dict(row) for row in updated]
+            for row in updated:
+                row.update(data)
+            _mock_versions(table, updated)
+            _mock_tombstones([t for old, row in zip(olds, updated) if (t := change_tombstone(table, old, row))])
+        return updated
+
+    response = _apply_filters(client.table(table).update(data), filters).execute()
+    return response.data or []
+
+@traced("supabase.insert_rows", "table")
+@_publishes("insert", lambda result, rows: (result, None, None))
+def insert_rows(table: str, rows: list[dict]) -> list[dict]:
+    """
+    Insert many rows in one request (one transaction in SQLite).
+    """
+    if not rows:
+        return []
+    tenancy.stamp(table, rows)
+    if use_sqlite():
+        return sqlite_store.insert_rows(table, rows)
+
+    client = get_client()
+    if not client:
+        # Mock Mode
+        return _mock_insert(table, rows)
+
+    response = client.table(table).insert(rows).execute()
+    return response.data or []
+
+@traced("supabase.upsert_rows", "table")
+@_publishes("upsert", lambda result, rows: (result, None, None))
+def upsert_rows(table: str, rows: list[dict]) -> list[dict]:
+    """
+    Insert rows, replacing any existing row with the same id. Every row needs an id.
+    """
+    if not rows:
+        return []
+    tenancy.stamp(table, rows)
+    if use_sqlite():
+        return sqlite_store.upsert_rows(table, rows)
+
+    client = get_client()
+    if not client:
+        # Mock Mode
+        with _mock_lock:
+            existing = MOCK_DB.setdefault(table, [])
+            positions = {row.get("id"): i for i, row in enumerate(existing)}
+            _mock_versions(table, rows)
+            for row in rows:
+                if row["id"] in positions:
+                    existing[positions[row["id"]]] = row
+                else:
+                    positions[row["id"]] = len(existing)
+                    existing.append(row)
+        return rows
+
+    response = client.table(table).upsert(rows).execute()
+    return response.data or []
+
+@traced("supabase.delete_rows", "table", "filters")
+@_publishes("delete", lambda result, filters, reason="deleted": (None, None, filters))
+def delete_rows(table: str, filters: dict, reason: Optional[str] = "deleted") -> int:
+    """
+    Delete every row matching the filters; returns how many were deleted.
+    Deleted rows of versioned tables leave a tombstone with this reason;
+    reason=None leaves none (rows moved elsewhere or expired by retention).
+    """
+    if not filters:
+        raise ValueError("delete_rows requires filters")
+    filters = tenancy.filters(table, filters)
+    if use_sqlite():
+        return sqlite_store.delete_rows(table, filters, reason if versioned_table(table) else None)
+
+    client = get_client()
+    if not client:
+        # Mock Mode
+        with _mock_lock:
+            rows = MOCK_DB.get(table, [])
+            _mock_next_id[table] = max(len(rows) + 1, _mock_next_id.get(table, 0))
+            compiled = compile_filters(filters)
+            kept, deleted = [], []
+            for row in rows:
+                (deleted if row_matches(row, compiled) else kept).append(row)
+            rows[:] = kept
+            if deleted and versioned_table(table) and reason is not None:
+                _mock_tombstones([tombstone(table, row.get("id"), _mock_next_version(), reason,
+                                            previous=previous_values(table, row)) for row in deleted])
+        return len(deleted)
+
+    response = _apply_filters(client.table(table).delete(), filters).execute()
+    deleted = response.data or []
+    if deleted and versioned_table(table) and reason is not None:
+        # The version comes from the tombstones table's trigger
+        client.table(TOMBSTONE_TABLE).upsert([tombstone(table, row["id"], None, reason,
+                                                        previous=previous_values(table, row))
+                                              for row in deleted]).execute()
+    return len(deleted)
+
+def list_tables(prefix: str = "") -> list[str]:
+    """
+    Names of local (mock or SQLite) tables starting with prefix. Supabase tables
+    are managed by migrations, so this is not available there.
+    """
+    if use_sqlite():
+        return sqlite_store.list_tables(prefix)
+    if get_client():
+        raise NotImplementedError("list_tables is only available for the mock and SQLite stores")
+    return sorted(name for name in MOCK_DB if name.startswith(prefix))
+
+def drop_table(table: str):
+    """
+    Drop a local (mock or SQLite) table.
+    """
+    if use_sqlite():
+        return sqlite_store.drop_table(table)
+    if get_client():
+        raise NotImplementedError("drop_table is only available for the mock and SQLite stores")
+    with _mock_lock:
+        MOCK_DB.pop(table, None)
+
+@traced("supabase.rpc", "fn")
+def call_rpc(fn: str, params: Optional[dict] = None):
+    """
+    Call a Postgres function through Supabase. Only available with Supabase.
+    """
+    client = get_client()
+    if use_sqlite() or not client:
+        raise NotImplementedError(f"RPC {fn} requires Supabase")
+    return client.rpc(fn, params or {}).execute().data
+
+@traced("supabase.count_rows", "table", "filters")
+@coalesced(name="supabase.count_rows", skip=_replicated)
 def count_rows(table: str, filters: Optional[dict] = None) -> int:
     """
     Count rows in a Supabase table.
-    If Supabase client is not configured, operates in mock mode.
+    Uses SQLite when SQLITE_PATH is set; if Supabase is not configured either, operates in mock mode.
     """
+    if replica.enabled(table) and (local := replica.get(table)) is not None:
+        return local.count(filters)
+    filters = tenancy.filters(table, filters)
+    if use_sqlite():
+        return sqlite_store.count_rows(table, filters)
+
     client = get_client()
     if not client:
         # Mock Mode
         return len(fetch_rows(table, filters))
 
-    query = client.table(table).select("*", count="exact")
-    
-    if filters:
-        for key, value in filters.items():
-            query = query.eq(key, value)
-            
+    query = _apply_filters(client.table(table).select("*", count="exact"), filters)
     response = query.execute()
     return response.count if response.count is not None else 0
@@ -0,0 +1,315 @@
+"""
+Tenants: several brands served from one deployment, each seeing only its own data.
+
+Off unless MULTI_TENANT=true. When on, every tool call runs on behalf of one
+tenant, taken from its verified session token (see session_tokens.py). A call
+without a token names its tenant in the X-Tenant-ID header and proves it with
+that tenant's key from TENANT_KEYS in X-Tenant-Key; this is how a client gets
+its first token. A call with neither runs as DEFAULT_TENANT, unless
+DEFAULT_TENANT has a key too. Then:
+
+- supabase_client adds tenant_id = <tenant> to every read, update and delete
+  of a tenant table, and stamps it on every row written there. SQLite indexes
+  those tables on (tenant_id, column), and sql/tenants.sql adds the same
+  indexes in Postgres, so a tenant's queries cost what its own rows cost.
+- In-process caches (read replicas, search and date indexes, automation
+  rules, request coalescing) keep one partition per tenant.
+- Each tenant may run at most TENANT_MAX_CONCURRENCY tool calls at once and,
+  with TENANT_RATE_PER_SECOND set, start that many per second on average
+  (bursts up to TENANT_BURST). Calls over quota fail at once with
+  QuotaExceeded instead of queueing behind other tenants' work.
+  TENANT_QUOTAS overrides these per tenant, as JSON:
+  {"brand-a": {"max_concurrency": 4, "rate_per_second": 10, "burst": 20}}.
+
+TENANT_KEYS lists <tenant>:<secret> pairs (comma-separated), like
+AUTH_SIGNING_KEYS. TENANTS lists the tenant ids (comma-separated). Scheduled jobs run once per
+tenant, and calls naming any other tenant are refused. Without it the only
+known tenant is DEFAULT_TENANT.
+
+Enabling tenancy on existing data: apply sql/tenants.sql (Supabase). SQLite
+and mock rows without a tenant_id are assigned DEFAULT_TENANT when a process
+first opens their table.
+"""
+import os
+import re
+import hmac
+import json
+import time
+import threading
+import contextlib
+import contextvars
+from typing import Callable, Optional
+
+MULTI_TENANT = os.environ.get("MULTI_TENANT", "false").lower() == "true"
+DEFAULT_TENANT = os.environ.get("DEFAULT_TENANT", "default")
+TENANT_MAX_CONCURRENCY = int(os.environ.get("TENANT_MAX_CONCURRENCY", "16"))
+TENANT_RATE_PER_SECOND = float(os.environ.get("TENANT_RATE_PER_SECOND", "0"))
+TENANT_BURST = float(os.environ.get("TENANT_BURST", "0")) or TENANT_RATE_PER_SECOND * 2
+
+COLUMN = "tenant_id"
+HEADER = "x-tenant-id"
+KEY_HEADER = "x-tenant-key"
+# Tables holding tenant data. Their month partitions ("activity_log_2025_01")
+# and archive tables ("campaigns_archive") belong to them.
+TABLES = ("users", "campaigns", "tasks", "assets", "activity_log", "automations", "uploads", "tombstones",
+          "activity_rollups", "activity_rollup_state", "archive_checkpoints")
+_BASE_NAME = re.compile(r"(_\d{4}_\d{2}|_archive)$")
+_TENANT_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class TenantError(ValueError):
+    pass
+
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+def _load_tenants() -> list[str]:
+    tenants = [t.strip() for t in os.environ.get("TENANTS", "").split(",") if t.strip()]
+    for tenant in tenants + [DEFAULT_TENANT]:
+        if not _TENANT_ID.match(tenant):
+            raise ValueError(f"Tenant ids must match [A-Za-z0-9_-]{{1,64}}: {tenant!r}")
+    return tenants
+
+
+def _load_keys() -> dict[str, bytes]:
+    keys = {}
+    for entry in filter(None, (e.strip() for e in os.environ.get("TENANT_KEYS", "").split(","))):
+        tenant, _, secret = entry.partition(":")
+        if not _TENANT_ID.match(tenant) or not secret:
+            raise ValueError("TENANT_KEYS entries must be <tenant>:<secret>")
+        keys[tenant] = secret.encode()
+    return keys
+
+
+TENANTS = _load_tenants()
+KEYS = _load_keys()
+QUOTAS = json.loads(os.environ.get("TENANT_QUOTAS", "") or "{}")
+
+
+def tenants() -> list[str]:
+    """
+    Every known tenant id (just DEFAULT_TENANT when TENANTS is not set).
+    """
+    return TENANTS or [DEFAULT_TENANT]
+
+
+# --- The current tenant ---
+
+_current = contextvars.ContextVar("tenant", default=None)
+
+
+def current() -> str:
+    return _current.get() or DEFAULT_TENANT
+
+
+@contextlib.contextmanager
+def use(tenant: str):
+    """
+    Run the block on behalf of tenant (background jobs, worker threads).
+    """
+    token = _current.set(tenant)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def resolve(header: Optional[str], claims: Optional[dict], key: Optional[str] = None) -> str:
+    """
+    The tenant of a request: the verified session token's; else the X-Tenant-ID
+    header's, if X-Tenant-Key holds that tenant's key; else DEFAULT_TENANT if it
+    has no key. Raises TenantError otherwise, for a tenant that is not known, or
+    for a header that disagrees with the token.
+    """
+    if not MULTI_TENANT:
+        return DEFAULT_TENANT
+    header = (header or "").strip() or None
+    tenant = (claims or {}).get("tenant")
+    if tenant is not None:
+        if header is not None and header != tenant:
+            raise TenantError(f"Session token belongs to tenant '{tenant}', not '{header}'")
+    else:
+        tenant = header or DEFAULT_TENANT
+        expected = KEYS.get(tenant)
+        if header is not None and expected is None:
+            raise TenantError(f"Tenant '{tenant}' can only be selected with a session token")
+        if expected is not None and not hmac.compare_digest((key or "").encode(), expected):
+            raise TenantError(f"Tenant '{tenant}' requires a session token or its X-Tenant-Key")
+    if not _TENANT_ID.match(tenant) or TENANTS and tenant not in TENANTS:
+        raise TenantError(f"Unknown tenant '{tenant}'")
+    return tenant
+
+
+def for_each(fn: Callable[[], object]) -> object:
+    """
+    Run fn once per tenant and return {tenant: result}; just fn() when tenancy
+    is off. A tenant whose run raises gets {"error": message} and the others
+    still run.
+    """
+    if not MULTI_TENANT:
+        return fn()
+    results = {}
+    for tenant in tenants():
+        with use(tenant):
+            try:
+                results[tenant] = fn()
+            except Exception as e:
+                print(f"⚠️ {getattr(fn, '__name__', 'job')} failed for tenant {tenant}: {e}")
+                results[tenant] = {"error": str(e)}
+    return results
+
+
+# --- Data scoping ---
+
+def base_table(table: str) -> str:
+    return _BASE_NAME.sub("", table)
+
+
+def scoped(table: str) -> bool:
+    """
+    True if rows of table belong to tenants and must be filtered by the current one.
+    """
+    return MULTI_TENANT and base_table(table) in TABLES
+
+
+def filters(table: str, filters: Optional[dict]) -> Optional[dict]:
+    """
+    The filters restricted to the current tenant's rows, for tenant tables.
+    """
+    if not scoped(table):
+        return filters
+    return {**(filters or {}), COLUMN: current()}
+
+
+def stamp(table: str, rows: list[dict]) -> list[dict]:
+    """
+    Set tenant_id on rows about to be written to a tenant table (in place), so
+    no tenant can write into another's data.
+    """
+    if scoped(table):
+        tenant = current()
+        for row in rows:
+            row[COLUMN] = tenant
+    return rows
+
+
+def partition(table: Optional[str] = None) -> Optional[str]:
+    """
+    Cache partition for data read now: the current tenant (for table, if it is
+    a tenant table), or None when the data is shared by all tenants.
+    """
+    if not MULTI_TENANT or table is not None and not scoped(table):
+        return None
+    return current()
+
+
+def qualify(key: str) -> str:
+    """
+    A per-tenant id for rows with well-known ids (checkpoints, watermarks), so
+    each tenant's row is distinct.
+    """
+    return f"{current()}:{key}" if MULTI_TENANT else key
+
+
+# --- Quotas ---
+
+class _Tenant:
+    __slots__ = ("max_concurrency", "rate", "burst", "tokens", "refilled", "active", "calls", "rejected_concurrency",
+                 "rejected_rate", "peak_active", "total_ms")
+
+    def __init__(self, tenant: str):
+        quota = QUOTAS.get(tenant, {})
+        self.max_concurrency = int(quota.get("max_concurrency", TENANT_MAX_CONCURRENCY))
+        self.rate = float(quota.get("rate_per_second", TENANT_RATE_PER_SECOND))
+        burst = float(quota.get("burst") or 0)
+        if not burst:
+            burst = self.rate * 2 if "rate_per_second" in quota else TENANT_BURST
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.active = 0
+        self.calls = 0
+        self.rejected_concurrency = 0
+        self.rejected_rate = 0
+        self.peak_active = 0
+        self.total_ms = 0.0
+
+    def take_token(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+_tenants = {}
+_lock = threading.Lock()
+
+
+def _state(tenant: str) -> _Tenant:
+    state = _tenants.get(tenant)
+    if state is None:
+        with _lock:
+            state = _tenants.setdefault(tenant, _Tenant(tenant))
+    return state
+
+
+@contextlib.contextmanager
+def admit(tenant: str):
+    """
+    Run one tool call for tenant within its quotas, with tenant current inside
+    the block. Raises QuotaExceeded if the tenant is at its concurrency limit or
+    out of rate. Without MULTI_TENANT this only sets the tenant.
+    """
+    if not MULTI_TENANT:
+        with use(tenant):
+            yield
+        return
+    state = _state(tenant)
+    started = time.monotonic()
+    with _lock:
+        if state.max_concurrency and state.active >= state.max_concurrency:
+            state.rejected_concurrency += 1
+            raise QuotaExceeded(f"Tenant '{tenant}' already has {state.active} calls running; retry shortly")
+        if not state.take_token(started):
+            state.rejected_rate += 1
+            raise QuotaExceeded(f"Tenant '{tenant}' is over its rate of {state.rate:g} calls/s; "
+                                f"retry in {(1 - state.tokens) / state.rate:.2f}s")
+        state.active += 1
+        state.calls += 1
+        state.peak_active = max(state.peak_active, state.active)
+    try:
+        with use(tenant):
+            yield
+    finally:
+        with _lock:
+            state.active -= 1
+            state.total_ms += (time.monotonic() - started) * 1000
+
+
+def concurrency_limit(tenant: str) -> int:
+    """
+    How many tool calls tenant may run at once (0: no limit, or tenancy is off).
+    """
+    return _state(tenant).max_concurrency if MULTI_TENANT else 0
+
+
+def stats() -> dict:
+    """
+    Quota counters of the current tenant; tenants do not see each other's.
+    """
+    if not MULTI_TENANT:
+        return {"enabled": False}
+    tenant = current()
+    state = _state(tenant)
+    with _lock:
+        return {"enabled": True, "tenant": tenant, "known_tenants": len(tenants()),
+                "max_concurrency": state.max_concurrency, "rate_per_second": state.rate, "burst": state.burst,
+                "calls": state.calls, "active": state.active, "peak_active": state.peak_active,
+                "rejected_concurrency": state.rejected_concurrency, "rejected_rate": state.rejected_rate,
+                "avg_ms": round(state.total_ms / state.calls, 3) if state.calls else None}
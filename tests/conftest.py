@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests run against the in-memory mock backend, from the repository root
+os.environ["MOCK_MODE"] = "true"
+os.environ.pop("SQLITE_PATH", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
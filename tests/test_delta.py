@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import datagen
+import delta
+import supabase_client as db
+
+
+@pytest.fixture(autouse=True)
+def dataset():
+    datagen.seed_mock(30)
+    db.MOCK_DB[db.TOMBSTONE_TABLE] = []  # Left by earlier tests, with versions above the new rows'
+
+
+def _sync(table, cursor="0", filters=None, limit=delta.DELTA_PAGE_SIZE):
+    """
+    Follow has_more to the end; returns (rows, tombstones, cursor).
+    """
+    rows, tombstones = [], []
+    while True:
+        page = delta.changes(table, cursor, filters, limit)
+        rows += page["rows"]
+        tombstones += page["tombstones"]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            return rows, tombstones, cursor
+
+
+def _task(**fields):
+    return db.insert_row("tasks", {"title": "Sync", "status": "todo", "assignee": "team@example.com", **fields})
+
+
+def test_snapshot_pages_cover_the_table_once():
+    rows, tombstones, _ = _sync("tasks", limit=7)
+    assert sorted(row["id"] for row in rows) == sorted(row["id"] for row in db.fetch_rows("tasks"))
+    assert tombstones == []
+
+
+def test_changes_since_the_cursor():
+    _, _, cursor = _sync("tasks")
+    created = _task()
+    updated = db.update_row("tasks", db.fetch_rows("tasks")[0]["id"], {"title": "Renamed"})
+    deleted = db.fetch_rows("tasks")[1]["id"]
+    db.delete_rows("tasks", {"id": deleted})
+    rows, tombstones, cursor = _sync("tasks", cursor)
+    assert {row["id"] for row in rows} == {created["id"], updated["id"]}
+    assert [(t["id"], t["reason"]) for t in tombstones] == [(deleted, "deleted")]
+    # Nothing new: an empty page, and the cursor stays usable
+    assert _sync("tasks", cursor)[:2] == ([], [])
+
+
+def test_changes_made_during_a_snapshot_arrive_afterwards():
+    page = delta.changes("tasks", "0", None, 10)
+    created = _task()
+    rows, _, _ = _sync("tasks", page["cursor"], limit=10)
+    assert created["id"] in {row["id"] for row in rows}
+
+
+def test_page_boundaries_lose_and_repeat_nothing():
+    _, _, cursor = _sync("tasks")
+    created = [_task(title=f"Task {i}")["id"] for i in range(12)]
+    deleted = created[:5]
+    for row_id in deleted:
+        db.delete_rows("tasks", {"id": row_id})
+    created += [_task(title=f"Later {i}")["id"] for i in range(4)]
+    rows, tombstones, _ = _sync("tasks", cursor, limit=3)
+    # A row deleted after it changed may come back as a row, but always with its tombstone
+    assert {row["id"] for row in rows} >= set(created) - set(deleted)
+    assert sorted(t["id"] for t in tombstones) == sorted(deleted)
+    versions = [row["version"] for row in rows]
+    assert len(versions) == len(set(versions))
+
+
+def test_rows_leaving_the_filter_get_a_tombstone():
+    todo = {"status": "todo"}
+    _, _, cursor = _sync("tasks", filters=todo)
+    leaving = _task()
+    _, _, cursor = _sync("tasks", cursor, todo)
+    db.update_row("tasks", leaving["id"], {"status": "completed"})
+    rows, tombstones, _ = _sync("tasks", cursor, todo)
+    assert rows == []
+    assert [(t["id"], t["reason"]) for t in tombstones] == [(leaving["id"], "no_longer_matches")]
+
+
+def test_rows_that_never_matched_produce_no_tombstones():
+    todo = {"status": "todo"}
+    done = _task(status="completed")
+    _, _, cursor = _sync("tasks", filters=todo)
+    db.update_row("tasks", done["id"], {"assignee": "manager@example.com"})
+    db.delete_rows("tasks", {"id": done["id"]})
+    assert _sync("tasks", cursor, todo)[:2] == ([], [])
+
+
+def test_a_row_that_still_matches_is_not_reported_as_leaving():
+    mine = {"assignee": "team@example.com"}
+    task = _task()
+    _, _, cursor = _sync("tasks", filters=mine)
+    db.update_row("tasks", task["id"], {"status": "in_progress"})
+    rows, tombstones, _ = _sync("tasks", cursor, mine)
+    assert [row["id"] for row in rows] == [task["id"]]
+    assert tombstones == []
+
+
+def test_old_cursors_reset(monkeypatch):
+    _, _, cursor = _sync("tasks")
+    monkeypatch.setattr(time, "time", lambda: 10 ** 12)
+    assert delta.changes("tasks", cursor)["reset"] is True
+
+
+def test_invalid_cursors_are_refused():
+    with pytest.raises(ValueError):
+        delta.changes("tasks", "not-a-cursor")
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+import datagen
+import replica
+import supabase_client as db
+
+
+@pytest.fixture(autouse=True)
+def dataset():
+    datagen.seed_mock(50)
+
+
+def _loaded(table="tasks"):
+    r = replica.TableReplica(table)
+    assert r.ensure_fresh(live=True)
+    return r
+
+
+def test_load_copies_the_table_and_indexes_it():
+    r = _loaded()
+    assert len(r.rows) == 50
+    todo = r.query({"status": "todo"}, None, None)
+    assert sorted(row["id"] for row in todo) == sorted(row["id"] for row in db.fetch_rows("tasks", {"status": "todo"}))
+    assert r.count({"status": "todo"}) == len(todo)
+
+
+def test_changes_during_a_load_are_replayed(monkeypatch):
+    r = replica.TableReplica("tasks")
+    doomed = db.fetch_rows("tasks")[0]["id"]
+    rows = db.iter_rows
+
+    def iter_rows(table, *args, **kwargs):
+        for i, row in enumerate(rows(table, *args, **kwargs)):
+            if i == 1:
+                # Writes landing while the table is read must survive the swap
+                r.apply("insert", [{"id": "new", "status": "todo"}], None)
+                r.apply("delete", None, {"id": doomed})
+            yield row
+    monkeypatch.setattr(db, "iter_rows", iter_rows)
+    r.load()
+    assert "new" in r.rows
+    assert doomed not in r.rows
+    assert [row["id"] for row in r.query({"status": "todo"}, None, None)].count("new") == 1
+
+
+def test_changes_keep_the_indexes_current():
+    r = _loaded()
+    row = dict(r.query({"status": "todo"}, None, 1)[0], status="completed")
+    r.apply("update", [row], None)
+    assert row["id"] not in {x["id"] for x in r.query({"status": "todo"}, None, None)}
+    assert row["id"] in {x["id"] for x in r.query({"status": "completed"}, None, None)}
+
+
+def test_invalidate_reloads_on_the_next_read():
+    r = _loaded()
+    db.MOCK_DB["tasks"] = db.MOCK_DB["tasks"][:10]  # Changed behind the replica's back
+    assert len(r.rows) == 50
+    r.invalidate()
+    assert r.ensure_fresh(live=False)
+    assert len(r.rows) == 10
+
+
+def test_stale_replica_is_served_while_it_reloads(monkeypatch):
+    monkeypatch.setattr(replica, "REPLICA_TTL_SECONDS", 1)
+    monkeypatch.setattr(replica, "REPLICA_MAX_STALE_SECONDS", 60)
+    r = _loaded()
+    started = []
+    monkeypatch.setattr(r, "_reload_in_background", lambda: started.append(True))
+    r.loaded_at = time.monotonic() - 5
+    assert r.ensure_fresh(live=False)
+    assert started == [True]
+    # A live feed keeps even an old replica servable without reloading
+    assert r.ensure_fresh(live=True)
+    assert started == [True]
+
+
+def test_too_stale_replica_blocks_on_a_reload(monkeypatch):
+    monkeypatch.setattr(replica, "REPLICA_TTL_SECONDS", 1)
+    monkeypatch.setattr(replica, "REPLICA_MAX_STALE_SECONDS", 2)
+    r = _loaded()
+    r.loaded_at = time.monotonic() - 5
+    db.MOCK_DB["tasks"] = db.MOCK_DB["tasks"][:5]
+    assert r.ensure_fresh(live=False)
+    assert len(r.rows) == 5
+
+
+def test_too_large_tables_are_not_replicated(monkeypatch):
+    monkeypatch.setattr(replica, "REPLICA_MAX_ROWS", 10)
+    r = replica.TableReplica("tasks")
+    assert not r.ensure_fresh(live=True)
+    assert r.too_large
+
+
+def test_feed_reconnect_invalidates_every_replica(monkeypatch):
+    r = _loaded()
+    monkeypatch.setattr(replica, "_replicas", {"tasks": {None: r}})
+    monkeypatch.setattr(replica, "_feed", {"live": False, "status": "CHANNEL_ERROR"})
+    replica._on_feed_state("SUBSCRIBED")
+    assert r.loaded_at is None
+    # Staying subscribed does not reload again
+    r.ensure_fresh(live=True)
+    replica._on_feed_state("SUBSCRIBED")
+    assert r.loaded_at is not None
+
+
+def test_feed_events_apply_to_the_replica(monkeypatch):
+    r = _loaded()
+    monkeypatch.setattr(replica, "_replicas", {"tasks": {None: r}})
+    doomed = next(iter(r.rows))
+    replica._on_feed_change({"data": {"table": "tasks", "type": "INSERT", "record": {"id": "feed", "status": "todo"}}})
+    replica._on_feed_change({"data": {"table": "tasks", "type": "DELETE", "old_record": {"id": doomed}}})
+    assert "feed" in r.rows and doomed not in r.rows
+    # A delete without the row's key cannot be applied; the replica reloads instead
+    replica._on_feed_change({"data": {"table": "tasks", "type": "DELETE", "old_record": {}}})
+    assert r.loaded_at is None
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import singleflight
+import supabase_client as db
+
+
+def _blocking_read(name):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    @singleflight.coalesced(name=name)
+    def read(table):
+        calls.append(table)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    return read, started, release, calls
+
+
+def _run(read, results):
+    thread = threading.Thread(target=lambda: results.append(read("things")))
+    thread.start()
+    return thread
+
+
+def _wait_for_calls(name, n):
+    deadline = time.monotonic() + 5
+    while singleflight.stats()["by_operation"][name]["calls"] < n:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_concurrent_reads_share_one_flight():
+    read, started, release, calls = _blocking_read("test.shared")
+    results = []
+    first = _run(read, results)
+    started.wait(5)
+    second = _run(read, results)
+    _wait_for_calls("test.shared", 2)
+    release.set()
+    first.join(5), second.join(5)
+    assert len(calls) == 1
+    assert results == [1, 1]
+
+
+def test_read_after_write_does_not_join_an_earlier_flight():
+    read, started, release, calls = _blocking_read("test.after_write")
+    results = []
+    first = _run(read, results)
+    started.wait(5)
+    singleflight.wrote("things")
+    second = _run(read, results)
+    _wait_for_calls("test.after_write", 2)
+    release.set()
+    first.join(5), second.join(5)
+    assert len(calls) == 2
+    assert singleflight.stats()["by_operation"]["test.after_write"]["coalesced"] == 0
+
+
+def test_writes_bump_the_table_epoch():
+    tasks, everything = singleflight.epoch("tasks"), singleflight.epoch()
+    db.insert_row("tasks", {"title": "Read your writes", "status": "todo"})
+    assert singleflight.epoch("tasks") == tasks + 1
+    assert singleflight.epoch() == everything + 1
@@ -0,0 +1,153 @@
+"""
+Tool manifest: names, descriptions and signatures of every MCP tool.
+
+server.py registers tools from tool_manifest.json without importing the
+tool modules. Each entry becomes a lightweight proxy with the real
+signature. The tool module, and the heavy dependencies it pulls in
+(supabase, requests, smtplib, ...), is imported on the proxy's first call.
+
+Regenerate the manifest after adding or changing a tool, and check it in CI:
+
+    python tool_manifest.py           # rewrite tool_manifest.json
+    python tool_manifest.py --check   # exit 1 if it is out of date
+"""
+import os
+import sys
+import json
+import inspect
+import argparse
+import importlib
+from typing import Any, Optional, Union
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool_manifest.json")
+
+# Registration order, grouped by module.
+TOOL_MODULES = [
+    ("tools.auth", ["get_user_by_email", "get_user_role", "list_team_members", "create_session_token",
+                    "revoke_session_token"]),
+    ("tools.campaigns", ["list_campaigns", "create_campaign", "update_campaign_status", "campaigns_active_between",
+                         "calendar_conflicts"]),
+    ("tools.tasks", ["list_tasks", "create_task", "update_task_status"]),
+    ("tools.assets", ["list_assets", "upload_asset", "review_asset", "start_asset_upload", "upload_asset_chunk",
+                      "get_asset_upload", "complete_asset_upload"]),
+    ("tools.activity", ["log_activity", "list_activity", "activity_stats"]),
+    ("tools.dashboard", ["marketing_snapshot", "channel_performance"]),
+    ("tools.notifications", ["send_whatsapp_message", "notify_campaign_status_change", "notify_overdue_tasks",
+                             "send_email_report", "send_campaign_update", "send_email"]),
+    ("tools.reports", ["generate_dashboard_summary", "send_periodic_marketing_report"]),
+    ("tools.automations", ["list_automations", "create_automation", "toggle_automation", "run_automation_trigger"]),
+    ("tools.search", ["search"]),
+    ("tools.system", ["check_backend_config", "configure_profiling", "get_runtime_stats"]),
+    ("tools.ai_engine", ["ai_campaign_review", "ai_generate_ideas", "ai_generate_copy", "ai_marketing_calendar",
+                         "ai_dev_assistant"]),
+]
+
+# Names an annotation string in the manifest may refer to.
+_TYPE_NAMESPACE = {"Any": Any, "Optional": Optional, "Union": Union, "NoneType": type(None), "None": None,
+                   "str": str, "int": int, "float": float, "bool": bool, "dict": dict, "list": list}
+
+
+def _annotation_str(annotation) -> Optional[str]:
+    if annotation is inspect.Parameter.empty:
+        return None
+    if isinstance(annotation, type) and not getattr(annotation, "__args__", None):
+        return annotation.__name__
+    return repr(annotation).replace("typing.", "")
+
+
+def _describe(fn) -> dict:
+    signature = inspect.signature(fn)
+    params = []
+    for p in signature.parameters.values():
+        param = {"name": p.name, "kind": p.kind.name, "annotation": _annotation_str(p.annotation)}
+        if p.default is not inspect.Parameter.empty:
+            param["default"] = p.default
+        params.append(param)
+    return {
+        "name": fn.__name__,
+        "module": fn.__module__,
+        "description": inspect.getdoc(fn),
+        "parameters": params,
+        "returns": _annotation_str(signature.return_annotation),
+    }
+
+
+def build_manifest() -> list[dict]:
+    """
+    Import every tool module and describe its tools.
+    """
+    entries = []
+    for module_name, names in TOOL_MODULES:
+        module = importlib.import_module(module_name)
+        entries.extend(_describe(getattr(module, name)) for name in names)
+    return entries
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> list[dict]:
+    """
+    Read the manifest, building it in-process if the file is missing.
+    """
+    if not os.path.exists(path):
+        print(f"⚠️ {os.path.basename(path)} missing -> importing tool modules eagerly")
+        return build_manifest()
+    with open(path) as f:
+        return json.load(f)
+
+
+def _resolve(annotation: Optional[str]):
+    if annotation is None:
+        return inspect.Parameter.empty
+    return eval(annotation, {"__builtins__": {}}, _TYPE_NAMESPACE)
+
+
+def lazy_tool(entry: dict):
+    """
+    Build a proxy for one manifest entry. The proxy has the tool's name, docstring
+    and signature, and imports the real function on its first call.
+    """
+    target = None
+
+    def proxy(*args, **kwargs):
+        nonlocal target
+        if target is None:
+            target = getattr(importlib.import_module(entry["module"]), entry["name"])
+        return target(*args, **kwargs)
+
+    params = []
+    for p in entry["parameters"]:
+        params.append(inspect.Parameter(
+            p["name"], inspect._ParameterKind[p["kind"]],
+            default=p.get("default", inspect.Parameter.empty), annotation=_resolve(p["annotation"]),
+        ))
+    proxy.__name__ = proxy.__qualname__ = entry["name"]
+    proxy.__module__ = entry["module"]
+    proxy.__doc__ = entry["description"]
+    proxy.__signature__ = inspect.Signature(params, return_annotation=_resolve(entry["returns"]))
+    proxy.__annotations__ = {p.name: p.annotation for p in params if p.annotation is not inspect.Parameter.empty}
+    if entry["returns"] is not None:
+        proxy.__annotations__["return"] = proxy.__signature__.return_annotation
+    return proxy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate or check tool_manifest.json.")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if the manifest is out of date")
+    args = parser.parse_args(argv)
+
+    manifest = build_manifest()
+    rendered = json.dumps(manifest, indent=2) + "\n"
+    if args.check:
+        current = open(MANIFEST_PATH).read() if os.path.exists(MANIFEST_PATH) else ""
+        if current != rendered:
+            print("tool_manifest.json is out of date; run: python tool_manifest.py")
+            return 1
+        print("tool_manifest.json is up to date")
+        return 0
+    with open(MANIFEST_PATH, "w") as f:
+        f.write(rendered)
+    print(f"Wrote {len(manifest)} tools to {MANIFEST_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,11 @@
-from typing import Optional
+from typing import Optional, Union
 
-from supabase_client import insert_row, fetch_rows
 from datetime import datetime, timezone
+from itertools import islice
+import activity_store
+from archive import iter_archived
+import delta
+import encoding
 
 
 def log_activity(actor_email: str, action: str, entity_type: str, entity_id: str, metadata: Optional[dict] = None) -> dict:
@@ -16,30 +20,45 @@ def log_activity(actor_email: str, action: str, entity_type: str, entity_id: str
         "metadata": metadata or {},
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    return insert_row("activity_log", data)
+    return activity_store.insert(data)
 
 
-def list_activity(limit: int = 50, actor_email: Optional[str] = None, entity_type: Optional[str] = None) -> list[dict]:
+def list_activity(limit: int = 50, actor_email: Optional[str] = None, entity_type: Optional[str] = None,
+                  include_archived: bool = False, since: Optional[str] = None, until: Optional[str] = None,
+                  changed_since: Optional[str] = None, columnar: bool = False) -> Union[list[dict], dict]:
     """
-    List activity logs with optional filters.
+    List activity logs with optional filters, newest first.
+    since/until (ISO dates or timestamps) bound created_at; only the matching monthly partitions are read.
+    Set include_archived to also return activity of archived campaigns.
+    Set changed_since to a sync cursor ("0" to start) to get only new entries, oldest
+    first, up to `limit` per call: {"rows", "tombstones", "cursor", "has_more"}.
+    Set columnar to get {"columns", "rows"}: the column names once, then one value array per row.
     """
     filters = {}
     if actor_email:
         filters["actor_email"] = actor_email
     if entity_type:
         filters["entity_type"] = entity_type
-        
-    # Note: supabase_client.fetch_rows doesn't support limit yet, 
-    # but for now we will fetch all matching and slice in python 
-    # or we should update fetch_rows to support limit.
-    # Given the prompt asked for "efficient Supabase queries", 
-    # ideally we should add limit to fetch_rows. 
-    # For now, let's just return the filtered list.
-    # To properly implement limit, we would need to modify supabase_client.py again.
-    # But let's stick to the current implementation for simplicity unless performance is critical.
-    
-    logs = fetch_rows("activity_log", filters)
-    # Sort by created_at desc (assuming fetch returns in default order, usually insertion order)
-    # Ideally we sort in DB.
-    # Let's just slice for now.
-    return logs[:limit]
+    if changed_since is not None:
+        return encoding.apply_format(delta.changes(activity_store.TABLE, changed_since, filters, limit), columnar)
+
+    logs = activity_store.fetch(filters, since=since, until=until, limit=limit)
+    if include_archived and len(logs) < limit:
+        if since:
+            filters["created_at__gte"] = since
+        if until:
+            filters["created_at__lt"] = until
+        logs = logs + list(islice(iter_archived("activity_log", filters), limit - len(logs)))
+    return encoding.apply_format(logs[:limit], columnar)
+
+
+def activity_stats(grain: str = "day", since: Optional[str] = None, until: Optional[str] = None,
+                   actor_email: Optional[str] = None, entity_type: Optional[str] = None) -> dict:
+    """
+    Activity counts from the pre-aggregated rollups: a series per hour or day (grain),
+    plus totals per actor, entity type and action. Does not read raw activity rows.
+    Rollups are refreshed hourly, so the current hour may lag.
+    """
+    if grain not in ("hour", "day"):
+        return {"error": "grain must be 'hour' or 'day'"}
+    return activity_store.stats(grain, since, until, actor_email, entity_type)
@@ -3,7 +3,12 @@ import json
 import requests
 import glob
 from datetime import datetime, timedelta
+from tracing import traced
+import date_index
 
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+@traced("openai.chat_completion")
 def _call_openai(system_prompt: str, user_prompt: str) -> str:
     """
     Helper to call OpenAI API. Returns None if call fails or no key.
@@ -25,7 +30,7 @@ def _call_openai(system_prompt: str, user_prompt: str) -> str:
             ],
             "temperature": 0.7
         }
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
+        response = requests.post(f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=payload, timeout=30)
         if response.status_code == 200:
             return response.json()["choices"][0]["message"]["content"]
         else:
@@ -103,24 +108,39 @@ def ai_generate_copy(style: str, details: dict) -> str:
     # Mock Fallback
     return f"[{style.upper()} COPY]\n\nUnlock the full potential of your business with our latest offering. We've listened to your feedback and crafted a solution that perfectly matches your needs.\n\nKey Benefit: {details.get('benefit', 'Efficiency')}\nCall to Action: {details.get('cta', 'Sign Up Now')}\n\nDon't miss out!"
 
+def _existing_campaigns(calendar: list) -> list:
+    # Note which existing campaigns run on each entry's date
+    for entry in calendar:
+        if isinstance(entry, dict) and entry.get("date"):
+            entry["existing_campaigns"] = [c.get("name") for c in date_index.campaigns_on(str(entry["date"])[:10])
+                                           if c.get("status") not in ("completed", "archived")]
+    return calendar
+
 def ai_marketing_calendar(start_date: str, weeks: int = 4) -> list:
     """
-    Generates a marketing calendar.
+    Generates a marketing calendar. Each entry lists the existing campaigns running on its date.
     """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end_date = (start + timedelta(weeks=weeks)).strftime("%Y-%m-%d")
+    running = [c for c in date_index.campaigns_between(start_date, end_date)
+               if c.get("status") not in ("completed", "archived")]
     prompt = f"Generate a {weeks}-week marketing calendar starting {start_date}. Return JSON list of objects with 'date', 'channel', 'activity', 'topic'."
+    if running:
+        listed = "; ".join(f"{c.get('name')} ({c.get('start_date')} to {c.get('end_date') or 'open'}, "
+                           f"{', '.join([c['channel']] if isinstance(c.get('channel'), str) else c.get('channel') or [])})" for c in running[:20])
+        prompt += f" These campaigns are already running; avoid crowding their channels: {listed}."
     
     ai_response = _call_openai("You are a marketing planner.", prompt)
     
     if ai_response:
         try:
             clean_json = ai_response.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_json)
+            return _existing_campaigns(json.loads(clean_json))
         except:
             pass
 
     # Mock Fallback
     calendar = []
-    start = datetime.strptime(start_date, "%Y-%m-%d")
     channels = ["Email", "Social Media", "Blog", "Ads"]
     activities = ["Post", "Blast", "Publish", "Launch"]
     
@@ -134,7 +154,7 @@ def ai_marketing_calendar(start_date: str, weeks: int = 4) -> list:
             "topic": f"Week {i//3 + 1} Focus Topic"
         })
     
-    return calendar
+    return _existing_campaigns(calendar)
 
 def ai_dev_assistant(question: str) -> dict:
     """
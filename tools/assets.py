@@ -1,16 +1,38 @@
 
-from typing import Optional
+from typing import Optional, Union
 from supabase_client import fetch_rows, insert_row, update_row
 from tools.auth import require_role
 from tools.activity import log_activity
+from archive import fetch_archived
+import delta
+import encoding
+import base64
+import binascii
+import os
+import uploads
+import blob_store
+import asset_processing
 from datetime import datetime, timezone
 
 
-def list_assets(status: str = "pending") -> list[dict]:
+def list_assets(status: str = "pending", include_archived: bool = False,
+                changed_since: Optional[str] = None, columnar: bool = False) -> Union[list[dict], dict]:
     """
-    Fetch assets with a specific status.
+    Fetch assets with a specific status. Each has size_bytes, sha256, metadata
+    (dimensions, duration, pages) and thumbnail_url, all None for assets recorded by
+    URL only; metadata stays None until processing_status is "done".
+    Set include_archived to also return assets of archived campaigns.
+    Set changed_since to a sync cursor ("0" to start) to get only what changed:
+    {"rows", "tombstones", "cursor", "has_more"}.
+    Set columnar to get {"columns", "rows"}: the column names once, then one value array per row.
     """
-    return fetch_rows("assets", {"status": status})
+    if changed_since is not None:
+        return encoding.apply_format(delta.changes("assets", changed_since, {"status": status}), columnar)
+    assets = fetch_rows("assets", {"status": status})
+    if include_archived:
+        assets = assets + fetch_archived("assets", {"status": status})
+    return encoding.apply_format([{"size_bytes": None, "sha256": None, "processing_status": None, "metadata": None,
+                                   "thumbnail_url": None, **asset} for asset in assets], columnar)
 
 
 def upload_asset(requester_email: str, asset_url: str, description: str, related_campaign_id: Optional[str] = None) -> dict:
@@ -49,9 +71,118 @@ def review_asset(asset_id: str, reviewer_email: str, decision: str, notes: Optio
         "review_notes": notes,
         "reviewed_at": datetime.now(timezone.utc).isoformat()
     }
-    result = update_row("assets", {"id": asset_id}, data)
+    result = update_row("assets", asset_id, data)
     
     if result:
         log_activity(reviewer_email, "review_asset", "asset", asset_id, {"decision": decision})
         
     return result
+
+
+def _has_file(sha256: str) -> bool:
+    # Reads are scoped to the caller's tenant, so another tenant's copy does not count
+    return bool(fetch_rows("assets", {"sha256": sha256}, None, 1))
+
+
+def _file_asset(upload: dict, sha256: str, size: int, deduplicated: bool) -> dict:
+    store = blob_store.get_store()
+    data = {
+        "requester_email": upload["requester_email"],
+        "file_url": store.url(sha256),
+        "file_type": os.path.splitext(upload.get("file_name") or "")[1].lstrip(".").lower() or None,
+        "file_name": upload.get("file_name"),
+        "content_type": upload.get("content_type"),
+        "size_bytes": size,
+        "sha256": sha256,
+        "description": upload.get("description"),
+        "related_campaign_id": upload.get("related_campaign_id"),
+        "status": "pending",
+        "processing_status": "queued" if asset_processing.ASSET_PROCESSING else None,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    result = insert_row("assets", data)
+    if result:
+        log_activity(upload["requester_email"], "upload_asset", "asset", result.get("id", "unknown"),
+                     {"sha256": sha256, "size_bytes": size, "deduplicated": deduplicated})
+        # Metadata and thumbnail are filled in by a worker process; this only enqueues
+        result["processing_status"] = asset_processing.submit(result) if asset_processing.ASSET_PROCESSING else None
+    return result
+
+
+def start_asset_upload(requester_email: str, description: str, file_name: str, size_bytes: Optional[int] = None,
+                       sha256: Optional[str] = None, content_type: Optional[str] = None,
+                       related_campaign_id: Optional[str] = None) -> dict:
+    """
+    Begin uploading an asset file in chunks. Send the bytes with upload_asset_chunk
+    (or stream them to PUT upload_url over HTTP), then call complete_asset_upload.
+    If sha256 is given and an asset of this tenant already has that file, the asset is
+    created at once and no bytes need to be sent.
+    """
+    fields = {"description": description, "related_campaign_id": related_campaign_id}
+    store = blob_store.get_store()
+    if sha256 and blob_store.valid_key(sha256.lower()) and _has_file(sha256.lower()) \
+            and store.exists(sha256.lower()):
+        upload = {"requester_email": requester_email, "file_name": file_name, "content_type": content_type, **fields}
+        asset = _file_asset(upload, sha256.lower(), store.size(sha256.lower()), True)
+        return {"status": "complete", "asset": asset, "deduplicated": True}
+    try:
+        upload = uploads.start(requester_email, file_name, size_bytes, sha256, content_type, **fields)
+    except uploads.UploadError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "open", "upload_id": upload["id"], "received": 0, "chunk_bytes": uploads.UPLOAD_CHUNK_BYTES,
+            "upload_url": f"/uploads/{upload['id']}"}
+
+
+def upload_asset_chunk(upload_id: str, offset: int, data: str) -> dict:
+    """
+    Append base64-encoded bytes to an upload, starting at byte `offset`, which must equal
+    the bytes received so far. Retrying a chunk that already arrived is harmless.
+    """
+    try:
+        chunk = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        return {"status": "error", "message": "data must be base64"}
+    if len(chunk) > uploads.UPLOAD_CHUNK_BYTES:
+        return {"status": "error", "message": f"Chunks are limited to {uploads.UPLOAD_CHUNK_BYTES} bytes"}
+    try:
+        if uploads.repeated(upload_id, offset, chunk):
+            return {"status": "ok", "received": uploads.received(upload_id)}
+        with uploads.writer(upload_id, offset) as writer:
+            writer.write(chunk)
+            return {"status": "ok", "received": writer.received}
+    except uploads.UploadError as e:
+        return {"status": "error", "message": str(e), "received": e.received}
+
+
+def get_asset_upload(upload_id: str) -> dict:
+    """
+    Status of an upload and the bytes received so far; resume from `received`.
+    """
+    try:
+        upload = uploads.get(upload_id)
+    except uploads.UploadError as e:
+        return {"status": "error", "message": str(e)}
+    size = upload.get("size_bytes") if upload.get("status") in ("stored", "complete") else None
+    return {"upload_id": upload_id, "status": upload.get("status"),
+            "received": size if size is not None else uploads.received(upload_id),
+            "expected_size": upload.get("expected_size"), "asset_id": upload.get("asset_id")}
+
+
+def complete_asset_upload(upload_id: str) -> dict:
+    """
+    Finish an upload: verify size and hash, store the file (or reference the existing copy
+    of an identical file) and create the asset. Safe to retry: a stored upload resumes at
+    creating the asset, and a completed one returns its asset.
+    """
+    try:
+        upload = uploads.get(upload_id)
+        if upload.get("status") == "complete":
+            assets = fetch_rows("assets", {"id": upload["asset_id"]})
+            return {"status": "complete", "asset": assets[0] if assets else None,
+                    "deduplicated": bool(upload.get("deduplicated"))}
+        sha256, size, deduplicated = uploads.finish(upload_id)
+    except uploads.UploadError as e:
+        return {"status": "error", "message": str(e), "received": e.received}
+    asset = _file_asset(upload, sha256, size, deduplicated)
+    uploads.close(upload_id, asset.get("id"), sha256)
+    return {"status": "complete", "asset": asset, "deduplicated": deduplicated}
@@ -1,16 +1,42 @@
 
+import contextlib
+import contextvars
+from datetime import datetime, timezone
 from typing import Optional, Union
 from supabase_client import fetch_rows
+import events
+import session_tokens
+import tenancy
+
+# email -> user, shared by the calls inside user_scope().
+_users = contextvars.ContextVar("user_scope", default=None)
+
+
+@contextlib.contextmanager
+def user_scope():
+    """
+    Look each user up at most once inside the block (used by the batch tool, whose
+    steps usually check the same caller's role).
+    """
+    token = _users.set({})
+    try:
+        yield
+    finally:
+        _users.reset(token)
 
 
 def get_user_by_email(email: str) -> Optional[dict]:
     """
     Fetch a user by email from the 'users' table.
     """
+    cache = _users.get()
+    if cache is not None and email in cache:
+        return cache[email]
     users = fetch_rows("users", {"email": email})
-    if users:
-        return users[0]
-    return None
+    user = users[0] if users else None
+    if cache is not None:
+        cache[email] = user
+    return user
 
 
 def get_user_role(email: str) -> str:
@@ -23,6 +49,17 @@ def get_user_role(email: str) -> str:
     return "unknown"
 
 
+def caller_role(email: str) -> str:
+    """
+    Role of the user making the call. If the call carries a session token, the
+    role comes from the token without a lookup, and any other email has none.
+    """
+    claims = session_tokens.current()
+    if claims is not None:
+        return claims["role"] if email == claims["sub"] else "unknown"
+    return get_user_role(email)
+
+
 def list_team_members() -> list[dict]:
     """
     List all users with their roles.
@@ -40,7 +77,7 @@ def check_role(email: str, required_roles: Union[list[str], str]) -> bool:
     Returns:
         True if the user has a required role, False otherwise.
     """
-    role = get_user_role(email)
+    role = caller_role(email)
     if isinstance(required_roles, str):
         return role == required_roles
     return role in required_roles
@@ -51,3 +88,76 @@ def require_role(email: str, allowed_roles: list[str]):
     """
     if not check_role(email, allowed_roles):
         raise ValueError(f"User {email} does not have permission. Required: {allowed_roles}")
+
+
+def create_session_token(user_email: str) -> dict:
+    """
+    Issue a short-lived session token carrying user_email and their role. Send it as
+    "Authorization: Bearer <token>" and role checks need no user lookup. A call made
+    with a token can only issue tokens for its own user, unless that user is an admin.
+    Without a token, admins and managers also need the X-Auth-Issuer-Key header.
+    """
+    claims = session_tokens.current()
+    if claims is not None and claims["sub"] != user_email and claims["role"] != "admin":
+        return {"status": "error", "message": "Only admins can issue tokens for other users"}
+    role = get_user_role(user_email)
+    if role == "unknown":
+        return {"status": "error", "message": f"Unknown user {user_email}"}
+    # Without the issuer key or a token not itself asserted, user_email is only asserted by the caller
+    asserted = not session_tokens.trusted_issuer() and (claims is None or claims.get("asserted", False))
+    if asserted and role in ("admin", "manager"):
+        return {"status": "error",
+                "message": "Issuing an admin or manager token needs a session token or the issuer key "
+                           "(X-Auth-Issuer-Key)"}
+    token, claims = session_tokens.issue(user_email, role, tenancy.current() if tenancy.MULTI_TENANT else None,
+                                         asserted)
+    return {"token": token, "role": role,
+            "expires_at": datetime.fromtimestamp(claims["exp"], timezone.utc).isoformat()}
+
+
+def revoke_session_token(user_email: str, token: Optional[str] = None, all_for_email: Optional[str] = None) -> dict:
+    """
+    Revoke one session token, or every token issued so far to all_for_email.
+    Anyone holding a token can revoke it. Revoking by email, or another user's
+    token, needs a call made with a session token that was not issued on an
+    asserted email: users can revoke their own tokens, admins anyone's.
+    """
+    try:
+        revoked = session_tokens.decode(token) if token else None
+    except session_tokens.TokenError as e:
+        return {"status": "error", "message": str(e)}
+    target = revoked["sub"] if revoked else all_for_email
+    if not target:
+        return {"status": "error", "message": "Give a token or all_for_email"}
+    # user_email is self-asserted; only the caller's own session token identifies them
+    if not (revoked and target == user_email):
+        claims = session_tokens.current()
+        if claims is None or claims["sub"] != user_email or claims.get("asserted"):
+            return {"status": "error",
+                    "message": "Revoking by email or another user's token requires a verified session token"}
+        if target != user_email and claims["role"] != "admin":
+            return {"status": "error", "message": "Only admins can revoke other users' tokens"}
+    if revoked:
+        session_tokens.revoke(revoked)
+    else:
+        session_tokens.revoke_email(target)
+    return {"status": "revoked", "email": target, "all": not token}
+
+
+def _on_user_change(table: str, op: str, rows: Optional[list], changes: Optional[dict], filters: Optional[dict]):
+    # Tokens carry the role they were issued with; a role change or removal voids them
+    if table != "users":
+        return
+    if op == "delete":
+        emails = [filters["email"]] if filters and "email" in filters else []
+    elif op in ("update", "update_rows") and "role" in (changes or {}):
+        emails = [row.get("email") for row in rows or []]
+    elif op == "upsert":
+        emails = [row.get("email") for row in rows or []]
+    else:
+        return
+    for email in filter(None, emails):
+        session_tokens.revoke_email(email)
+
+
+events.on_change(_on_user_change)
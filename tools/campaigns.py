@@ -1,20 +1,38 @@
 
+from typing import Optional, Union
 from supabase_client import fetch_rows, insert_row, update_row
 from tools.auth import require_role
 from tools.activity import log_activity
-from datetime import datetime, timezone
+from archive import fetch_archived
+import delta
+import date_index
+import encoding
+from datetime import date, datetime, timezone
 
+# Campaigns in these statuses no longer compete for a slot on the calendar.
+INACTIVE_STATUSES = ("completed", "archived")
 
-def list_campaigns(status: str = "active") -> list[dict]:
+
+def list_campaigns(status: str = "active", include_archived: bool = False,
+                   changed_since: Optional[str] = None, columnar: bool = False) -> Union[list[dict], dict]:
     """
     Fetch campaigns from Supabase table "campaigns" where status matches the input.
+    Set include_archived to also return archived campaigns.
+    Set changed_since to a sync cursor ("0" to start) to get only what changed:
+    {"rows", "tombstones", "cursor", "has_more"}.
+    Set columnar to get {"columns", "rows"}: the column names once, then one value array per row.
     """
     # All roles can list campaigns (Team can list, Manager/Admin can list)
     # Spec says: "team: can only list_campaigns." -> Implies they can see all? 
     # Or "team: can view own tasks, assigned campaigns". 
     # But list_campaigns spec says "Fetch campaigns... where status = input".
     # Let's assume for now list_campaigns returns all matching status.
-    return fetch_rows("campaigns", {"status": status})
+    if changed_since is not None:
+        return encoding.apply_format(delta.changes("campaigns", changed_since, {"status": status}), columnar)
+    campaigns = fetch_rows("campaigns", {"status": status})
+    if include_archived:
+        campaigns = campaigns + fetch_archived("campaigns", {"status": status})
+    return encoding.apply_format(campaigns, columnar)
 
 
 def create_campaign(name: str, channel: list[str], start_date: str, end_date: str, owner_email: str) -> dict:
@@ -60,9 +78,79 @@ def update_campaign_status(campaign_id: str, new_status: str, user_email: str) -
     """
     require_role(user_email, ["admin", "manager"])
     
-    result = update_row("campaigns", {"id": campaign_id}, {"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat()})
+    result = update_row("campaigns", campaign_id, {"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat()})
     
     if result:
         log_activity(user_email, "update_status", "campaign", campaign_id, {"new_status": new_status})
         
     return result
+
+
+def _window(start_date: str, end_date: str) -> tuple[str, str]:
+    try:
+        start, end = date.fromisoformat(start_date[:10]), date.fromisoformat(end_date[:10])
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD")
+    if end < start:
+        raise ValueError("end_date is before start_date")
+    return start.isoformat(), end.isoformat()
+
+
+def campaigns_active_between(start_date: str, end_date: str, status: Optional[str] = None) -> list[dict]:
+    """
+    Campaigns whose run (start_date to end_date) overlaps the given window, ordered by start date.
+    A campaign without an end_date counts as still running. Optionally only those with `status`.
+    """
+    start, end = _window(start_date, end_date)
+    campaigns = date_index.campaigns_between(start, end)
+    return [dict(c) for c in campaigns if status is None or c.get("status") == status]
+
+
+def calendar_conflicts(start_date: str, end_date: str, channels: Optional[list[str]] = None) -> dict:
+    """
+    Check a planned window against the calendar: campaigns that overlap it (sharing one of
+    `channels`, if given), how many days each overlaps, the busiest day, and how many open
+    tasks fall due in the window. Completed and archived campaigns are ignored.
+    """
+    start, end = _window(start_date, end_date)
+    wanted = set(channels or [])
+    conflicts = []
+    for campaign in date_index.campaigns_between(start, end):
+        if campaign.get("status") in INACTIVE_STATUSES:
+            continue
+        campaign_channels = campaign.get("channel") or []
+        if isinstance(campaign_channels, str):
+            campaign_channels = [campaign_channels]
+        shared = sorted(wanted.intersection(campaign_channels))
+        if wanted and not shared:
+            continue
+        run_start, run_end = date_index.get_index().campaign_interval(campaign["id"])
+        overlap_start, overlap_end = max(start, run_start), min(end, run_end)
+        conflicts.append({
+            "id": campaign["id"],
+            "name": campaign.get("name"),
+            "status": campaign.get("status"),
+            "channel": campaign_channels,
+            "start_date": campaign.get("start_date"),
+            "end_date": campaign.get("end_date"),
+            "overlap_start": overlap_start,
+            "overlap_end": overlap_end,
+            "overlap_days": (date.fromisoformat(overlap_end) - date.fromisoformat(overlap_start)).days + 1,
+            "shared_channels": shared,
+        })
+
+    # Sweep the overlaps for the day with the most campaigns running; a run ends the day after overlap_end
+    boundaries = sorted([(date.fromisoformat(c["overlap_start"]).toordinal(), 1) for c in conflicts] +
+                        [(date.fromisoformat(c["overlap_end"]).toordinal() + 1, -1) for c in conflicts])
+    busiest, running = {"date": None, "campaigns": 0}, 0
+    for day, step in boundaries:
+        running += step
+        if running > busiest["campaigns"]:
+            busiest = {"date": date.fromordinal(day).isoformat(), "campaigns": running}
+
+    return {
+        "window": {"start_date": start, "end_date": end},
+        "conflicts": conflicts,
+        "busiest_day": busiest,
+        "open_tasks_due": sum(1 for _ in date_index.tasks_due_between(start, end)),
+    }
@@ -1,8 +1,11 @@
 
 from supabase_client import count_rows, fetch_rows
+from singleflight import coalesced
+import date_index
 from datetime import datetime, timezone
 
 
+@coalesced
 def marketing_snapshot() -> dict:
     """
     Return a structured dictionary with marketing KPIs.
@@ -11,15 +14,7 @@ def marketing_snapshot() -> dict:
     completed_campaigns = count_rows("campaigns", {"status": "completed"})
     tasks_in_progress = count_rows("tasks", {"status": "in_progress"})
     
-    # For overdue tasks, we need a complex filter (due_date < now AND status != completed).
-    # supabase_client.count_rows only supports simple equality.
-    # We'll fetch all non-completed tasks and filter in python for now, or just return a placeholder if too heavy.
-    # Let's try to be reasonably accurate.
-    # Fetch all tasks not completed?
-    # Or just fetch all tasks and filter.
-    all_tasks = fetch_rows("tasks")
-    now_iso = datetime.now(timezone.utc).isoformat()
-    overdue_tasks = sum(1 for t in all_tasks if t.get("status") != "completed" and t.get("due_date", "") < now_iso)
+    overdue_tasks = date_index.count_overdue()
     
     pending_assets = count_rows("assets", {"status": "pending"})
     
@@ -33,6 +28,7 @@ def marketing_snapshot() -> dict:
     }
 
 
+@coalesced
 def channel_performance() -> list[dict]:
     """
     Return aggregated metrics per channel.
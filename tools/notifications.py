@@ -1,9 +1,16 @@
 import os
 import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import requests
 from supabase_client import get_client, fetch_rows
+from tracing import span
+import date_index
+
+TWILIO_API_URL = os.getenv("TWILIO_API_URL", "https://api.twilio.com").rstrip("/")
 
 def send_whatsapp_message(to_number: str, message_body: str) -> dict:
     """
@@ -18,7 +25,7 @@ def send_whatsapp_message(to_number: str, message_body: str) -> dict:
 
     try:
         # Twilio API URL
-        url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+        url = f"{TWILIO_API_URL}/2010-04-01/Accounts/{account_sid}/Messages.json"
         
         # Twilio expects form-encoded data
         data = {
@@ -27,7 +34,8 @@ def send_whatsapp_message(to_number: str, message_body: str) -> dict:
             "Body": message_body
         }
         
-        response = requests.post(url, data=data, auth=(account_sid, auth_token), timeout=10)
+        with span("twilio.send_whatsapp", to=to_number):
+            response = requests.post(url, data=data, auth=(account_sid, auth_token), timeout=10)
         
         if response.status_code >= 200 and response.status_code < 300:
             res_json = response.json()
@@ -90,12 +98,7 @@ def notify_overdue_tasks(manager_email: str) -> dict:
     if not phone_number:
         return {"status": "skipped", "reason": "no_phone_number"}
 
-    # Mock overdue check
-    all_tasks = fetch_rows("tasks")
-    overdue_count = 0
-    for t in all_tasks:
-        if t.get("status") != "completed": 
-             overdue_count += 1
+    overdue_count = date_index.count_overdue()
 
     if overdue_count == 0:
         return {"status": "skipped", "reason": "no_overdue_tasks"}
@@ -103,39 +106,106 @@ def notify_overdue_tasks(manager_email: str) -> dict:
     message = f"⚠️ Alert: You have {overdue_count} tasks requiring attention."
     return send_whatsapp_message(phone_number, message)
 
+def _smtp_settings() -> dict:
+    return {
+        "host": os.getenv("EMAIL_SMTP_HOST") or os.getenv("SMTP_HOST"),
+        "port": os.getenv("EMAIL_SMTP_PORT") or os.getenv("SMTP_PORT"),
+        "user": os.getenv("EMAIL_SMTP_USER") or os.getenv("SMTP_USER"),
+        "password": os.getenv("EMAIL_SMTP_PASSWORD") or os.getenv("SMTP_PASSWORD"),
+        "from_addr": os.getenv("EMAIL_FROM_ADDRESS") or os.getenv("EMAIL_FROM"),
+    }
+
+def _smtp_connect(settings: dict) -> smtplib.SMTP:
+    server = smtplib.SMTP(settings["host"], int(settings["port"]))
+    server.starttls()
+    server.login(settings["user"], settings["password"])
+    return server
+
+def _mime_message(from_addr: str, to_email: str, subject: str, html_body: str) -> str:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = from_addr
+    msg["To"] = to_email
+
+    part = MIMEText(html_body, "html")
+    msg.attach(part)
+    return msg.as_string()
+
 def send_email(to_email: str, subject: str, html_body: str) -> dict:
     """
     Sends an email using SMTP.
     """
-    smtp_host = os.getenv("EMAIL_SMTP_HOST") or os.getenv("SMTP_HOST")
-    smtp_port = os.getenv("EMAIL_SMTP_PORT") or os.getenv("SMTP_PORT")
-    smtp_user = os.getenv("EMAIL_SMTP_USER") or os.getenv("SMTP_USER")
-    smtp_password = os.getenv("EMAIL_SMTP_PASSWORD") or os.getenv("SMTP_PASSWORD")
-    from_addr = os.getenv("EMAIL_FROM_ADDRESS") or os.getenv("EMAIL_FROM")
-
-    if not all([smtp_host, smtp_port, smtp_user, smtp_password, from_addr]):
+    settings = _smtp_settings()
+    if not all(settings.values()):
         return {"status": "mock", "message": "Email send simulated (missing credentials)", "provider": "email"}
 
     try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = from_addr
-        msg["To"] = to_email
-
-        part = MIMEText(html_body, "html")
-        msg.attach(part)
-
-        server = smtplib.SMTP(smtp_host, int(smtp_port))
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        server.sendmail(from_addr, to_email, msg.as_string())
-        server.quit()
+        with span("smtp.send", host=settings["host"], to=to_email):
+            server = _smtp_connect(settings)
+            server.sendmail(settings["from_addr"], to_email, _mime_message(settings["from_addr"], to_email, subject, html_body))
+            server.quit()
 
         return {"status": "success", "provider": "email"}
     except Exception as e:
         print(f"Email send error: {e}")
         return {"status": "error", "message": str(e), "provider": "email"}
 
+EMAIL_BULK_CONCURRENCY = int(os.getenv("EMAIL_BULK_CONCURRENCY", "8"))
+
+def send_bulk_email(messages: Iterable[tuple[str, str, str]], concurrency: int = EMAIL_BULK_CONCURRENCY) -> dict:
+    """
+    Sends (to_email, subject, html_body) messages over `concurrency` SMTP
+    connections, each reused for many messages. `messages` is consumed lazily:
+    at most 2 * concurrency are in flight, so a generator of any length works.
+    Returns counts by status.
+    """
+    settings = _smtp_settings()
+    counts = {"success": 0, "error": 0, "mock": 0}
+    if not all(settings.values()):
+        for _ in messages:
+            counts["mock"] += 1
+        return counts
+
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+
+    def deliver(to_email: str, subject: str, html_body: str) -> str:
+        for attempt in range(2):
+            try:
+                if getattr(local, "server", None) is None:
+                    local.server = _smtp_connect(settings)
+                    with connections_lock:
+                        connections.append(local.server)
+                with span("smtp.send", host=settings["host"], to=to_email):
+                    local.server.sendmail(settings["from_addr"], to_email,
+                                          _mime_message(settings["from_addr"], to_email, subject, html_body))
+                return "success"
+            except smtplib.SMTPServerDisconnected:
+                local.server = None  # Reconnect once, e.g. after a server-side idle timeout
+            except Exception as e:
+                print(f"Email send error ({to_email}): {e}")
+                return "error"
+        return "error"
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="smtp") as pool:
+        pending = set()
+        for message in messages:
+            if len(pending) >= 2 * concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    counts[future.result()] += 1
+            pending.add(pool.submit(deliver, *message))
+        for future in pending:
+            counts[future.result()] += 1
+
+    for server in connections:
+        try:
+            server.quit()
+        except Exception:
+            pass
+    return counts
+
 # Alias for backward compatibility/consistency
 def send_email_report(to_email: str, subject: str, body_text: str, body_html: str = None) -> dict:
     return send_email(to_email, subject, body_html or body_text)
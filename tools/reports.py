@@ -1,6 +1,9 @@
 from supabase_client import fetch_rows, count_rows
 from tools.notifications import send_email_report
+from singleflight import coalesced
+import date_index
 
+@coalesced
 def generate_dashboard_summary(period: str = "daily") -> dict:
     """
     Generates a summary of key metrics for the dashboard.
@@ -30,9 +33,7 @@ def generate_dashboard_summary(period: str = "daily") -> dict:
     for t in tasks:
         if t.get("status") == "in_progress":
             summary["tasks_in_progress"] += 1
-        # Mock overdue check
-        if t.get("status") != "completed" and t.get("priority") == "high":
-             summary["overdue_tasks"] += 1
+    summary["overdue_tasks"] = date_index.count_overdue()
 
     # Assets
     assets = fetch_rows("assets")
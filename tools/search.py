@@ -0,0 +1,42 @@
+import time
+from typing import Optional
+from supabase_client import fetch_rows
+import search_index
+
+
+def search(query: str, entity_types: Optional[list[str]] = None, status: Optional[list[str]] = None,
+           limit: int = 20) -> dict:
+    """
+    Full-text search over campaign names, task titles and descriptions, and asset descriptions.
+    Matches whole words, word prefixes ("camp" finds "campaign") and near misses ("Fridy").
+    entity_types narrows to "campaign", "task" and/or "asset"; status to those statuses.
+    Returns the best matches first, each with its row.
+    """
+    started = time.perf_counter()
+    unknown = [e for e in entity_types or [] if e not in search_index.ENTITIES]
+    if unknown:
+        return {"status": "error", "message": f"Unknown entity type(s): {', '.join(unknown)}. "
+                                              f"Choose from: {', '.join(search_index.ENTITIES)}"}
+    limit = max(1, min(limit, 100))
+    hits, total = search_index.get_index().search(query, entity_types, status, limit)
+    searched = time.perf_counter()
+
+    # Fetch the matched rows, one request per entity type
+    rows = {}
+    for entity in {entity for entity, _, _ in hits}:
+        table = search_index.ENTITIES[entity][0]
+        ids = [row_id for e, row_id, _ in hits if e == entity]
+        rows.update({(entity, str(row["id"])): row for row in fetch_rows(table, {"id__in": ids})})
+
+    results = [{"entity_type": entity, "id": row_id, "score": score, "row": rows[(entity, row_id)]}
+               for entity, row_id, score in hits if (entity, row_id) in rows]
+    return {
+        "status": "success",
+        "query": query,
+        "total_matches": total,
+        "results": results,
+        "timing_ms": {
+            "search": round((searched - started) * 1000, 3),
+            "fetch_rows": round((time.perf_counter() - searched) * 1000, 3),
+        },
+    }
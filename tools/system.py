@@ -1,8 +1,24 @@
 import os
+from typing import Optional
+import profiling
+import events
+import replica
+import search_index
+import date_index
+import asset_processing
+import session_tokens
+import singleflight
+import tenancy
+import health
+import tool_manifest
+from supabase_client import backend_name
+from tools.auth import require_role
 
 def check_backend_config() -> dict:
     """
-    Checks the backend configuration status (Supabase, WhatsApp, Email).
+    Checks the backend configuration status (Supabase, WhatsApp, Email), with the
+    latest background health probe of each dependency: status, when it was
+    checked, and recent latency.
     """
     # Check Supabase
     supabase_url = os.getenv("SUPABASE_URL")
@@ -19,9 +35,39 @@ def check_backend_config() -> dict:
     has_email = bool(smtp_host)
     
     return {
-        "mode": "supabase" if has_supabase else "mock",
+        "mode": backend_name(),
         "has_supabase": has_supabase,
         "has_whatsapp": has_whatsapp,
         "has_email": has_email,
-        "scheduler_enabled": os.getenv("ENABLE_SCHEDULER", "false").lower() == "true"
+        "scheduler_enabled": os.getenv("ENABLE_SCHEDULER", "false").lower() == "true",
+        "health": health.snapshot(),
     }
+
+def configure_profiling(user_email: str, sample_rate: Optional[float] = None, tools: Optional[list[str]] = None,
+                        profile_next: Optional[str] = None, mode: Optional[str] = None) -> dict:
+    """
+    Admin only. Adjust tool-call profiling and list recent profile files.
+    sample_rate profiles that fraction of all calls, tools profiles every call of the
+    named tools, profile_next flags the next call of one tool. Call with only
+    user_email to read the current status. Nothing changes if any argument is invalid.
+    """
+    require_role(user_email, ["admin"])
+
+    known = {entry["name"] for entry in tool_manifest.load_manifest()} | {"batch"}
+    unknown = sorted({*(tools or []), *([profile_next] if profile_next else [])} - known)
+    if unknown:
+        raise ValueError(f"Unknown tools: {', '.join(unknown)}")
+    return profiling.configure(sample_rate=sample_rate, tools=tools, mode=mode, profile_next=profile_next)
+
+def get_runtime_stats(user_email: str) -> dict:
+    """
+    Admin only. In-process counters: request coalescing (calls that ran against the
+    backend vs. shared another call's result), read replicas, change events, the
+    search and date indexes, background asset processing, session tokens and the
+    caller's tenant quotas. With tenancy on, caches report the caller's tenant only.
+    """
+    require_role(user_email, ["admin"])
+    return {"singleflight": singleflight.stats(), "replica": replica.stats(), "events": events.stats(),
+            "search": search_index.stats(), "dates": date_index.stats(),
+            "asset_processing": asset_processing.stats(), "session_tokens": session_tokens.stats(),
+            "tenancy": tenancy.stats()}
@@ -1,16 +1,25 @@
 
-from typing import Optional
+from typing import Optional, Union
 from supabase_client import fetch_rows, insert_row, update_row
-from tools.auth import require_role, get_user_role
+from tools.auth import require_role, caller_role
 from tools.activity import log_activity
+from archive import fetch_archived
+import delta
+import encoding
 from datetime import datetime, timezone
 
 
-def list_tasks(assignee_email: Optional[str] = None, status: Optional[str] = None, user_email: Optional[str] = None) -> list[dict]:
+def list_tasks(assignee_email: Optional[str] = None, status: Optional[str] = None, user_email: Optional[str] = None,
+               include_archived: bool = False, changed_since: Optional[str] = None,
+               columnar: bool = False) -> Union[list[dict], dict]:
     """
     Fetch tasks. 
     Team members can only see tasks assigned to them.
     Admin/Manager can see all.
+    Set include_archived to also return tasks of archived campaigns.
+    Set changed_since to a sync cursor ("0" to start) to get only what changed:
+    {"rows", "tombstones", "cursor", "has_more"}.
+    Set columnar to get {"columns", "rows"}: the column names once, then one value array per row.
     """
     filters = {}
     if status:
@@ -18,7 +27,7 @@ def list_tasks(assignee_email: Optional[str] = None, status: Optional[str] = Non
         
     # Role check logic for filtering
     if user_email:
-        role = get_user_role(user_email)
+        role = caller_role(user_email)
         if role == "team":
             # Force filter by assignee if user is team
             # If they requested another assignee, they get nothing (or we override).
@@ -29,7 +38,12 @@ def list_tasks(assignee_email: Optional[str] = None, status: Optional[str] = Non
     elif assignee_email:
          filters["assignee"] = assignee_email
          
-    return fetch_rows("tasks", filters)
+    if changed_since is not None:
+        return encoding.apply_format(delta.changes("tasks", changed_since, filters), columnar)
+    tasks = fetch_rows("tasks", filters)
+    if include_archived:
+        tasks = tasks + fetch_archived("tasks", filters)
+    return encoding.apply_format(tasks, columnar)
 
 
 def create_task(title: str, assignee_email: str, due_date: str, creator_email: str, related_campaign_id: Optional[str] = None) -> dict:
@@ -60,7 +74,7 @@ def update_task_status(task_id: str, new_status: str, user_email: str) -> dict:
     """
     require_role(user_email, ["admin", "manager"])
     
-    result = update_row("tasks", {"id": task_id}, {"status": new_status})
+    result = update_row("tasks", task_id, {"status": new_status})
     
     if result:
         log_activity(user_email, "update_status", "task", task_id, {"new_status": new_status})
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import random
+import inspect
+import threading
+import contextlib
+import contextvars
+import functools
+from typing import Optional
+
+# Lightweight in-process tracing. Each sampled MCP call gets a trace id, and
+# instrumented functions (data layer, OpenAI, Twilio, SMTP) record child spans.
+# Finished traces are appended to TRACE_FILE, either as one JSON object per span
+# ("jsonl") or as one OTLP/JSON ExportTraceServiceRequest per trace ("otlp"),
+# the format the OpenTelemetry collector file exporter reads and writes.
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0") or 0)
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_FORMAT = os.environ.get("TRACE_FORMAT", "jsonl")
+SERVICE_NAME = "marketing-hub-mcp"
+
+_current = contextvars.ContextVar("current_span", default=None)
+_write_lock = threading.Lock()
+_NULL = contextlib.nullcontext()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _to_otlp(trace: Trace) -> dict:
+    spans = []
+    for s in trace.spans:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id or "",
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+    }]}
+
+
+def _export(trace: Trace):
+    if TRACE_FORMAT == "otlp":
+        lines = [json.dumps(_to_otlp(trace), default=str)]
+    else:
+        lines = [json.dumps(s.to_dict(), default=str) for s in trace.spans]
+    with _write_lock:
+        with open(TRACE_FILE, "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+@contextlib.contextmanager
+def _run_span(trace: Trace, name: str, parent_id: Optional[str], attributes: dict, root: bool = False):
+    span = Span(trace, name, parent_id, attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current.reset(token)
+        trace.add(span)
+        if root:
+            _export(trace)
+
+
+def trace(name: str, **attributes):
+    """
+    Start a new trace for one MCP call (or job run), subject to TRACE_SAMPLE_RATE.
+    Returns a no-op context manager when the call is not sampled.
+    """
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return _NULL
+    return _run_span(Trace(), name, None, attributes, root=True)
+
+
+def span(name: str, **attributes):
+    """
+    Record a child span of the active trace. No-op outside a sampled trace.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NULL
+    return _run_span(parent.trace, name, parent.span_id, attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    parent = _current.get()
+    return parent.trace.trace_id if parent else None
+
+
+def traced(name: str, *arg_names: str):
+    """
+    Decorator recording a span per call. The named arguments become span
+    attributes, and list results record their length as "rows".
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None:
+                return fn(*args, **kwargs)
+            bound = signature.bind_partial(*args, **kwargs)
+            attributes = {a: bound.arguments[a] for a in arg_names if a in bound.arguments}
+            with _run_span(parent.trace, name, parent.span_id, attributes) as s:
+                result = fn(*args, **kwargs)
+                if isinstance(result, list):
+                    s.set(rows=len(result))
+                return result
+        return wrapper
+    return decorator
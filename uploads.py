@@ -0,0 +1,274 @@
+"""
+Resumable, chunked uploads of asset files into the blob store.
+
+    start(...)                    -> upload row; status "open"
+    writer(upload_id, offset)     -> append bytes (one tool chunk, or a streamed HTTP body)
+    received(upload_id)           -> bytes stored so far, to resume after a dropped connection
+    finish(upload_id)             -> (sha256, size, deduplicated), the bytes now in the blob store;
+                                     status "stored"
+    close(upload_id, asset_id)    -> status "complete"
+
+Bytes are appended to UPLOAD_DIR/<upload id>.part as they arrive and hashed
+as they are written. The running SHA-256 is kept in process memory. If it is
+missing (a restart, or another worker took the chunk) it is recomputed from
+the part file in 1 MiB blocks. Memory per upload is constant whatever the
+file size.
+
+Chunks must arrive in order: a write must start at the number of bytes
+received so far. When finishing, a file whose hash is already in the blob
+store is not stored again; the asset references the existing blob.
+
+Upload sessions are rows in the `uploads` table. Part files live on local
+disk, so with several machines the chunks of one upload must reach the same
+one. Open uploads older than UPLOAD_EXPIRY_HOURS are removed by the
+expire_uploads job.
+"""
+import os
+import re
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+import blob_store
+from supabase_client import fetch_rows, insert_row, update_row
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", os.path.join(blob_store.BLOB_DIR, "uploads"))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(2 << 30)))
+# Largest chunk accepted by the upload_asset_chunk tool (before base64).
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(4 << 20)))
+UPLOAD_EXPIRY_HOURS = float(os.environ.get("UPLOAD_EXPIRY_HOURS", "24"))
+
+TABLE = "uploads"
+_BLOCK = 1 << 20
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(ValueError):
+    """
+    The upload cannot take this request; `received` tells the client where to resume.
+    """
+
+    def __init__(self, message: str, received: Optional[int] = None):
+        super().__init__(message)
+        self.received = received
+
+
+class UploadNotFound(UploadError):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def part_path(upload_id: str) -> str:
+    if not _UPLOAD_ID.match(upload_id or ""):
+        raise UploadNotFound(f"Unknown upload '{upload_id}'")
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.part")
+
+
+def get(upload_id: str) -> dict:
+    rows = fetch_rows(TABLE, {"id": upload_id}) if _UPLOAD_ID.match(upload_id or "") else []
+    if not rows:
+        raise UploadNotFound(f"Unknown upload '{upload_id}'")
+    return rows[0]
+
+
+def received(upload_id: str) -> int:
+    try:
+        return os.path.getsize(part_path(upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+def start(requester_email: str, file_name: str, size_bytes: Optional[int] = None, sha256: Optional[str] = None,
+          content_type: Optional[str] = None, **fields) -> dict:
+    """
+    Open an upload session. Extra fields (description, related_campaign_id)
+    are kept on the row for the asset created at the end.
+    """
+    if size_bytes is not None and not 0 <= size_bytes <= UPLOAD_MAX_BYTES:
+        raise UploadError(f"size_bytes must be between 0 and {UPLOAD_MAX_BYTES}")
+    if sha256 is not None and not blob_store.valid_key(sha256.lower()):
+        raise UploadError("sha256 must be 64 hex characters")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    open(part_path(upload_id), "wb").close()
+    return insert_row(TABLE, {
+        "id": upload_id,
+        "requester_email": requester_email,
+        "file_name": file_name,
+        "content_type": content_type,
+        "expected_size": size_bytes,
+        "expected_sha256": sha256.lower() if sha256 else None,
+        "status": "open",
+        "created_at": _now(),
+        **fields,
+    })
+
+
+# --- Writing ---
+
+_locks = {}
+_locks_guard = threading.Lock()
+_hashers = {}  # upload id -> (bytes hashed, sha256 object)
+
+
+def _lock(upload_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _hasher(upload_id: str, size: int):
+    cached = _hashers.pop(upload_id, None)
+    if cached is not None and cached[0] == size:
+        return cached[1]
+    hasher = hashlib.sha256()
+    with open(part_path(upload_id), "rb") as f:
+        while block := f.read(_BLOCK):
+            hasher.update(block)
+    return hasher
+
+
+class Writer:
+    """
+    Appends to one upload from `offset`; use as a context manager. Only one
+    writer per upload at a time.
+    """
+
+    def __init__(self, upload_id: str, offset: int):
+        upload = get(upload_id)
+        if upload.get("status") != "open":
+            raise UploadError(f"Upload is {upload.get('status')}")
+        self.upload = upload
+        self.upload_id = upload_id
+        self.limit = upload.get("expected_size")
+        if self.limit is None:
+            self.limit = UPLOAD_MAX_BYTES
+        self.lock = _lock(upload_id)
+        if not self.lock.acquire(blocking=False):
+            raise UploadError("Another chunk of this upload is being written", received(upload_id))
+        try:
+            self.received = received(upload_id)
+            if offset != self.received:
+                raise UploadError(f"Expected offset {self.received}, got {offset}", self.received)
+            self.hasher = _hasher(upload_id, self.received)
+            self.file = open(part_path(upload_id), "ab")
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def write(self, data: bytes):
+        if self.received + len(data) > self.limit:
+            raise UploadError(f"Upload would exceed {self.limit} bytes", self.received)
+        self.file.write(data)
+        self.hasher.update(data)
+        self.received += len(data)
+
+    def close(self):
+        try:
+            self.file.close()
+            _hashers[self.upload_id] = (self.received, self.hasher)
+        finally:
+            self.lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def writer(upload_id: str, offset: int) -> Writer:
+    return Writer(upload_id, offset)
+
+
+def repeated(upload_id: str, offset: int, data: bytes) -> bool:
+    """
+    True if these bytes are already stored at offset: a retried chunk whose
+    first attempt arrived.
+    """
+    size = received(upload_id)
+    if offset >= size or offset + len(data) > size:
+        return False
+    with open(part_path(upload_id), "rb") as f:
+        f.seek(offset)
+        return f.read(len(data)) == data
+
+
+# --- Finishing ---
+
+def finish(upload_id: str) -> tuple[str, int, bool]:
+    """
+    Check the received bytes against the declared size and hash, mark the
+    upload "stored" with its hash, then move the bytes into the blob store
+    unless a blob with that hash exists already. Returns (sha256, size,
+    deduplicated). A "stored" upload finishes again from its row, so a
+    completion that failed after this point can be retried. The session stays
+    "stored" until close() records the asset.
+    """
+    upload = get(upload_id)
+    if upload.get("status") not in ("open", "stored"):
+        raise UploadError(f"Upload is {upload.get('status')}")
+    lock = _lock(upload_id)
+    if not lock.acquire(blocking=False):
+        raise UploadError("A chunk of this upload is still being written", received(upload_id))
+    try:
+        store = blob_store.get_store()
+        if upload["status"] == "open":
+            if not os.path.exists(part_path(upload_id)):
+                raise UploadError("Upload is already being completed")
+            size = received(upload_id)
+            if upload.get("expected_size") is not None and size != upload["expected_size"]:
+                raise UploadError(f"Received {size} of {upload['expected_size']} bytes", size)
+            sha256 = _hasher(upload_id, size).hexdigest()
+            if upload.get("expected_sha256") and sha256 != upload["expected_sha256"]:
+                _discard(upload_id)
+                update_row(TABLE, upload_id, {"status": "failed", "error": "sha256 mismatch", "updated_at": _now()})
+                raise UploadError(f"sha256 mismatch: received {sha256}, expected {upload['expected_sha256']}", 0)
+            # Recorded before the part file moves, so a retry knows the hash without it
+            upload = update_row(TABLE, upload_id, {"status": "stored", "sha256": sha256, "size_bytes": size,
+                                                   "deduplicated": store.exists(sha256), "updated_at": _now()})
+        sha256, size, deduplicated = upload["sha256"], upload["size_bytes"], bool(upload.get("deduplicated"))
+        if os.path.exists(part_path(upload_id)):
+            if store.exists(sha256):
+                _discard(upload_id)
+            else:
+                store.put_file(sha256, part_path(upload_id), upload.get("content_type"))
+                _hashers.pop(upload_id, None)
+        elif not store.exists(sha256):
+            update_row(TABLE, upload_id, {"status": "failed", "error": "file lost", "updated_at": _now()})
+            raise UploadError("The uploaded file was lost before it was stored; upload it again")
+        return sha256, size, deduplicated
+    finally:
+        lock.release()
+        with _locks_guard:
+            _locks.pop(upload_id, None)
+
+
+def close(upload_id: str, asset_id, sha256: str) -> dict:
+    return update_row(TABLE, upload_id, {"status": "complete", "asset_id": asset_id, "sha256": sha256,
+                                         "updated_at": _now()})
+
+
+def _discard(upload_id: str):
+    _hashers.pop(upload_id, None)
+    try:
+        os.remove(part_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def expire(hours: float = UPLOAD_EXPIRY_HOURS) -> int:
+    """
+    Remove open (or stored, never completed) uploads started more than `hours`
+    ago, with their part files.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+    stale = fetch_rows(TABLE, {"status__in": ["open", "stored"], "created_at__lt": cutoff})
+    for upload in stale:
+        _discard(upload["id"])
+        update_row(TABLE, upload["id"], {"status": "expired", "updated_at": _now()})
+    return len(stale)